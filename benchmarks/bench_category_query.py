@@ -0,0 +1,74 @@
+"""Compares category queries evaluated on the bitsets of `CategoryIndex` against a scan over vocs.
+
+Usage:
+    python benchmarks/bench_category_query.py [--vocs N] [--repeat N]
+
+Vocs of the shipped decks are repeated up to `--vocs` vocs, with some of them given
+extra random categories, so there are more categories than in the decks. The scan
+checks the categories of every voc with set lookups, like selecting by checked
+categories does. Evaluation is timed alone (giving a bitset) and with the matching
+positions extracted from it.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "kamishirasawa"))
+
+from bench_lang_utils import DECKS
+from category_query import CategoryIndex, CategoryQuery, positions
+from kamishirasawa import Voc, read_deck
+
+QUERIES = {
+    "1ST GRADE & !NUMBERS | FAMILY": lambda c: "1ST GRADE" in c and "NUMBERS" not in c or "FAMILY" in c,
+    "(3RD GRADE | 4TH GRADE) & !EXTRA 1": lambda c: ("3RD GRADE" in c or "4TH GRADE" in c) and "EXTRA 1" not in c,
+    "!KYOUIKU KANJI": lambda c: "KYOUIKU KANJI" not in c,
+}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vocs", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=1000, help="evaluations per query, with positions a tenth and the scan a hundredth as often")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    shipped = [voc for deck in DECKS for voc in read_deck(os.path.join(ROOT, deck))]
+    extra = ["NUMBERS"] + [f"EXTRA {i}" for i in range(30)]
+    vocs = [Voc(voc.word, voc.meaning, voc.categories + rng.sample(extra, rng.randint(0, 2)))
+            for voc in (shipped[i % len(shipped)] for i in range(args.vocs))]
+
+    start = time.perf_counter()
+    index = CategoryIndex(vocs)
+    print(f"{len(vocs)} vocs, {len(index.bits)} categories, index built in {(time.perf_counter() - start) * 1e3:.1f} ms\n")
+
+    print(f"{'query':<36} {'matches':>8} {'bitset us':>10} {'+positions us':>14} {'scan us':>10}")
+    for expression, predicate in QUERIES.items():
+        query = CategoryQuery(expression)
+        bitset = _best(lambda: index.evaluate(query), args.repeat)
+        with_positions = _best(lambda: positions(index.evaluate(query)), max(1, args.repeat // 10))
+        scan = _best(lambda: [i for i, voc in enumerate(vocs) if predicate(set(voc.categories))], max(1, args.repeat // 100))
+
+        matches = positions(index.evaluate(query))
+        assert matches == [i for i, voc in enumerate(vocs) if predicate(set(voc.categories))]
+        print(f"{expression:<36} {len(matches):>8} {bitset * 1e6:>10.1f} {with_positions * 1e6:>14.1f} {scan * 1e6:>10.1f}")
+    return 0
+
+
+def _best(func, repeat: int) -> float:
+    """Returns the mean time of a call in the best of 3 runs of `repeat` calls."""
+    times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        times.append((time.perf_counter() - start) / repeat)
+    return min(times)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
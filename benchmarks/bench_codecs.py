@@ -0,0 +1,76 @@
+"""Compares size and read/write throughput of deck file formats.
+
+Usage:
+    python benchmarks/bench_codecs.py [--copies N] [--repeat N]
+
+The shipped decks are concatenated `--copies` times into one deck, which is then
+written and read back in every format: indented JSON (the default), compact JSON,
+compact JSON compressed with every available codec, and SQLite. Throughput is given
+in MB of the compact JSON content per second, so formats can be compared directly.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "kamishirasawa"))
+
+from bench_lang_utils import DECKS
+from kamishirasawa import CODECS, open_db, read_deck
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=10, help="number of copies of the shipped decks in the deck")
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs, the best one is kept")
+    args = parser.parse_args()
+
+    vocs = [voc for deck in DECKS for voc in read_deck(os.path.join(ROOT, deck))] * args.copies
+    content_mb = len(json.dumps([voc.__dict__ for voc in vocs], ensure_ascii=False,
+                                separators=(",", ":")).encode("utf-8")) / 1e6
+    print(f"{len(vocs)} vocs, {content_mb:.2f} MB of compact JSON\n")
+
+    formats = {
+        "json (indent=4)": (".kamidb", False),
+        "json (compact)": (".kamidb", True),
+        **{f"json{extension}": (".kamidb" + extension, True) for extension in CODECS},
+        "sqlite": (".kamisql", False),
+    }
+    if ".zst" not in CODECS:
+        print("zstandard is not installed, skipping zstd\n")
+
+    print(f"{'format':<18} {'size':>10} {'ratio':>7} {'write MB/s':>11} {'read MB/s':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, (extension, compact) in formats.items():
+            db = open_db(os.path.join(directory, "deck" + extension), compact)
+            try:
+                write = best_time(lambda: db.clear_and_write_data(vocs), args.repeat)
+                read = best_time(db.read_data, args.repeat)
+            finally:
+                db.close()
+            size = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+            for f in os.listdir(directory):
+                os.remove(os.path.join(directory, f))
+
+            print(f"{name:<18} {size / 1e3:>8.1f}kB {size / 1e6 / content_mb:>7.2f} "
+                  f"{content_mb / write:>11.1f} {content_mb / read:>10.1f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Measures imports of dictionaries by `kamishirasawa-cli import`, for time and memory.
+
+Usage:
+    python benchmarks/bench_dictimport.py [--entries N] [--jobs N ...] [--to EXTENSION]
+
+A dictionary in the format of JMdict is generated from the entries of
+fixtures/JMdict_sample.xml, repeated with numbered words up to `--entries` entries
+(JMdict itself has about 210 000), and a quarter of it. Every import runs in a
+fresh process, whose peak RSS (the highest of the process and its workers) should be
+the same for both sizes, as memory use doesn't depend on the size of the dictionary.
+"""
+
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "JMdict_sample.xml")
+CLI = os.path.join(ROOT, "kamishirasawa", "cli.py")
+
+
+def generate(path: str, entries: int) -> None:
+    with open(FIXTURE, encoding="utf-8") as file:
+        text = file.read()
+    head, rest = text.split("<JMdict>", 1)
+    templates = re.findall(r"<entry>.*?</entry>", rest, re.DOTALL)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(head + "<JMdict>\n")
+        for i in range(entries):
+            entry = templates[i % len(templates)]
+            file.write(re.sub(r"</(keb|reb)>", rf"{i}</\1>", entry) + "\n")
+        file.write("</JMdict>\n")
+
+
+def run(source: str, destination: str, jobs: int) -> tuple[float, int]:
+    """Returns the wall time and the peak RSS in bytes of an import."""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, CLI, "-j", str(jobs), "import", source, destination],
+                               stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise RuntimeError(f"import failed with status {process.returncode}")
+    return elapsed, usage.ru_maxrss * 1024
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=200_000)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, os.cpu_count()], help="worker process counts")
+    parser.add_argument("--to", default=".kamidb.gz", help="extension of the written deck")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="kamishirasawa-import-")
+    try:
+        print(f"{'entries':>8} {'MB':>7} {'jobs':>5} {'time s':>7} {'MB/s':>7} {'peak RSS MB':>12}")
+        for entries in (args.entries // 4, args.entries):
+            source = os.path.join(directory, f"JMdict_{entries}.xml")
+            generate(source, entries)
+            size = os.path.getsize(source)
+            for jobs in dict.fromkeys(args.jobs):
+                elapsed, peak = run(source, os.path.join(directory, "deck" + args.to), jobs)
+                print(f"{entries:>8} {size / 1e6:>7.1f} {jobs:>5} {elapsed:>7.2f} {size / 1e6 / elapsed:>7.1f} {peak / 1e6:>12.1f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Measures redraw latency of `KanjiKanaLabel` per question, offscreen.
+
+Usage:
+    python benchmarks/bench_kanji_label.py [--questions N] [--mode furigana|romaji|original]
+
+Words of the shipped decks are shown one after another in a label, like questions
+of a game are. The latency of a question is the time from `setText` until the label
+is laid out and painted (pending events processed and a synchronous repaint). The
+words are shown twice, as the second pass shows the same words again, and then
+once more switching the mode back and forth between furigana and romaji with every
+question, like toggling the display mode does.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "kamishirasawa"))
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtCore import qInstallMessageHandler
+from PyQt6.QtWidgets import QApplication
+
+from bench_lang_utils import DECKS
+from gui import KanjiKanaLabel
+from kamishirasawa import read_deck
+
+# The offscreen platform warns about every window resized by a layout
+qInstallMessageHandler(lambda mode, context, message:
+                       None if "propagateSizeHints" in message else print(message, file=sys.stderr))
+
+MODES = {"original": KanjiKanaLabel.Mode.ORIGINAL, "furigana": KanjiKanaLabel.Mode.FURIGANA,
+         "romaji": KanjiKanaLabel.Mode.ROMAJI}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--mode", choices=MODES, default="furigana")
+    args = parser.parse_args()
+
+    app = QApplication([])
+    words = [voc.word for deck in DECKS for voc in read_deck(os.path.join(ROOT, deck))][:args.questions]
+    label = KanjiKanaLabel(mode=MODES[args.mode])
+    label.show()
+    app.processEvents()
+
+    def redraw(text: str) -> float:
+        start = time.perf_counter()
+        label.setText(text)
+        app.processEvents()
+        label.repaint()
+        return time.perf_counter() - start
+
+    def toggled(text: str) -> float:
+        start = time.perf_counter()
+        label.setMode(KanjiKanaLabel.Mode.ROMAJI if label.mode == KanjiKanaLabel.Mode.FURIGANA
+                      else KanjiKanaLabel.Mode.FURIGANA)
+        return redraw(text) + time.perf_counter() - start
+
+    print(f"{len(words)} questions in {args.mode} mode\n")
+    print(f"{'pass':<14} {'median ms':>10} {'p95 ms':>8} {'max ms':>8}")
+    for name, measure in (("new words", redraw), ("same words", redraw), ("mode toggled", toggled)):
+        latencies = sorted(measure(word) * 1e3 for word in words)
+        p95 = latencies[int(len(latencies) * 0.95)]
+        print(f"{name:<14} {statistics.median(latencies):>10.2f} {p95:>8.2f} {latencies[-1]:>8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
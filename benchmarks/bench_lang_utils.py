@@ -0,0 +1,153 @@
+"""Micro-benchmarks of lang_utils conversions over every word of the shipped decks.
+
+Usage:
+    python benchmarks/bench_lang_utils.py                  # run and compare against the stored baseline
+    python benchmarks/bench_lang_utils.py --save-baseline  # run and store the results as the new baseline
+    python benchmarks/bench_lang_utils.py --threshold 0.2  # tolerate up to 20% throughput regression
+
+Each function is run once over all words on a cold start (module caches cleared)
+and then `--repeat` times warm, keeping the best warm run. Allocations are measured
+with tracemalloc over a separate warm pass. The script exits with status 1 if warm
+throughput of any function drops by more than the threshold against the baseline.
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "kamishirasawa"))
+
+import lang_utils
+from kamishirasawa import open_db
+
+DECKS = ["kanji_by_grade.kamidb", "family.kamidb"]
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lang_utils_baseline.json")
+
+FUNCTIONS: dict[str, Callable[[str], object]] = {
+    "to_romaji": lang_utils.to_romaji,
+    "to_hiragana": lang_utils.to_hiragana,
+    "contains_kanji": lang_utils.contains_kanji,
+    "furigana": lang_utils.furigana,
+    "convert_concat": lang_utils.convert_concat,
+}
+
+
+def load_words() -> list[str]:
+    words = []
+    for deck in DECKS:
+        db = open_db(os.path.join(ROOT, deck))
+        try:
+            words += [voc.word for voc in db.read_data()]
+        finally:
+            db.close()
+    return words
+
+def clear_caches() -> None:
+    """Clears memoization caches of lang_utils functions, if there are any."""
+    for value in vars(lang_utils).values():
+        if callable(cache_clear := getattr(value, "cache_clear", None)):
+            cache_clear()
+
+def run_pass(func: Callable[[str], object], words: list[str]) -> float:
+    start = time.perf_counter()
+    for word in words:
+        func(word)
+    return time.perf_counter() - start
+
+def measure_allocations(func: Callable[[str], object], words: list[str]) -> dict[str, int]:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for word in words:
+            func(word)
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    return {
+        "allocated_blocks": sum(max(0, s.count_diff) for s in stats),
+        "peak_bytes": peak,
+    }
+
+def benchmark(words: list[str], repeat: int) -> dict[str, dict[str, float]]:
+    results = {}
+    for name, func in FUNCTIONS.items():
+        gc.collect()
+        clear_caches()
+        cold = run_pass(func, words)
+        warm = min(run_pass(func, words) for _ in range(repeat))
+
+        results[name] = {
+            "cold_ops_per_sec": len(words) / cold,
+            "warm_ops_per_sec": len(words) / warm,
+            **measure_allocations(func, words),
+        }
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Returns descriptions of functions whose warm throughput regressed more than the threshold."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]["warm_ops_per_sec"]
+        actual = result["warm_ops_per_sec"]
+        if actual < expected * (1 - threshold):
+            regressions.append(f"{name}: {actual:,.0f} ops/s vs baseline {expected:,.0f} ops/s "
+                               f"({actual / expected - 1:+.1%})")
+    return regressions
+
+def print_results(results: dict, baseline: dict) -> None:
+    print(f"{'function':<16} {'cold ops/s':>12} {'warm ops/s':>12} {'vs baseline':>12} {'blocks':>10} {'peak KiB':>10}")
+    for name, r in results.items():
+        change = f"{r['warm_ops_per_sec'] / baseline[name]['warm_ops_per_sec'] - 1:+.1%}" if name in baseline else "-"
+        print(f"{name:<16} {r['cold_ops_per_sec']:>12,.0f} {r['warm_ops_per_sec']:>12,.0f} {change:>12} "
+              f"{r['allocated_blocks']:>10,} {r['peak_bytes'] / 1024:>10,.1f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="number of warm runs, the best one is kept")
+    parser.add_argument("--threshold", type=float, default=float(os.environ.get("KAMISHIRASAWA_BENCH_THRESHOLD", 0.1)),
+                        help="allowed relative throughput regression (default 0.1, or KAMISHIRASAWA_BENCH_THRESHOLD)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="path of the baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args()
+
+    words = load_words()
+    print(f"Benchmarking over {len(words)} words from {', '.join(DECKS)}\n")
+
+    results = benchmark(words, args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=4)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    if regressions := compare(results, baseline, args.threshold):
+        print(f"\nThroughput regressed by more than {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
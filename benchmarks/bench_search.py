@@ -0,0 +1,123 @@
+"""Measures the latency of searching vocs per keystroke, as the search input of the DB manager does.
+
+Usage:
+    python benchmarks/bench_search.py [--vocs N] [--repeat N] [--table]
+
+Vocs of the shipped decks are repeated up to `--vocs` vocs, with a number appended to
+their words so the words stay unique. Queries are typed one character at a time, and
+every keystroke is timed for `SearchIndex.matching_positions` (the positions filtering
+the table) and `SearchIndex.search` (the best 50 matches). Every query is typed
+`--repeat` times and the median is printed. With `--table` the vocs are also attached
+as a DB and shown in the DB manager offscreen, where a keystroke in its search input
+is timed (until its events are processed) alone, and followed by filtering the table,
+which is done once typing pauses (`DBManager.filter_voc_table`, including showing and
+hiding the rows and processing the events that follow). The table is shown unfiltered
+again before every query.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "kamishirasawa"))
+
+from bench_lang_utils import DECKS
+from kamishirasawa import Voc, read_deck
+from search import SearchIndex, voc_terms
+
+QUERIES = ["e", "one", "family", "ichi", "ng", "いち", "一"]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vocs", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--table", action="store_true", help="also time filtering the table of the DB manager")
+    args = parser.parse_args()
+
+    shipped = [voc for deck in DECKS for voc in read_deck(os.path.join(ROOT, deck))]
+    vocs = [Voc(f"{voc.word}{i // len(shipped)}", voc.meaning, voc.categories)
+            for i, voc in ((i, shipped[i % len(shipped)]) for i in range(args.vocs))]
+
+    start = time.perf_counter()
+    terms = [voc_terms(voc) for voc in vocs]
+    converted = time.perf_counter() - start
+    index = SearchIndex()
+    index.add("db", vocs, terms)
+    print(f"{len(vocs)} vocs, readings converted in {converted:.1f} s, "
+          f"indexed in {time.perf_counter() - start - converted:.1f} s\n")
+
+    def keystrokes(func, before_query=lambda: None) -> dict[str, list[float]]:
+        latencies = {}
+        for _ in range(args.repeat):
+            for query in QUERIES:
+                before_query()
+                for end in range(1, len(query) + 1):
+                    start = time.perf_counter()
+                    func(query[:end])
+                    latencies.setdefault(query[:end], []).append(time.perf_counter() - start)
+        return latencies
+
+    columns = {"matches": {query: [len(index.matching_positions("db", query))]
+                           for query in keystrokes(lambda query: None)},
+               "positions ms": keystrokes(lambda query: index.matching_positions("db", query)),
+               "search ms": keystrokes(lambda query: index.search(query))}
+    if args.table:
+        columns["keystroke ms"], columns["filter ms"] = table_keystrokes(vocs, terms, keystrokes)
+
+    print(f"{'keystroke':<10}" + "".join(f"{name:>14}" for name in columns))
+    for query in columns["matches"]:
+        row = [f"{columns['matches'][query][0]:>14}"]
+        row += [f"{statistics.median(column[query]) * 1e3:>14.2f}" for name, column in columns.items() if name != "matches"]
+        print(f"{query:<10}" + "".join(row))
+    return 0
+
+
+def table_keystrokes(vocs: list, terms: list, keystrokes) -> tuple[dict[str, list[float]], dict[str, list[float]]]:
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    # The workspace is stored in the home directory, whose path is read on import
+    home = tempfile.mkdtemp(prefix="kamishirasawa-bench-")
+    os.environ["HOME"] = os.environ["USERPROFILE"] = home
+
+    from PyQt6.QtCore import qInstallMessageHandler
+    from PyQt6.QtWidgets import QApplication
+
+    from gui import DBManager, MainWindow
+    from kamishirasawa import open_db
+
+    qInstallMessageHandler(lambda mode, context, message:
+                           None if "propagateSizeHints" in message else print(message, file=sys.stderr))
+
+    app = QApplication([])
+    window = MainWindow()
+    window.show()
+    db = open_db(os.path.join(home, "bench.kamidb"))
+    db.clear_and_write_data(vocs)
+    window.kamishirasawa.attach_loaded_db(db, vocs, terms)
+    manager = DBManager(window)
+    window.replace_central_widget(manager)
+    app.processEvents()
+
+    def typed(query: str) -> None:
+        manager.search_input.setText(query)
+        app.processEvents()
+
+    def filtered(query: str) -> None:
+        manager.filter_voc_table()
+        app.processEvents()
+
+    def unfiltered() -> None:
+        manager.search_input.setText("")
+        filtered("")
+
+    latencies = keystrokes(typed, unfiltered), keystrokes(lambda query: (typed(query), filtered(query)), unfiltered)
+    window.close()
+    return latencies
+
+
+if __name__ == "__main__":
+    sys.exit(main())
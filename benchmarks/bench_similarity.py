@@ -0,0 +1,73 @@
+"""Compares LSH lookups of similar vocs in `SimilarityIndex` against an exact scan.
+
+Usage:
+    python benchmarks/bench_similarity.py [--limit N] [--repeat N]
+
+Every voc of the shipped decks is used as a query. The exact scan computes the
+Jaccard similarity of the query's features with every other voc. Recall is the
+fraction of the `--limit` results of the index which are as similar to the query as
+the exact `--limit` nearest vocs (with similarity above zero).
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "kamishirasawa"))
+
+from bench_lang_utils import DECKS
+from kamishirasawa import read_deck
+from similarity import SimilarityIndex, voc_features
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=5, help="number of similar vocs looked up per query")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs, the best one is kept")
+    args = parser.parse_args()
+
+    vocs = [voc for deck in DECKS for voc in read_deck(os.path.join(ROOT, deck))]
+    features = {id(voc): voc_features(voc) for voc in vocs}
+    print(f"{len(vocs)} vocs\n")
+
+    start = time.perf_counter()
+    index = SimilarityIndex(vocs, seed=0)
+    print(f"index built in {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+    def jaccard(a, b) -> float:
+        a, b = features[id(a)], features[id(b)]
+        return len(a & b) / len(a | b)
+
+    def exact(query):
+        scored = [(jaccard(query, voc), voc) for voc in vocs if voc is not query]
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return [voc for score, voc in scored[:args.limit] if score > 0]
+
+    for name, func in (("lsh", lambda q: index.similar(q, args.limit)), ("exact scan", exact)):
+        best = min(_timed(func, vocs) for _ in range(args.repeat))
+        print(f"{name:<12} {best / len(vocs) * 1e6:>10.1f} us/query")
+
+    # Many vocs are equally similar to a query, so any voc at least as similar as the worst
+    # of the exact results counts as found
+    found = relevant = 0
+    for query in vocs:
+        if not (expected := exact(query)):
+            continue
+        threshold = jaccard(query, expected[-1])
+        relevant += len(expected)
+        found += sum(jaccard(query, voc) >= threshold for voc in index.similar(query, len(expected)))
+    print(f"\nrecall@{args.limit}: {found / relevant if relevant else 1:.2f}")
+    return 0
+
+
+def _timed(func, queries) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        func(query)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Compares the trie-based transliterator with romkan on romaji readings of the shipped decks.
+
+Usage:
+    python benchmarks/bench_transliterate.py [--repeat N]
+
+Romaji readings of all words are generated with pykakasi first, then converted to
+hiragana by both engines, one call per word and with the batch API. Words for which
+the engines disagree are counted and a few of them are listed. Finally, typing a line
+character by character with live conversion is timed, incrementally and by
+converting the whole line on every keystroke.
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "kamishirasawa"))
+
+import lang_utils
+import transliterate
+from bench_lang_utils import load_words
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs, the best one is kept")
+    args = parser.parse_args()
+
+    readings = ["".join(lang_utils.to_romaji(word).split()) for word in load_words()]
+    print(f"Converting {len(readings)} romaji readings\n")
+
+    engines = {
+        "trie": lambda: [transliterate.romaji_to_hiragana(r) for r in readings],
+        "trie (batch)": lambda: transliterate.romaji_to_hiragana_many(readings),
+    }
+    try:
+        import romkan
+        engines["romkan"] = lambda: [romkan.to_hiragana(r) for r in readings]
+    except ImportError:
+        romkan = None
+        print("romkan is not installed, comparing the trie engine only\n")
+
+    for name, func in engines.items():
+        elapsed = best_time(func, args.repeat)
+        print(f"{name:<14} {len(readings) / elapsed:>14,.0f} words/s {elapsed * 1e3:>10.2f} ms")
+
+    # Live conversion while typing: per keystroke, the incremental transliterator only matches the
+    # unconfirmed tail, while converting the whole line gets slower as the line grows
+    print("\nTyping a line, time per keystroke:")
+    text = "watashihanihongowobenkyoushiteimasu" * 30
+    for length in (10, 100, 1000):
+        line = text[:length]
+        def type_incrementally():
+            composer = transliterate.IncrementalTransliterator(transliterate.ROMAJI_TO_HIRAGANA)
+            for char in line:
+                composer.type(char)
+                composer.text
+        def reconvert():
+            for i in range(1, len(line) + 1):
+                transliterate.romaji_to_hiragana(line[:i])
+        incremental, full = best_time(type_incrementally, args.repeat), best_time(reconvert, args.repeat)
+        print(f"{length:>5} chars  incremental {incremental / length * 1e6:>8.2f} us  "
+              f"whole line {full / length * 1e6:>8.2f} us")
+
+    if romkan:
+        mismatches = [(r, transliterate.romaji_to_hiragana(r), romkan.to_hiragana(r)) for r in readings
+                      if transliterate.romaji_to_hiragana(r) != romkan.to_hiragana(r)]
+        print(f"\n{len(mismatches)} readings converted differently (reading, trie, romkan):")
+        for mismatch in mismatches[:10]:
+            print("  ", *mismatch)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
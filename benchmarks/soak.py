@@ -0,0 +1,235 @@
+"""Soak test of the GUI, looking for resources that grow with every use of the app.
+
+Usage:
+    python benchmarks/soak.py [--cycles N] [--questions N] [--warmup N] [--seed N] [--check-latency]
+
+The main window runs offscreen (QT_QPA_PLATFORM=offscreen, unless set otherwise)
+with a temporary home directory, so sessions and the workspace of the user aren't
+touched. Every cycle:
+    opens DB manager, attaches copies of the shipped decks
+    opens the DB game setup, plays `--questions` answers in choice mode
+    and `--questions` answers in text input mode
+    detaches the decks, opens DB manager and the kana setup again
+Every cycle ends in the same state, so after it (once background work is done and
+deferred deletes stop changing the counts) the following are sampled:
+    rss        resident set size of the process
+    widgets    widgets alive in Qt, including ones without a parent
+    qobjects   QObject wrappers alive in Python
+    handlers   callbacks subscribed to all Events and ObservableFlags
+and latencies of every operation are collected. Cycles after `--warmup` are judged by
+comparing their first and last quarter: a value counts as growing only if even its
+lowest sample in the last quarter is above the highest one in the first quarter (by
+more than `--rss-tolerance` for RSS), so counts that go up and down between cycles
+don't fail the run, while ones growing every cycle do. Median latencies are printed,
+and judged the same way (allowing `--latency-tolerance` and at least a millisecond)
+only with `--check-latency`, as they depend on the load of the machine. The script
+exits with status 1 on unbounded growth.
+"""
+
+import argparse
+import gc
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "kamishirasawa"))
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+# Snapshots and the workspace are stored in the home directory, whose path is read on import
+HOME = tempfile.mkdtemp(prefix="kamishirasawa-soak-")
+os.environ["HOME"] = os.environ["USERPROFILE"] = HOME
+
+from PyQt6.QtCore import (QCoreApplication, QEvent, QObject, QThreadPool,
+                          qInstallMessageHandler)
+from PyQt6.QtWidgets import QApplication
+
+import utils
+from bench_lang_utils import DECKS
+from games import JaToEnGame
+from gui import (ChoiceFlashcardGameWidget, DBGameSetupWidget, DBManager,
+                 HiraganaTestSetupWidget, MainWindow,
+                 TextInputFlashcardGameWidget)
+
+
+# The offscreen platform warns about every window resized by a layout
+qInstallMessageHandler(lambda mode, context, message:
+                       None if "propagateSizeHints" in message else print(message, file=sys.stderr))
+
+
+def rss() -> int:
+    """Returns the current resident set size in bytes, or the peak one where it's not available."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Soak:
+    def __init__(self, app: QApplication, questions: int) -> None:
+        self.app = app
+        self.questions = questions
+        self.window = MainWindow()
+        self.window.show()
+        self.latencies: dict[str, list[float]] = defaultdict(list)  # of the current cycle
+
+        self.decks = []
+        for deck in DECKS:
+            shutil.copy(os.path.join(ROOT, deck), path := os.path.join(HOME, deck))
+            self.decks.append(path)
+
+    def settle(self) -> None:
+        """Runs pending events, including deferred deletes of replaced widgets."""
+        self.app.processEvents()
+        QCoreApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete.value)
+        self.app.processEvents()
+        
+    def quiesce(self, rounds: int = 20) -> None:
+        """Waits for background runnables and settles until the counts of widgets and QObjects stop changing.
+        A deferred delete can post more of them, and runnables keep the widgets they work for alive until they end."""
+        previous = None
+        for _ in range(rounds):
+            QThreadPool.globalInstance().waitForDone()
+            self.settle()
+            gc.collect()
+            counts = len(QApplication.allWidgets()), sum(isinstance(o, QObject) for o in gc.get_objects())
+            if counts == previous:
+                return
+            previous = counts
+
+    def timed(self, name: str, func: Callable[[], object]) -> None:
+        start = time.perf_counter()
+        func()
+        self.settle()
+        self.latencies[name].append(time.perf_counter() - start)
+
+    def vocs(self) -> list:
+        return [voc for vocs in self.window.kamishirasawa.snapshot.vocs.values() for voc in vocs]
+
+    def play_choice(self) -> None:
+        played = 0
+        while played < self.questions:
+            game = JaToEnGame(self.vocs(), passes_per_flashcard=2, window=100)
+            widget = ChoiceFlashcardGameWidget(self.window, game, choices=4, pool=self.vocs())
+            self.timed("open game", lambda: self.window.replace_central_widget(widget))
+            while played < self.questions and not game.is_done:
+                answers = [button.answer for button in widget.answer_buttons]
+                wrong = [answer for answer in answers if not game.check_answer(answer)]
+                answer = random.choice(wrong) if wrong and random.random() < 0.3 else game.answer
+                self.timed("choice answer", lambda: widget.give_answer(answer))
+                self.timed("next question", lambda: widget.give_answer(answer))
+                played += 1
+
+    def play_text_input(self) -> None:
+        played = 0
+        while played < self.questions:
+            game = JaToEnGame(self.vocs(), passes_per_flashcard=2, window=100)
+            widget = TextInputFlashcardGameWidget(self.window, game)
+            self.timed("open game", lambda: self.window.replace_central_widget(widget))
+            while played < self.questions and not game.is_done:
+                widget.answer_input.setText(game.answer if random.random() < 0.7 else "?")
+                self.timed("text answer", widget.on_confirm_pressed)
+                self.timed("next question", widget.on_confirm_pressed)
+                played += 1
+
+    def cycle(self) -> None:
+        self.latencies.clear()
+        window = self.window
+        self.timed("open DB manager", lambda: window.replace_central_widget(DBManager(window)))
+        for path in self.decks:
+            self.timed("attach", lambda: window.kamishirasawa.attach_db(path))
+        self.timed("open DB game setup", lambda: window.replace_central_widget(DBGameSetupWidget(window)))
+        self.play_choice()
+        self.play_text_input()
+        for db in window.kamishirasawa.dbs:
+            self.timed("detach", lambda: window.kamishirasawa.detach_db(db))
+        self.timed("open DB manager", lambda: window.replace_central_widget(DBManager(window)))
+        self.timed("open kana setup", lambda: window.replace_central_widget(HiraganaTestSetupWidget(window)))
+
+    def sample(self) -> dict[str, float]:
+        self.quiesce()
+        objects = gc.get_objects()
+        return {
+            "rss": rss(),
+            "widgets": len(QApplication.allWidgets()),
+            "qobjects": sum(isinstance(o, QObject) for o in objects),
+            "handlers": sum(o.handler_count for o in objects if isinstance(o, (utils.Event, utils.ObservableFlag))),
+        }
+
+
+COUNTS = ("widgets", "qobjects", "handlers")
+
+
+def grew(early: list[float], late: list[float], tolerance: float = 0, minimum: float = 0) -> bool:
+    """Checks if every late sample is above all early ones, by more than a relative `tolerance` and `minimum`."""
+    return min(late) > max(early) * (1 + tolerance) and min(late) - max(early) > minimum
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--questions", type=int, default=100, help="answers per game mode in a cycle")
+    parser.add_argument("--warmup", type=int, default=3, help="cycles not judged, while caches fill up")
+    parser.add_argument("--seed", type=int, default=0, help="seed of games and answers")
+    parser.add_argument("--rss-tolerance", type=float, default=0.1, help="allowed relative RSS growth")
+    parser.add_argument("--check-latency", action="store_true", help="fail on growing median latencies too")
+    parser.add_argument("--latency-tolerance", type=float, default=0.5, help="allowed relative median latency growth")
+    args = parser.parse_args()
+    assert args.cycles - args.warmup >= 2
+    random.seed(args.seed)
+
+    app = QApplication(sys.argv)
+    soak = Soak(app, args.questions)
+    samples, medians = [], []
+    print(f"{'cycle':>5} {'rss MB':>8} {'widgets':>8} {'qobjects':>9} {'handlers':>9}  slowest median latency")
+    try:
+        for i in range(args.cycles):
+            soak.cycle()
+            samples.append(soak.sample())
+            medians.append({name: statistics.median(times) for name, times in soak.latencies.items()})
+            slowest = max(medians[-1].items(), key=lambda item: item[1])
+            print(f"{i + 1:>5} {samples[-1]['rss'] / 1e6:>8.1f} {samples[-1]['widgets']:>8} "
+                  f"{samples[-1]['qobjects']:>9} {samples[-1]['handlers']:>9}  {slowest[0]} {slowest[1] * 1e3:.2f} ms")
+    finally:
+        soak.window.close()
+        shutil.rmtree(HOME, ignore_errors=True)
+
+    # The first and the last quarter of the judged cycles
+    judged = args.cycles - args.warmup
+    window = max(1, judged // 4)
+    early, late = slice(args.warmup, args.warmup + window), slice(args.cycles - window, args.cycles)
+
+    failures = []
+    for name in [*COUNTS, "rss"]:
+        before, after = [s[name] for s in samples[early]], [s[name] for s in samples[late]]
+        if grew(before, after, args.rss_tolerance if name == "rss" else 0):
+            if name == "rss":
+                failures.append(f"RSS grew from at most {max(before) / 1e6:.1f} MB to at least {min(after) / 1e6:.1f} MB")
+            else:
+                failures.append(f"{name} grew from at most {max(before)} to at least {min(after)}")
+    for operation in medians[args.warmup] if args.check_latency else ():
+        before = [m[operation] for m in medians[early] if operation in m]
+        after = [m[operation] for m in medians[late] if operation in m]
+        # Growth below a millisecond is timer noise, not a leak
+        if before and after and grew(before, after, args.latency_tolerance, 1e-3):
+            failures.append(f"median latency of '{operation}' grew from at most {max(before) * 1e3:.2f} ms "
+                            f"to at least {min(after) * 1e3:.2f} ms")
+
+    print()
+    for failure in failures:
+        print("FAIL", failure)
+    if not failures:
+        print("OK, no unbounded growth")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
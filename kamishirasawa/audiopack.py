@@ -0,0 +1,292 @@
+"""Audio packs: speech for every word of a deck, synthesized ahead of time.
+
+A pack is a single archive file next to its deck (`<deck file>.kamiaudio`):
+    header      magic, format version, offset of the index
+    clips       encoded audio of all texts, one after another
+    index       language, text, offset and length of every clip
+Playback reads a clip by its offset from the memory-mapped archive, without any
+synthesis. Packs are built by a bounded pool of worker threads calling a synthesis
+backend, with rate limiting and retries. Clips already in an existing pack are
+reused when it's rebuilt, so only new texts are synthesized.
+"""
+
+import io
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+import gtts
+
+MAGIC = b"KAUD"
+VERSION = 1
+EXTENSION = ".kamiaudio"
+
+HEADER = struct.Struct("<4sBQ")
+ENTRY = struct.Struct("<QI")
+
+WORD_LANG = "ja"
+MEANING_LANG = "en"
+
+
+class AudioPackError(Exception):
+    pass
+
+class SynthesisError(Exception):
+    pass
+
+
+def archive_path(deck_path: str) -> str:
+    return deck_path + EXTENSION
+
+
+class SynthesisBackend(ABC):
+    @abstractmethod
+    def synthesize(self, text: str, lang: str) -> bytes:
+        """Returns encoded audio of the text spoken in the language. May be called from many threads at once."""
+        ...
+
+class GTTSBackend(SynthesisBackend):
+    """Google Translate's text-to-speech, producing MP3."""
+
+    def __init__(self, slow: bool = True) -> None:
+        self.slow = slow
+
+    def synthesize(self, text: str, lang: str) -> bytes:
+        buffer = io.BytesIO()
+        gtts.gTTS(text, lang=lang, slow=self.slow).write_to_fp(buffer)
+        return buffer.getvalue()
+
+class FakeBackend(SynthesisBackend):
+    """Local stand-in for a real backend, producing the text itself as 'audio'. It can be made slow
+    and unreliable, to exercise the worker pool, rate limiting and retries without network access."""
+
+    def __init__(self, latency: float = 0, failure_rate: float = 0, seed: int = None) -> None:
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def synthesize(self, text: str, lang: str) -> bytes:
+        with self.lock:
+            self.calls += 1
+            fail = self.random.random() < self.failure_rate
+        time.sleep(self.latency)
+        if fail:
+            raise SynthesisError(f"Fake failure synthesizing '{text}'.")
+        return f"FAKE {lang} {text}".encode("utf-8")
+
+BACKENDS: dict[str, Callable[[], SynthesisBackend]] = {"gtts": GTTSBackend, "fake": FakeBackend}
+
+
+class RateLimiter:
+    """Spaces calls from all threads at least 1/rate seconds apart. A rate of 0 means no limit."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            scheduled = max(now, self.next_time)
+            self.next_time = scheduled + self.interval
+        time.sleep(scheduled - now)
+
+
+def _pack_str(s: str) -> bytes:
+    encoded = s.encode("utf-8")
+    return struct.pack("<I", len(encoded)) + encoded
+
+
+class AudioArchive:
+    """Read access to a pack. Clips are copied out of the memory-mapped file, so they stay valid after it's closed."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.index: dict[str, dict[str, tuple[int, int]]] = {}  # {text: {lang: (offset, length)}}
+        with open(path, "rb") as file:
+            try:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                raise AudioPackError(f"'{path}' is not an audio pack.")
+        try:
+            self.__read_index()
+        except (struct.error, UnicodeDecodeError) as e:
+            self.close()
+            raise AudioPackError(*e.args)
+        except AudioPackError:
+            self.close()
+            raise
+
+    def __read_index(self) -> None:
+        magic, version, offset = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise AudioPackError(f"Unsupported audio pack format {magic!r} version {version}.")
+
+        count, = struct.unpack_from("<I", self.map, offset)
+        offset += 4
+        for _ in range(count):
+            strings = []
+            for _ in range(2):
+                length, = struct.unpack_from("<I", self.map, offset)
+                strings.append(self.map[offset + 4:offset + 4 + length].decode("utf-8"))
+                offset += 4 + length
+            lang, text = strings
+            self.index.setdefault(text, {})[lang] = ENTRY.unpack_from(self.map, offset)
+            offset += ENTRY.size
+
+    def __len__(self) -> int:
+        return sum(len(langs) for langs in self.index.values())
+
+    def __contains__(self, key: tuple[str, str]) -> bool:
+        text, lang = key
+        return lang in self.index.get(text, ())
+
+    def get(self, text: str, lang: str = None) -> Optional[bytes]:
+        """Returns the clip of the text in the language, or in any language if it's not given."""
+        if not (langs := self.index.get(text)):
+            return None
+        if (entry := langs.get(lang) if lang else next(iter(langs.values()))) is None:
+            return None
+        offset, length = entry
+        with self.lock:
+            if self.map.closed:
+                return None
+            return self.map[offset:offset + length]
+
+    def close(self) -> None:
+        with self.lock:
+            self.map.close()
+
+
+class AudioArchiveWriter:
+    """Writes a pack to a temporary file, which replaces the pack at `path` only when it's complete."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.temp_path = path + ".tmp"
+        self.file = open(self.temp_path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, 0))
+        self.entries: list[tuple[str, str, int, int]] = []
+
+    def add(self, text: str, lang: str, data: bytes) -> None:
+        self.entries.append((lang, text, self.file.tell(), len(data)))
+        self.file.write(data)
+
+    def commit(self) -> None:
+        index_offset = self.file.tell()
+        self.file.write(b"".join([struct.pack("<I", len(self.entries)),
+                                  *(_pack_str(lang) + _pack_str(text) + ENTRY.pack(offset, length)
+                                    for lang, text, offset, length in self.entries)]))
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, index_offset))
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self) -> None:
+        self.file.close()
+        os.remove(self.temp_path)
+
+
+def texts_of(vocs: Iterable, include_meanings: bool = False) -> list[tuple[str, str]]:
+    """Returns unique (text, lang) pairs to be spoken for vocs: their words and optionally their meanings."""
+    texts = {}
+    for voc in vocs:
+        texts[voc.word, WORD_LANG] = None
+        if include_meanings:
+            texts.update(((meaning, MEANING_LANG), None) for meaning in voc.meaning)
+    return [key for key in texts if key[0].strip()]
+
+
+@dataclass
+class PackResult:
+    path: str
+    synthesized: int
+    reused: int
+    failed: list[tuple[str, str]]  # (text, lang) pairs which couldn't be synthesized
+
+
+def _synthesize(backend: SynthesisBackend, limiter: RateLimiter, text: str, lang: str,
+                retries: int, backoff: float) -> bytes:
+    for attempt in range(retries + 1):
+        limiter.wait()
+        try:
+            return backend.synthesize(text, lang)
+        except Exception:
+            if attempt == retries:
+                raise
+            # Exponential backoff with jitter, so workers failing together don't retry together
+            time.sleep(backoff * 2**attempt * random.uniform(0.5, 1.5))
+
+def build_pack(vocs: Iterable, path: str, backend: SynthesisBackend = None, include_meanings: bool = False,
+               workers: int = 4, rate: float = 5, retries: int = 3, backoff: float = 1.0,
+               on_progress: Callable[[int, int], None] = None) -> PackResult:
+    """Builds the pack at `path` with clips of the words (and meanings) of vocs. At most `workers` texts
+    are synthesized at once and at most `rate` requests per second are made, failed requests are
+    retried `retries` times. Texts which still fail are left out of the pack and reported in the result.
+    `on_progress` is called with the number of done and all texts."""
+    backend = backend or GTTSBackend()
+    texts = texts_of(vocs, include_meanings)
+    try:
+        old = AudioArchive(path) if os.path.isfile(path) else None
+    except AudioPackError:
+        old = None
+
+    writer = AudioArchiveWriter(path)
+    result = PackResult(path, 0, 0, [])
+    done = 0
+    try:
+        missing = []
+        for text, lang in texts:
+            if old and (data := old.get(text, lang)) is not None:
+                writer.add(text, lang, data)
+                result.reused += 1
+                done += 1
+            else:
+                missing.append((text, lang))
+        if on_progress:
+            on_progress(done, len(texts))
+
+        # Only a bounded number of texts is submitted at a time, clips are written by this thread as they come
+        limiter = RateLimiter(rate)
+        pending: dict[Future, tuple[str, str]] = {}
+        remaining = iter(missing)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                for text, lang in remaining:
+                    pending[executor.submit(_synthesize, backend, limiter, text, lang, retries, backoff)] = text, lang
+                    if len(pending) >= 2 * workers:
+                        break
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    text, lang = pending.pop(future)
+                    try:
+                        writer.add(text, lang, future.result())
+                        result.synthesized += 1
+                    except Exception:
+                        result.failed.append((text, lang))
+                    done += 1
+                if on_progress:
+                    on_progress(done, len(texts))
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        if old:
+            old.close()
+
+    writer.commit()
+    return result
@@ -0,0 +1,166 @@
+"""Boolean queries over categories of vocs, like `1ST GRADE & !NUMBERS | FAMILY`.
+
+Grammar, from the loosest binding operator:
+    expression  term ('|' term)*
+    term        factor ('&' factor)*
+    factor      '!' factor | '(' expression ')' | category name
+Category names are any text between operators, compared like categories of vocs are
+(case insensitive, with surrounding whitespace ignored).
+
+A `CategoryIndex` assigns every category of a deck a bit and keeps the categories of
+every voc as an integer bitmask. For evaluation it also keeps the transposed bit-matrix:
+one integer per category with the bit of every voc in it set. Operators then work on
+whole columns at once as bitwise operations on big integers, done by Python a machine
+word at a time, so a query over 100 000 vocs takes microseconds instead of a loop over vocs.
+"""
+
+import re
+from typing import Iterable, Sequence, Union
+
+# A parsed query is a tree of tuples: ("|", a, b), ("&", a, b), ("!", a) and category names as leaves
+Node = Union[str, tuple]
+
+TOKEN = re.compile(r"\s*(?:([&|!()])|([^&|!()]+))")
+
+
+class QueryError(Exception):
+    pass
+
+
+def normalize(name: str) -> str:
+    return " ".join(name.split()).upper()
+
+
+class CategoryQuery:
+    def __init__(self, expression: str) -> None:
+        self.expression = expression
+        self.tokens = self.__tokenize(expression)
+        self.position = 0
+        self.tree = self.__expression()
+        if self.position < len(self.tokens):
+            raise QueryError(f"Unexpected '{self.tokens[self.position]}'.")
+        del self.tokens
+
+    @staticmethod
+    def __tokenize(expression: str) -> list[str]:
+        tokens = []
+        for match in TOKEN.finditer(expression):
+            operator, name = match.groups()
+            if operator:
+                tokens.append(operator)
+            elif name := normalize(name):
+                tokens.append(name)
+        return tokens
+
+    def __peek(self) -> str:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def __take(self) -> str:
+        if (token := self.__peek()) is None:
+            raise QueryError("Unexpected end of the query.")
+        self.position += 1
+        return token
+
+    def __expression(self) -> Node:
+        node = self.__term()
+        while self.__peek() == "|":
+            self.position += 1
+            node = ("|", node, self.__term())
+        return node
+
+    def __term(self) -> Node:
+        node = self.__factor()
+        while self.__peek() == "&":
+            self.position += 1
+            node = ("&", node, self.__factor())
+        return node
+
+    def __factor(self) -> Node:
+        token = self.__take()
+        if token == "!":
+            return ("!", self.__factor())
+        if token == "(":
+            node = self.__expression()
+            if self.__take() != ")":
+                raise QueryError("Missing ')'.")
+            return node
+        if token in ("&", "|", ")"):
+            raise QueryError(f"Expected a category before '{token}'.")
+        return token
+
+    @property
+    def categories(self) -> set[str]:
+        """Returns names of all categories used in the query."""
+        def names(node: Node) -> Iterable[str]:
+            if isinstance(node, str):
+                yield node
+            else:
+                for child in node[1:]:
+                    yield from names(child)
+        return set(names(self.tree))
+
+    def __str__(self) -> str:
+        return self.expression
+
+
+class CategoryIndex:
+    """Categories of a sequence of vocs as bitmasks. Vocs are referred to by their positions in it."""
+
+    def __init__(self, vocs: Sequence) -> None:
+        self.size = len(vocs)
+        self.bits: dict[str, int] = {}  # category: its bit in the masks of vocs
+        self.masks: list[int] = []
+        for voc in vocs:
+            mask = 0
+            for category in voc.categories:
+                mask |= 1 << self.bits.setdefault(category, len(self.bits))
+            self.masks.append(mask)
+
+        # Columns are built as byte arrays, setting bits of a growing integer would copy it for every voc
+        columns = [bytearray((self.size + 7) // 8) for _ in self.bits]
+        for position, mask in enumerate(self.masks):
+            while mask:
+                bit = mask.bit_length() - 1
+                columns[bit][position >> 3] |= 1 << (position & 7)
+                mask ^= 1 << bit
+        self.columns: dict[str, int] = {category: int.from_bytes(columns[bit], "little")
+                                        for category, bit in self.bits.items()}
+        self.all = (1 << self.size) - 1
+
+    def evaluate(self, query: CategoryQuery) -> int:
+        """Returns a bitset of vocs matching the query, with bit i set for the voc at position i.
+        Categories the vocs don't have match nothing."""
+        def evaluate(node: Node) -> int:
+            if isinstance(node, str):
+                return self.columns.get(node, 0)
+            if node[0] == "!":
+                return self.all ^ evaluate(node[1])
+            if node[0] == "&":
+                return evaluate(node[1]) & evaluate(node[2])
+            return evaluate(node[1]) | evaluate(node[2])
+        return evaluate(query.tree)
+
+    def matches(self, position: int, query: CategoryQuery) -> bool:
+        """Checks a single voc against the query, using its mask."""
+        mask = self.masks[position]
+        def evaluate(node: Node) -> bool:
+            if isinstance(node, str):
+                return node in self.bits and mask >> self.bits[node] & 1 == 1
+            if node[0] == "!":
+                return not evaluate(node[1])
+            if node[0] == "&":
+                return evaluate(node[1]) and evaluate(node[2])
+            return evaluate(node[1]) or evaluate(node[2])
+        return evaluate(query.tree)
+
+
+def positions(bitset: int) -> list[int]:
+    """Returns positions of set bits, in ascending order."""
+    # Scanning the binary representation for ones is done by str.find in C, skipping runs of zeros
+    digits = bin(bitset)[:1:-1]
+    result = []
+    position = digits.find("1")
+    while position != -1:
+        result.append(position)
+        position = digits.find("1", position + 1)
+    return result
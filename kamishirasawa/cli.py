@@ -0,0 +1,230 @@
+"""Headless command-line tool for working with decks, no display server needed.
+
+    kamishirasawa-cli convert family.tsv -o decks/ --to kamidb
+    kamishirasawa-cli stats *.kamidb
+    kamishirasawa-cli validate *.kamidb --jobs 8
+    kamishirasawa-cli serve *.kamidb --port 7373
+    kamishirasawa-cli pull localhost:7373 family.kamidb local/family.kamidb
+    kamishirasawa-cli audio *.kamidb --meanings --workers 8 --rate 10
+    kamishirasawa-cli import JMdict_e.gz jmdict.kamidb.gz
+
+Operations on many files run in parallel in a process pool.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable
+
+import audiopack
+import dictimport
+import sync
+from kamishirasawa import (CODECS, LIST_DELIMITERS, Voc, open_db, read_deck,
+                           write_deck)
+
+FORMATS = {
+    "kamidb": ".kamidb",
+    "kamisql": ".kamisql",
+    "tsv": ".tsv",
+    **{"kamidb" + extension: ".kamidb" + extension for extension in CODECS},
+}
+
+
+def deck_name(path: str) -> str:
+    """Returns a file name without any of the known deck extensions."""
+    name = os.path.basename(path)
+    for extension in sorted(FORMATS.values(), key=len, reverse=True):
+        if name.lower().endswith(extension):
+            return name[:-len(extension)]
+    return os.path.splitext(name)[0]
+
+
+def convert(path: str, output_dir: str, extension: str, compact: bool) -> str:
+    destination = os.path.join(output_dir or os.path.dirname(path), deck_name(path) + extension)
+    if os.path.abspath(destination) == os.path.abspath(path):
+        raise ValueError("destination is the same file as the source")
+
+    vocs = read_deck(path)
+    write_deck(destination, vocs, compact)
+    return f"{path} -> {destination} ({len(vocs)} vocs)"
+
+def stats(path: str) -> str:
+    vocs = read_deck(path)
+    categories = Counter(category for voc in vocs for category in voc.categories)
+    uncategorised = sum(not voc.categories for voc in vocs)
+
+    lines = [f"{path}: {len(vocs)} vocs, {len(categories)} categories"]
+    lines += [f"  {category:<30} {count:>7}" for category, count in sorted(categories.items())]
+    if uncategorised:
+        lines.append(f"  {'(non categorised)':<30} {uncategorised:>7}")
+    return "\n".join(lines)
+
+def validation_problems(vocs: Iterable[Voc]) -> list[str]:
+    """Returns descriptions of problems found in vocs: empty words or meanings, duplicates, malformed categories."""
+    problems = []
+    words = Counter()
+    for i, voc in enumerate(vocs):
+        where = f"voc {i} '{voc.word}'"
+        words[voc.word] += 1
+
+        if not voc.word.strip():
+            problems.append(f"voc {i}: empty word")
+        if not voc.meaning or any(not meaning for meaning in voc.meaning):
+            problems.append(f"{where}: empty meaning")
+        for category in voc.categories:
+            if not category or any(delimiter in category for delimiter in LIST_DELIMITERS) or category != " ".join(category.split()):
+                problems.append(f"{where}: malformed category '{category}'")
+
+    problems += [f"word '{word}' appears {count} times" for word, count in words.items() if count > 1]
+    return problems
+
+def validate(path: str) -> str:
+    problems = validation_problems(read_deck(path))
+    if problems:
+        raise ValueError("\n".join([f"{len(problems)} problems"] + [f"  {problem}" for problem in problems]))
+    return f"{path}: OK"
+
+
+def run_parallel(task: Callable[..., str], paths: list[str], jobs: int, *args) -> int:
+    """Runs the task for every path in a process pool, printing results in order. Returns the number of failures."""
+    failures = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(task, path, *args) for path in paths]
+        for path, future in zip(paths, futures):
+            try:
+                print(future.result())
+            except Exception as e:
+                failures += 1
+                print(f"{path}: {e}", file=sys.stderr)
+    return failures
+
+
+async def serve(paths: list[str], host: str, port: int) -> None:
+    server = sync.SyncServer(paths)
+    port = await server.start(host, port)
+    print(f"Serving {len(server.paths)} decks on {host}:{port}")
+    await server.serve_forever()
+
+def pull(address: str, deck: str, path: str) -> str:
+    host, _, port = address.rpartition(":")
+    if not os.path.isfile(path):
+        write_deck(path, [])
+    db = open_db(path)
+    try:
+        result = asyncio.run(sync.pull_into_db(host or "127.0.0.1", int(port), deck, db))
+    finally:
+        db.close()
+    if result.up_to_date:
+        return f"{path} is up to date"
+    return f"{path}: {len(result.vocs)} vocs, {result.fetched} received"
+
+
+def build_audio(path: str, include_meanings: bool, backend: str, workers: int, rate: float, retries: int) -> str:
+    result = audiopack.build_pack(read_deck(path), audiopack.archive_path(path), audiopack.BACKENDS[backend](),
+                                  include_meanings, workers, rate, retries)
+    message = f"{result.path}: {result.synthesized} synthesized, {result.reused} reused"
+    if result.failed:
+        raise ValueError(message + f", failed: {', '.join(text for text, _ in result.failed)}")
+    return message
+
+
+def import_dictionary(source: str, path: str, compact: bool, chunk_size: int, jobs: int) -> str:
+    result = dictimport.import_dictionary(source, path, compact, chunk_size, jobs)
+    return f"{source} -> {path} ({result.format}, {result.vocs} vocs, {result.skipped} entries skipped)"
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="kamishirasawa-cli", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes (default: CPU count)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = commands.add_parser("convert", help="compile or convert decks between formats")
+    convert_parser.add_argument("paths", nargs="+")
+    convert_parser.add_argument("--to", choices=FORMATS, required=True, help="output format")
+    convert_parser.add_argument("-o", "--output-dir", help="directory of the output files (default: next to inputs)")
+    convert_parser.add_argument("--compact", action="store_true",
+                                help="write JSON without indentation and escaping (compressed decks always are)")
+
+    stats_parser = commands.add_parser("stats", help="print voc counts per category")
+    stats_parser.add_argument("paths", nargs="+")
+
+    validate_parser = commands.add_parser("validate", help="check decks for empty meanings, duplicates and malformed categories")
+    validate_parser.add_argument("paths", nargs="+")
+
+    serve_parser = commands.add_parser("serve", help="serve decks to sync clients")
+    serve_parser.add_argument("paths", nargs="+")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=7373)
+
+    pull_parser = commands.add_parser("pull", help="update a local deck from a sync server, receiving only changed vocs")
+    pull_parser.add_argument("address", help="HOST:PORT of the server")
+    pull_parser.add_argument("deck", help="name of the served deck")
+    pull_parser.add_argument("path", help="local deck to update, created if missing")
+
+    audio_parser = commands.add_parser("audio", help="synthesize audio packs with speech of every word, stored next to decks")
+    audio_parser.add_argument("paths", nargs="+")
+    audio_parser.add_argument("--meanings", action="store_true", help="synthesize meanings as well")
+    audio_parser.add_argument("--backend", choices=audiopack.BACKENDS, default="gtts")
+    audio_parser.add_argument("--workers", type=int, default=4, help="number of concurrent synthesis requests")
+    audio_parser.add_argument("--rate", type=float, default=5, help="maximum requests per second (0 for no limit)")
+    audio_parser.add_argument("--retries", type=int, default=3, help="retries of a failed request")
+
+    import_parser = commands.add_parser("import", help="create a deck from a JMdict or KANJIDIC2 XML file, optionally gzipped")
+    import_parser.add_argument("source")
+    import_parser.add_argument("path", help="deck to write, in the format of its extension")
+    import_parser.add_argument("--compact", action="store_true",
+                               help="write JSON without indentation and escaping (compressed decks always are)")
+    import_parser.add_argument("--chunk-size", type=int, default=dictimport.CHUNK_SIZE,
+                               help="vocs per chunk encoded by a worker process")
+
+    args = parser.parse_args(argv)
+
+    match args.command:
+        case "convert":
+            if args.output_dir:
+                os.makedirs(args.output_dir, exist_ok=True)
+            failures = run_parallel(convert, args.paths, args.jobs, args.output_dir, FORMATS[args.to], args.compact)
+        case "stats":
+            failures = run_parallel(stats, args.paths, args.jobs)
+        case "validate":
+            failures = run_parallel(validate, args.paths, args.jobs)
+        case "serve":
+            try:
+                asyncio.run(serve(args.paths, args.host, args.port))
+            except KeyboardInterrupt:
+                pass
+            failures = 0
+        case "audio":
+            # Decks are done one after another, as the synthesis backend limits the request rate
+            failures = 0
+            for path in args.paths:
+                try:
+                    print(build_audio(path, args.meanings, args.backend, args.workers, args.rate, args.retries))
+                except Exception as e:
+                    failures += 1
+                    print(f"{path}: {e}", file=sys.stderr)
+        case "import":
+            # A single dictionary is parsed in one pass, the worker processes encode chunks of its vocs
+            try:
+                print(import_dictionary(args.source, args.path, args.compact, args.chunk_size, args.jobs))
+                failures = 0
+            except (OSError, dictimport.DictionaryFormatError) as e:
+                print(f"{args.source}: {e}", file=sys.stderr)
+                failures = 1
+        case "pull":
+            try:
+                print(pull(args.address, args.deck, args.path))
+                failures = 0
+            except (OSError, ValueError, sync.SyncError) as e:
+                print(f"{args.path}: {e}", file=sys.stderr)
+                failures = 1
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
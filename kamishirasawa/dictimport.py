@@ -0,0 +1,241 @@
+"""Importing decks from the standard Japanese dictionaries: JMdict and KANJIDIC2.
+
+Both are XML files of up to hundreds of megabytes, optionally gzipped. They are read
+in a single pass with `iterparse`, and every entry is cleared from the tree as soon as
+it's mapped to a voc, so memory use doesn't depend on the size of the dictionary.
+    JMdict      one voc per <entry>: its first kanji writing (or reading, for kana-only
+                words), English glosses of all senses, and categories COMMON (for words
+                with a news1/ichi1/spec/gai1 priority) and field tags of senses
+    KANJIDIC2   one voc per <character>: the kanji, its English meanings, and categories
+                of its school grade (the same as in kanji_by_grade.kamidb) and JLPT level
+Vocs are written to the deck in chunks. For JSON decks, chunks are encoded (and compressed,
+as concatenated gzip members or xz streams) by a pool of worker processes while the
+dictionary is still being parsed, and appended to the file in order. SQLite and TSV decks
+are written by a single streaming transaction or writer. Either way a deck is written to
+a temporary file, which replaces the deck only when the whole dictionary was read.
+"""
+
+import gzip
+import json
+import lzma
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+from xml.etree import ElementTree
+
+from kamishirasawa import (CODECS, LIST_DELIMITERS, SqliteDB, Voc, compression_of,
+                           is_sqlite_file, is_tsv_file, write_tsv)
+from utils import multi_split
+
+JMDICT = "JMdict"
+KANJIDIC = "kanjidic2"
+
+COMMON = "COMMON"
+# Priority tags of JMdict marking words which are among the most common ones
+COMMON_PRIORITIES = {"news1", "ichi1", "spec1", "spec2", "gai1"}
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+GRADES = {1: "1ST GRADE", 2: "2ND GRADE", 3: "3RD GRADE", 4: "4TH GRADE", 5: "5TH GRADE", 6: "6TH GRADE"}
+KYOUIKU = "KYOUIKU KANJI"
+JOUYOU = "JOUYOU KANJI"  # taught in secondary school, grade 8
+JINMEIYOU = "JINMEIYOU KANJI"  # used in names, grades 9 and 10
+
+# Codecs whose independently compressed chunks can be concatenated into a single valid file
+CHUNK_COMPRESSORS: dict[str, Callable[[bytes], bytes]] = {".gz": gzip.compress, ".xz": lzma.compress}
+
+CHUNK_SIZE = 2000
+
+
+class DictionaryFormatError(Exception):
+    pass
+
+
+def jmdict_voc(entry: ElementTree.Element) -> Optional[Voc]:
+    """Maps a JMdict <entry> to a voc, or returns None if it has no writing or English gloss."""
+    writings = [keb.text for keb in entry.iterfind("k_ele/keb")] + [reb.text for reb in entry.iterfind("r_ele/reb")]
+    # Glosses without a language are English, other languages are only in the full JMdict
+    meanings = [gloss.text for gloss in entry.iterfind("sense/gloss")
+                if gloss.text and gloss.get(XML_LANG, "eng") == "eng"]
+    if not writings or not meanings:
+        return None
+
+    priorities = {pri.text for pri in entry.iterfind("k_ele/ke_pri")} | {pri.text for pri in entry.iterfind("r_ele/re_pri")}
+    categories = [COMMON] if priorities & COMMON_PRIORITIES else []
+    # Some fields are lists themselves, like 'food, cooking'
+    categories += [name for field in entry.iterfind("sense/field") if field.text
+                   for name in multi_split(field.text, LIST_DELIMITERS) if name.strip()]
+    return Voc(writings[0], meanings, categories)
+
+def kanjidic_voc(character: ElementTree.Element) -> Optional[Voc]:
+    """Maps a KANJIDIC2 <character> to a voc, or returns None if it has no English meaning."""
+    literal = character.findtext("literal")
+    meanings = [meaning.text for meaning in character.iterfind("reading_meaning/rmgroup/meaning")
+                if meaning.text and meaning.get("m_lang", "en") == "en"]
+    if not literal or not meanings:
+        return None
+
+    categories = []
+    if grade := character.findtext("misc/grade"):
+        grade = int(grade)
+        if grade in GRADES:
+            categories += [GRADES[grade], KYOUIKU]
+        elif grade == 8:
+            categories.append(JOUYOU)
+        elif grade in (9, 10):
+            categories.append(JINMEIYOU)
+    if jlpt := character.findtext("misc/jlpt"):
+        categories.append(f"JLPT {jlpt}")
+    return Voc(literal, meanings, categories)
+
+# Root tag of a dictionary: (tag of its entries, mapping of an entry to a voc)
+FORMATS: dict[str, tuple[str, Callable[[ElementTree.Element], Optional[Voc]]]] = {
+    JMDICT: ("entry", jmdict_voc),
+    KANJIDIC: ("character", kanjidic_voc),
+}
+
+
+class DictionaryReader:
+    """Iterates over vocs of a JMdict or KANJIDIC2 file, recognized by its root element.
+    Counts of read and skipped entries are updated while iterating."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.format: str = None
+        self.entries = 0
+        self.skipped = 0
+
+    def __open(self):
+        if extension := compression_of(self.path):
+            return CODECS[extension][1](self.path, "rb")
+        return open(self.path, "rb")
+
+    def __iter__(self) -> Iterator[Voc]:
+        with self.__open() as file:
+            events = ElementTree.iterparse(file, events=("start", "end"))
+            try:
+                _, root = next(events)
+                if root.tag not in FORMATS:
+                    raise DictionaryFormatError(f"Neither JMdict nor KANJIDIC2, the root element is <{root.tag}>.")
+                self.format = root.tag
+                tag, to_voc = FORMATS[root.tag]
+
+                for event, element in events:
+                    if event != "end" or element.tag != tag:
+                        continue
+                    self.entries += 1
+                    if (voc := to_voc(element)) is None:
+                        self.skipped += 1
+                    else:
+                        yield voc
+                    # Entries are children of the root, which would otherwise keep all of them
+                    root.clear()
+            except (ElementTree.ParseError, ValueError) as e:
+                raise DictionaryFormatError(*e.args)
+
+
+@dataclass
+class ImportResult:
+    path: str
+    format: str
+    vocs: int
+    skipped: int  # entries without a writing or an English meaning
+
+
+def _encode_chunk(vocs: list[dict], first: bool, compact: bool, compress: Callable[[bytes], bytes]) -> bytes:
+    """Encodes vocs as a fragment of the JSON array written by `JsonDB`, starting the array if it's the first one."""
+    if compact:
+        text = json.dumps(vocs, ensure_ascii=False, separators=(",", ":"))[1:-1]
+        text = ("[" if first else ",") + text
+    else:
+        # Without the brackets and their line breaks, items are already indented as in the whole array
+        text = json.dumps(vocs, indent=4)[2:-2]
+        text = ("[\n" if first else ",\n") + text
+    data = text.encode("utf-8")
+    return compress(data) if compress else data
+
+def _write_json_deck(vocs: Iterator[Voc], path: str, compact: bool, chunk_size: int, workers: int) -> int:
+    extension = compression_of(path)
+    compress = CHUNK_COMPRESSORS.get(extension)
+    compact = compact or extension is not None
+    workers = workers or os.cpu_count()
+    temp_path = path + ".tmp"
+    count = 0
+
+    # Codecs which can't concatenate chunks compress the whole stream while it's written
+    with (open(temp_path, "wb") if compress or not extension else CODECS[extension][1](temp_path, "wb")) as file:
+        try:
+            # Only a bounded number of chunks is in flight, so a slow disk doesn't make them pile up in memory
+            pending: deque[Future] = deque()
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunk = []
+                for voc in vocs:
+                    chunk.append(voc.__dict__)
+                    if len(chunk) == chunk_size:
+                        pending.append(executor.submit(_encode_chunk, chunk, count == 0, compact, compress))
+                        count += len(chunk)
+                        chunk = []
+                        if len(pending) > 2 * workers:
+                            file.write(pending.popleft().result())
+                if chunk:
+                    pending.append(executor.submit(_encode_chunk, chunk, count == 0, compact, compress))
+                    count += len(chunk)
+                while pending:
+                    file.write(pending.popleft().result())
+
+            end = ("]" if compact else "\n]") if count else "[]"
+            file.write(compress(end.encode("utf-8")) if compress else end.encode("utf-8"))
+        except BaseException:
+            file.close()
+            os.remove(temp_path)
+            raise
+
+    os.replace(temp_path, path)
+    return count
+
+def _remove_temp(temp_path: str) -> None:
+    # A SQLite deck also leaves its WAL files behind if it wasn't closed
+    for path in (temp_path, temp_path + "-wal", temp_path + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _write_streamed_deck(vocs: Iterator[Voc], path: str) -> int:
+    # The temporary file keeps the extension, the format of a TSV deck is given by it
+    root, extension = os.path.splitext(path)
+    temp_path = f"{root}.tmp{extension}"
+    _remove_temp(temp_path)
+    count = 0
+    def counted() -> Iterator[Voc]:
+        nonlocal count
+        for voc in vocs:
+            count += 1
+            yield voc
+
+    try:
+        if is_tsv_file(path):
+            write_tsv(temp_path, counted())
+        else:
+            db = SqliteDB(temp_path)
+            try:
+                db.clear_and_write_data(counted())
+            finally:
+                db.close()
+    except BaseException:
+        _remove_temp(temp_path)
+        raise
+
+    os.replace(temp_path, path)
+    return count
+
+def import_dictionary(source: str, path: str, compact: bool = False, chunk_size: int = CHUNK_SIZE,
+                      workers: int = None) -> ImportResult:
+    """Overwrites the deck at `path` with vocs of a JMdict or KANJIDIC2 file. JSON decks are written
+    in chunks of `chunk_size` vocs encoded by `workers` processes (default: CPU count).
+    `compact` makes plain JSON decks written without indentation, compressed ones are always compact."""
+    reader = DictionaryReader(source)
+    if is_sqlite_file(path) or is_tsv_file(path):
+        count = _write_streamed_deck(iter(reader), path)
+    else:
+        count = _write_json_deck(iter(reader), path, compact, chunk_size, workers)
+    return ImportResult(path, reader.format, count, reader.skipped)
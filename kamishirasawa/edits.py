@@ -0,0 +1,169 @@
+"""Undo/redo history of edits made to a table of vocs.
+
+Edits store only what they change: a cell edit stores the old and the new value of
+one cell, row edits store the rows they insert or remove. Undoing and redoing are
+strictly last-in first-out, so row indices stored in an edit are always valid when
+the edit is applied or reverted. History is not limited by the number of edits but
+by their estimated memory usage; when it's exceeded the oldest edits are forgotten.
+"""
+
+import sys
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Optional, Protocol
+
+from utils import Event
+
+Cell = tuple[str, object]  # displayed text and data of a cell
+Row = tuple[Optional[int], tuple[Cell, ...]]  # position of the voc in the DB (None for new ones) and cells
+
+DEFAULT_MEMORY_LIMIT = 32 * 2**20
+
+
+class EditableTable(Protocol):
+    def set_cell(self, row: int, column: int, cell: Cell) -> None:
+        ...
+
+    def insert_rows(self, row: int, rows: list[Row]) -> None:
+        ...
+
+    def remove_row(self, row: int) -> None:
+        ...
+
+
+def _size_of(value) -> int:
+    """Roughly estimates memory used by a cell value, including items of lists."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(_size_of(item) for item in value)
+    return size
+
+
+class Edit(ABC):
+    # Whether the edit adds or removes rows, changing positions of vocs
+    structural = False
+
+    @abstractmethod
+    def apply(self, table: EditableTable) -> None:
+        ...
+
+    @abstractmethod
+    def revert(self, table: EditableTable) -> None:
+        ...
+
+    @property
+    @abstractmethod
+    def size(self) -> int:
+        ...
+
+
+@dataclass
+class CellEdit(Edit):
+    row: int
+    column: int
+    old: Cell
+    new: Cell
+
+    def apply(self, table: EditableTable) -> None:
+        table.set_cell(self.row, self.column, self.new)
+
+    def revert(self, table: EditableTable) -> None:
+        table.set_cell(self.row, self.column, self.old)
+
+    @cached_property
+    def size(self) -> int:
+        return _size_of((self.old, self.new))
+
+
+@dataclass
+class RowsInserted(Edit):
+    row: int  # index of the first inserted row
+    rows: list[Row]
+    structural = True
+
+    def apply(self, table: EditableTable) -> None:
+        table.insert_rows(self.row, self.rows)
+
+    def revert(self, table: EditableTable) -> None:
+        for i in reversed(range(self.row, self.row + len(self.rows))):
+            table.remove_row(i)
+
+    @cached_property
+    def size(self) -> int:
+        return _size_of(self.rows)
+
+
+@dataclass
+class RowsRemoved(Edit):
+    rows: list[tuple[int, Row]]  # removed rows with their indices, in ascending order
+    structural = True
+
+    def apply(self, table: EditableTable) -> None:
+        for i, _ in reversed(self.rows):
+            table.remove_row(i)
+
+    def revert(self, table: EditableTable) -> None:
+        for i, data in self.rows:
+            table.insert_rows(i, [data])
+
+    @cached_property
+    def size(self) -> int:
+        return _size_of(self.rows)
+
+
+@dataclass
+class EditStack:
+    memory_limit: int = DEFAULT_MEMORY_LIMIT
+    # Fired with the edit and whether it was reverted, after the edit is done, undone or redone
+    on_edit: Event = field(default_factory=Event)
+
+    def __post_init__(self) -> None:
+        self.undo_stack: deque[Edit] = deque()
+        self.redo_stack: list[Edit] = []
+        self.memory_used = 0
+
+    def do(self, edit: Edit, table: EditableTable) -> None:
+        """Applies a new edit, forgetting edits that were undone."""
+        edit.apply(table)
+        self.redo_stack.clear()
+        self.__push(edit)
+        self.on_edit(edit, False)
+
+    def undo(self, table: EditableTable) -> Optional[Edit]:
+        if not self.undo_stack:
+            return None
+        edit = self.undo_stack.pop()
+        self.memory_used -= edit.size
+        edit.revert(table)
+        self.redo_stack.append(edit)
+        self.on_edit(edit, True)
+        return edit
+
+    def redo(self, table: EditableTable) -> Optional[Edit]:
+        if not self.redo_stack:
+            return None
+        edit = self.redo_stack.pop()
+        edit.apply(table)
+        self.__push(edit)
+        self.on_edit(edit, False)
+        return edit
+
+    def __push(self, edit: Edit) -> None:
+        self.undo_stack.append(edit)
+        self.memory_used += edit.size
+        # The newest edit is always kept, even if it alone exceeds the limit
+        while self.memory_used > self.memory_limit and len(self.undo_stack) > 1:
+            self.memory_used -= self.undo_stack.popleft().size
+
+    def can_undo(self) -> bool:
+        return bool(self.undo_stack)
+
+    def can_redo(self) -> bool:
+        return bool(self.redo_stack)
+
+    def clear(self) -> None:
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.memory_used = 0
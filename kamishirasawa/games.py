@@ -1,25 +1,112 @@
 import math
 import random
-from abc import ABC, abstractmethod, abstractproperty
+from abc import ABC, abstractmethod
 from collections import defaultdict
-from typing import Any, Iterable
+from itertools import islice
+from typing import Any, Iterable, Iterator, Sequence
 
 import lang_utils
 from kamishirasawa import Voc
+from tracing import traced
+from transliterate import katakana_to_hiragana
+
+
+def lazily_shuffled(flashcards: Iterable[Any], buffer_size: int, rng: random.Random = random) -> Iterator[Any]:
+    """Yields flashcards in random order without copying them first.
+    Sequences are sampled with a lazy Fisher-Yates shuffle of their indices, which only remembers swapped positions,
+    other iterables are streamed through a shuffling buffer of a bounded size.
+    The order depends only on the state of `rng`, so it can be repeated with a seeded one."""
+    if isinstance(flashcards, Sequence):
+        n, swapped = len(flashcards), {}
+        for i in range(n):
+            j = rng.randrange(i, n)
+            yield flashcards[swapped.get(j, j)]
+            swapped[j] = swapped.pop(i, i)
+    else:
+        buffer = []
+        for flashcard in flashcards:
+            if len(buffer) < buffer_size:
+                buffer.append(flashcard)
+            else:
+                i = rng.randrange(buffer_size)
+                yield buffer[i]
+                buffer[i] = flashcard
+        rng.shuffle(buffer)
+        yield from buffer
 
 
 class FlashcardGame(ABC):    
-    def __init__(self, flashcards: Iterable[Any], passes_per_flashcard: int) -> None:
-        assert any(flashcards)
+    def __init__(self, flashcards: Iterable[Any], passes_per_flashcard: int,
+                 window: int = None, max_cards: int = None, seed: int = None) -> None:
+        """If `window` is given, the game is lazy: at most `window` flashcards are active at once and new ones
+        are drawn from `flashcards` as others get passed, so starting the game takes the same time for any deck size.
+        `max_cards` limits the number of flashcards in the session. A lazy game draws flashcards in an order
+        given by `seed` (random by default), from its own copy of `flashcards`, so the order of the ones not drawn
+        yet can be rebuilt when the game is restored."""
         assert passes_per_flashcard >= 1
+        assert window is None or window >= 1
 
-        self.active, self.passed = list(flashcards), []
-        random.shuffle(self.active)
-        
-        self.total_count = len(self.active)
         self.passes_per_flashcard = passes_per_flashcard
-        
         self.passes_done_dict = defaultdict(lambda: 0)
+        self.passed = []
+        self.window = window
+        self.max_cards = max_cards
+        self.drawn_count = 0  # number of flashcards drawn from the source so far
+        
+        if window is None:
+            self.active = list(flashcards)
+            random.shuffle(self.active)
+            if max_cards is not None:
+                del self.active[max_cards:]
+            self.pool, self.seed = None, None
+            self.source = iter(())
+            self.total_count = self.drawn_count = len(self.active)
+        else:
+            self.active = []
+            # Copying references is cheap, and the caller may change its list while the game goes on
+            self.pool = list(flashcards)
+            self.seed = random.getrandbits(32) if seed is None else seed
+            self.source = self.__source(0)
+            self.total_count = min(len(self.pool), max_cards or math.inf)
+            self.__refill()
+            
+        assert self.active
+        
+    def __source(self, drawn_count: int) -> Iterator[Any]:
+        """Returns the flashcards of a lazy game in the order they are drawn, skipping `drawn_count` already drawn ones."""
+        shuffled = lazily_shuffled(self.pool, self.window, random.Random(self.seed))
+        return islice(shuffled, drawn_count, self.max_cards)
+        
+    def __refill(self) -> None:
+        """Draws flashcards from the source until the active pile fills the window."""
+        if self.window is not None and len(self.active) < self.window:
+            drawn = list(islice(self.source, self.window - len(self.active)))
+            self.active += drawn
+            self.drawn_count += len(drawn)
+        
+    @classmethod
+    def restore(cls, active: Iterable[Any], passed: Iterable[Any], passes_done: dict[Any, int],
+                passes_per_flashcard: int, total_count: int, pool: Sequence[Any] = None, window: int = None,
+                max_cards: int = None, seed: int = None, drawn_count: int = None) -> "FlashcardGame":
+        """Recreates a game in a given state, without shuffling. Used to resume saved sessions.
+        A lazy game is restored with its `pool`, `window`, `max_cards`, `seed` and `drawn_count`,
+        and goes on drawing the flashcards it hadn't drawn yet in the same order. The pool isn't copied,
+        so it can be a sequence reading its flashcards only once they are drawn."""
+        game = cls.__new__(cls)
+        game.active, game.passed = list(active), list(passed)
+        game.total_count = total_count
+        game.passes_per_flashcard = passes_per_flashcard
+        game.passes_done_dict = defaultdict(lambda: 0, passes_done)
+        game.window, game.max_cards = window, max_cards
+        if window is None:
+            game.pool, game.seed = None, None
+            game.source = iter(())
+            game.drawn_count = len(game.active) + len(game.passed)
+        else:
+            game.pool, game.seed = pool, seed
+            game.drawn_count = drawn_count
+            game.source = game.__source(drawn_count)
+        return game
     
     @abstractmethod
     def check_answer(self, answer: str) -> bool:
@@ -31,6 +118,7 @@ class FlashcardGame(ABC):
         new_pos = int(max(0, len(self.active) * math.exp(passes + 1 - self.passes_per_flashcard)))
         self.active.insert(new_pos, flashcard)
     
+    @traced("FlashcardGame.mark_as_correct")
     def mark_as_correct(self) -> None:
         self.passes_done_dict[self._current] = self.passes_done_dict[self._current] + 1
               
@@ -42,7 +130,9 @@ class FlashcardGame(ABC):
         else:
             # The flashcard is memorized, we throw it onto passed pile
             self.passed.append(self.active.pop(0))
+            self.__refill()
             
+    @traced("FlashcardGame.mark_as_incorrect")
     def mark_as_incorrect(self) -> None:
         # As a penalty, user will have to answer one more extra time correctly
         self.passes_done_dict[self._current] = max(0, self.passes_done_dict[self._current] - 1)
@@ -59,8 +149,11 @@ class FlashcardGame(ABC):
         return self.active[0]
     
     @property
-    @abstractproperty
     def question(self) -> str:
+        return self.question_of(self._current)
+        
+    @abstractmethod
+    def question_of(self, flashcard: Any) -> str:
         ...
       
     @property
@@ -71,19 +164,39 @@ class FlashcardGame(ABC):
     def _answer_of(self, flashcard: Any):
         ...
        
-    def sample_incorrect_answers(self, k) -> list[str]:
-        """Returns a list of formatted, incorrect answers."""
+    def sample_incorrect_answers(self, k, flashcard: Any = None, similar: Iterable[Any] = ()) -> list[str]:
+        """Returns a list of formatted, incorrect answers to the flashcard, the current one by default.
+        Answers for a flashcard other than the current one can be sampled ahead of time.
+        If flashcards `similar` to it are given, most similar first, answers are taken from them first
+        (skipping ones equal to the correct answer or each other) and only the rest is sampled randomly."""
+        answers = {self._answer_of(self._current if flashcard is None else flashcard)}
+        picked = []
+        for candidate in similar:
+            if len(picked) == k:
+                break
+            if (answer := self._answer_of(candidate)) not in answers:
+                answers.add(answer)
+                picked.append(candidate)
+        if len(picked) == k:
+            return [self._answer_of(flashcard) for flashcard in picked]
+        
         # First, will pick from active, then from passed
-        sample = random.sample(self.active[1:], min(len(self.active) - 1, k))
+        picked_ids = {id(f) for f in picked}
+        others = self.active[1:] if flashcard is None else [f for f in self.active if f is not flashcard]
+        if picked_ids:
+            others = [f for f in others if id(f) not in picked_ids]
+        k -= len(picked)
+        sample = random.sample(others, min(len(others), k))
         
         if len(sample) < k:  # Not enough flashcards in active deck
             k_left = k - len(sample)
-            sample += random.sample(self.passed, min(len(self.passed), k_left))
+            passed = [f for f in self.passed if id(f) not in picked_ids]
+            sample += random.sample(passed, min(len(passed), k_left))
             
             if len(sample) < k:  # Game contains less cards than set choice count
                 sample = random.choices(self.active + self.passed, k=k)
 
-        return [self._answer_of(flashcard) for flashcard in sample]
+        return [self._answer_of(flashcard) for flashcard in picked + sample]
             
 
 class JaToEnGame(FlashcardGame):
@@ -92,9 +205,8 @@ class JaToEnGame(FlashcardGame):
     def check_answer(self, answer: str) -> bool:
         return answer.casefold() in self._current.meaning or answer == self.answer
     
-    @property
-    def question(self) -> str:
-        return self._current.word
+    def question_of(self, flashcard: Any) -> str:
+        return flashcard.word
     
     def _answer_of(self, flashcard: Any):
         return ", ".join(flashcard.meaning)
@@ -103,13 +215,18 @@ class EnToJaGame(FlashcardGame):
     """A flashcard game based on vocs, where user is given a question in English
     and is required to answer in Japanese."""
     def check_answer(self, answer: str) -> bool:
-        return answer in {lang_utils.to_romaji(self._current.word), 
-                          lang_utils.to_hiragana(self._current.word), 
-                          self._current.word}
+        # Answers typed in kana are compared with the reading, katakana as hiragana
+        return (answer in {lang_utils.to_romaji(self._current.word), 
+                           lang_utils.to_hiragana(self._current.word), 
+                           self._current.word}
+                or katakana_to_hiragana(answer) == lang_utils.convert_concat(self._current.word)["hira"])
     
-    @property
-    def question(self) -> str:
-        return ", ".join(self._current.meaning)
+    def question_of(self, flashcard: Any) -> str:
+        return ", ".join(flashcard.meaning)
     
     def _answer_of(self, flashcard: Any):
         return flashcard.word
+
+
+# Game types by name, used when restoring saved sessions
+GAME_TYPES = {cls.__name__: cls for cls in (JaToEnGame, EnToJaGame)}
@@ -1,26 +1,46 @@
-import csv
-import itertools
+import functools
 import os
 import random
+import threading
+import time
 import typing
 from abc import ABC, abstractmethod
 from enum import Enum, auto
 
-from PyQt6.QtCore import QRunnable, Qt, QThreadPool
+from PyQt6.QtCore import (QBuffer, QByteArray, QFileSystemWatcher, QIODevice,
+                          QObject, QRunnable, Qt, QThreadPool, QTimer, QUrl,
+                          pyqtSignal)
 from PyQt6.QtGui import QAction, QIcon
 from PyQt6.QtWidgets import (QButtonGroup, QCheckBox, QComboBox, QFileDialog,
                              QFormLayout, QFrame, QGridLayout, QHBoxLayout,
                              QHeaderView, QLabel, QLineEdit, QMainWindow,
-                             QPushButton, QRadioButton, QSizePolicy, QSpinBox,
-                             QTableWidget, QTableWidgetItem, QVBoxLayout,
-                             QWidget)
+                             QMessageBox, QPushButton, QRadioButton,
+                             QSizePolicy, QSpinBox, QTableWidget,
+                             QTableWidgetItem, QVBoxLayout, QWidget)
 
 import lang_utils
+import snapshot
+import syllabary
 import utils
+from category_query import QueryError, normalize
+from edits import (Cell, CellEdit, Edit, EditStack, Row, RowsInserted,
+                   RowsRemoved)
 from games import EnToJaGame, FlashcardGame, JaToEnGame, Voc
-from kamishirasawa import (DB, DBAlreadyAttachedError, DBParseError,
-                           Kamishirasawa)
-from tts import tts
+from kamishirasawa import (DB, LIST_DELIMITERS, DBAlreadyAttachedError,
+                           DBParseError, Kamishirasawa, load_db, read_tsv)
+from search import voc_terms
+from similarity import SimilarityIndex
+from tracing import traced
+from transliterate import (ROMAJI_TO_HIRAGANA, ROMAJI_TO_KATAKANA,
+                           IncrementalTransliterator)
+from tts import AudioSink, set_sink, tts, use_packs
+from watch import PollingWatcher
+from workspace import Workspace
+
+try:
+    from PyQt6.QtMultimedia import QAudioOutput, QMediaPlayer
+except ImportError:
+    QMediaPlayer = None
 
 
 class MetaQAbstractWidget(type(QWidget), type(ABC)):
@@ -34,6 +54,177 @@ class HSeparator(QFrame):
         super().__init__(*args, **kwargs)
         self.setFrameShape(QFrame.Shape.HLine)
 
+def subscribe_while_alive(widget: QObject, source: typing.Union[utils.Event, utils.ObservableFlag],
+                          handler: typing.Callable) -> None:
+    """Subscribes a handler of a widget to an app-wide event or flag until the widget is destroyed,
+    so widgets replaced in the main window don't pile up as subscribers."""
+    if isinstance(source, utils.ObservableFlag):
+        source.add_on_write(handler)
+        widget.destroyed.connect(lambda: source.remove_on_write(handler))
+    else:
+        source += handler
+        widget.destroyed.connect(lambda: source.__isub__(handler))
+
+class DBFileWatcher(QObject):
+    """Watches files of attached DBs with QFileSystemWatcher, falling back to a stat-polling thread
+    for files it cannot watch, or for all files if KAMISHIRASAWA_POLL_WATCH environment variable is set.
+    `file_changed` is always emitted in the thread of the watcher."""
+    
+    file_changed = pyqtSignal(str)
+    
+    def __init__(self, parent: QObject = None) -> None:
+        super().__init__(parent)
+        self.force_polling = bool(os.environ.get("KAMISHIRASAWA_POLL_WATCH"))
+        
+        self.fs_watcher = QFileSystemWatcher(self)
+        self.fs_watcher.fileChanged.connect(self.file_changed)
+        self.polling_watcher: PollingWatcher = None
+        
+    def paths(self) -> set[str]:
+        paths = set(self.fs_watcher.files())
+        if self.polling_watcher:
+            paths |= set(self.polling_watcher.paths())
+        return paths
+        
+    def watch(self, paths: typing.Iterable[str]) -> None:
+        """Sets the watched files to given paths."""
+        paths, current = set(paths), self.paths()
+        
+        for path in current - paths:
+            self.fs_watcher.removePath(path)
+            if self.polling_watcher:
+                self.polling_watcher.remove_path(path)
+                
+        for path in paths - current:
+            if self.force_polling or not self.fs_watcher.addPath(path):
+                if not self.polling_watcher:
+                    # Emitting the signal from the polling thread queues the call to this thread
+                    self.polling_watcher = PollingWatcher()
+                    self.polling_watcher.file_changed += self.file_changed.emit
+                self.polling_watcher.add_path(path)
+                
+    def rewatch(self, path: str) -> None:
+        """QFileSystemWatcher stops watching files replaced by renaming, so they are added again."""
+        if path not in self.paths() and os.path.exists(path):
+            self.watch(self.paths() | {path})
+            
+    def stop(self) -> None:
+        if self.polling_watcher:
+            self.polling_watcher.stop()
+        
+
+class DeckLoader(QObject):
+    """Opens and reads decks one by one in a background thread, in the given order, and computes search terms
+    of their vocs there. Every deck is emitted as soon as it's read, so it can be attached in the thread of
+    the loader without waiting for the rest."""
+    
+    deck_loaded = pyqtSignal(str, object, object, object)  # path, DB, its vocs and their search terms
+    deck_failed = pyqtSignal(str, str)  # path and error message
+    finished = pyqtSignal()
+    
+    class Signals(QObject):
+        """Signals of a single run, owned by the runnable. They are relayed by the loader, and Qt disconnects
+        them when the loader is deleted (e.g. with its window), so the runnable never emits into a deleted object."""
+        deck_loaded = pyqtSignal(str, object, object, object)
+        deck_failed = pyqtSignal(str, str)
+        finished = pyqtSignal()
+    
+    class LoadRunnable(QRunnable):
+        def __init__(self, loader: "DeckLoader", paths: list[str]) -> None:
+            super().__init__()
+            self.loader = loader
+            self.paths = paths
+            self.signals = DeckLoader.Signals()
+            
+        def run(self) -> None:
+            for path in self.paths:
+                if self.loader.cancelled:
+                    return
+                try:
+                    db, vocs = load_db(path)
+                    terms = [voc_terms(voc) for voc in vocs]
+                except Exception as e:
+                    self.signals.deck_failed.emit(path, str(e))
+                    continue
+                if self.loader.cancelled:
+                    db.close()
+                    return
+                self.signals.deck_loaded.emit(path, db, vocs, terms)
+            self.signals.finished.emit()
+    
+    def __init__(self, parent: QObject = None) -> None:
+        super().__init__(parent)
+        self.cancelled = False
+        
+    def start(self, paths: list[str]) -> None:
+        runnable = self.LoadRunnable(self, list(paths))
+        runnable.signals.deck_loaded.connect(self.deck_loaded)
+        runnable.signals.deck_failed.connect(self.deck_failed)
+        runnable.signals.finished.connect(self.finished)
+        QThreadPool.globalInstance().start(runnable)
+        
+    def stop(self) -> None:
+        """Stops loading after the deck being read, decks loaded afterwards are closed."""
+        self.cancelled = True
+        
+
+class QtAudioSink(AudioSink):
+    """Plays clips from memory with QtMultimedia. The player lives in the thread the sink was created in,
+    `play` is meant to be called from worker threads and waits for the playback to end."""
+    
+    # Playback that doesn't report its end (e.g. of a clip the player can't decode) is given up after this long
+    TIMEOUT = 30
+    
+    class Player(QObject):
+        play_requested = pyqtSignal(bytes, object)  # clip and a threading.Event set when it ends
+        
+        def __init__(self, parent: QObject = None) -> None:
+            super().__init__(parent)
+            self.player = QMediaPlayer(self)
+            self.output = QAudioOutput(self)
+            self.player.setAudioOutput(self.output)
+            self.player.mediaStatusChanged.connect(self.on_media_status_changed)
+            self.player.errorOccurred.connect(lambda *_: self.finish())
+            self.buffer: QBuffer = None
+            self.done: threading.Event = None
+            self.play_requested.connect(self.play)
+            
+        def play(self, audio: bytes, done: threading.Event) -> None:
+            self.finish()
+            self.release_buffer()
+            self.done = done
+            self.buffer = QBuffer(self)
+            self.buffer.setData(QByteArray(audio))
+            self.buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+            # The URL only tells the player the format of the data
+            self.player.setSourceDevice(self.buffer, QUrl("clip.mp3"))
+            self.player.play()
+            
+        def on_media_status_changed(self, status: "QMediaPlayer.MediaStatus") -> None:
+            if status in {QMediaPlayer.MediaStatus.EndOfMedia, QMediaPlayer.MediaStatus.InvalidMedia}:
+                self.finish()
+                
+        def finish(self) -> None:
+            if self.done:
+                self.done.set()
+                self.done = None
+                
+        def release_buffer(self) -> None:
+            """Detaches the clip played last from the player and deletes its buffer, so only one is kept."""
+            if self.buffer is not None:
+                self.player.setSourceDevice(None)
+                self.buffer.deleteLater()
+                self.buffer = None
+    
+    def __init__(self, parent: QObject = None) -> None:
+        self.player = self.Player(parent)
+        
+    def play(self, audio: memoryview) -> None:
+        done = threading.Event()
+        self.player.play_requested.emit(bytes(audio), done)
+        done.wait(self.TIMEOUT)
+        
+
 class MainWindow(QMainWindow):
     def __init__(self, parent: QWidget = None, *args, **kwargs) -> None:
         super().__init__(parent, *args, **kwargs)
@@ -44,8 +235,92 @@ class MainWindow(QMainWindow):
         self.place_menubar()
         self.place_welcome_widget()
         self.statusbar = self.statusBar()
+        if snapshot.exists():
+            self.statusbar.showMessage("Unfinished session can be resumed from the Learn menu.")
+        
+        self.db_watcher = DBFileWatcher(self)
+        self.db_watcher.file_changed.connect(self.on_db_file_changed)
+        self.kamishirasawa.on_dbs_changed += lambda: self.db_watcher.watch(db.path for db in self.kamishirasawa.dbs)
+        self.kamishirasawa.on_dbs_changed += lambda: use_packs(db.path for db in self.kamishirasawa.dbs)
+        # Clips are played straight from memory if QtMultimedia is available, otherwise from temporary files
+        if QMediaPlayer:
+            set_sink(QtAudioSink(self))
         
         self.destroyed.connect(self.kamishirasawa.close_all_dbs)
+        self.destroyed.connect(self.db_watcher.stop)
+        
+        self.workspace = Workspace.load()
+        # Decks of the workspace which are still being restored, most recently used first
+        self.pending_decks: list[str] = []
+        self.on_pending_decks_changed = utils.Event()
+        self.kamishirasawa.on_dbs_changed += self.update_workspace_decks
+        self.restore_workspace()
+        
+    def restore_workspace(self) -> None:
+        """Attaches decks of the saved workspace, loading them in the background, most recently used first."""
+        self.pending_decks = list(self.workspace.decks)
+        self.deck_loader = DeckLoader(self)
+        self.deck_loader.deck_loaded.connect(self.on_deck_loaded)
+        self.deck_loader.deck_failed.connect(self.on_deck_failed)
+        self.deck_loader.finished.connect(lambda: self.statusbar.showMessage("Workspace restored."))
+        if self.pending_decks:
+            self.statusbar.showMessage(f"Restoring {len(self.pending_decks)} DBs...")
+            self.deck_loader.start(self.pending_decks)
+            
+    def on_deck_loaded(self, path: str, db: DB, vocs: list, search_terms: list) -> None:
+        self.pending_decks.remove(path)
+        try:
+            self.kamishirasawa.attach_loaded_db(db, vocs, search_terms)
+        except DBAlreadyAttachedError:
+            # Attached by the user while it was loading
+            pass
+        self.on_pending_decks_changed()
+        
+    def on_deck_failed(self, path: str, message: str) -> None:
+        self.pending_decks.remove(path)
+        self.statusbar.showMessage(f"Failed to restore '{os.path.basename(path)}'.")
+        self.update_workspace_decks()
+        self.on_pending_decks_changed()
+        
+    def update_workspace_decks(self) -> None:
+        """Keeps attached and pending decks in the workspace, newly attached ones first."""
+        attached = [os.path.abspath(db.path) for db in self.kamishirasawa.dbs]
+        kept = [path for path in self.workspace.decks if path in attached or path in self.pending_decks]
+        self.workspace.decks = [path for path in attached if path not in kept] + kept
+        self.save_workspace()
+        
+    def touch_deck(self, path: str) -> None:
+        self.workspace.touch(path)
+        self.save_workspace()
+        
+    def save_workspace(self) -> None:
+        try:
+            self.workspace.save()
+        except OSError:
+            self.statusbar.showMessage("Failed to save the workspace.")
+            
+    def closeEvent(self, event) -> None:
+        # DBs are closed on exit, but stay in the workspace to be restored on the next start
+        self.kamishirasawa.on_dbs_changed -= self.update_workspace_decks
+        self.deck_loader.stop()
+        super().closeEvent(event)
+        
+    def on_db_file_changed(self, path: str) -> None:
+        """Incrementally reloads an attached DB modified by another program."""
+        if not (db := self.kamishirasawa.db_of_path(path)):
+            return
+        
+        self.db_watcher.rewatch(path)
+        try:
+            diff = self.kamishirasawa.reload_db(db)
+        except Exception:
+            # The file is probably still being written, it will be reloaded on the next change
+            self.statusbar.showMessage(f"Failed to reload '{os.path.basename(path)}'.")
+            return
+        
+        if diff:
+            self.statusbar.showMessage(f"Reloaded '{os.path.basename(path)}': {len(diff.added)} added, "
+                                       f"{len(diff.removed)} removed, {len(diff.changed)} changed.")
         
     def place_welcome_widget(self) -> None:
         welcome_widget = QWidget(self)
@@ -59,8 +334,8 @@ class MainWindow(QMainWindow):
         With DBs attached, you can practice<br>
         vocabulary in <b>Play/From DBs</b> playmode.<br><br>
         
-        If you wish to learn hiragana,<br>
-        use <b>Play/Hiragana</b> playmode.<br>
+        If you wish to learn hiragana or katakana,<br>
+        use <b>Play/Kana</b> playmode.<br>
         No DBs needed!"""
         label = QLabel()
         label.setText(welcome_message)
@@ -111,11 +386,17 @@ class MainWindow(QMainWindow):
         from_dbs = self.learnmenu.addAction("From DBs")
         from_dbs.triggered.connect(lambda: self.replace_central_widget(DBGameSetupWidget(self)))
         
-        hiragana = self.learnmenu.addAction("Hiragana")
+        hiragana = self.learnmenu.addAction("Kana")
         hiragana.triggered.connect(lambda: self.replace_central_widget(HiraganaTestSetupWidget(self)))
         
+        self.learnmenu.addSeparator()
+        resume = self.learnmenu.addAction("Resume last session")
+        resume.setShortcut("Ctrl+R")
+        resume.triggered.connect(self.resume_session)
+        self.learnmenu.aboutToShow.connect(lambda: resume.setEnabled(snapshot.exists()))
+        
 
-    DB_FILE_FILTER = "Kamishirasawa DB files (*.kamidb);;All files (*.*)"
+    DB_FILE_FILTER = "Kamishirasawa DB files (*.kamidb *.kamisql *.kamidb.gz *.kamidb.xz *.kamidb.zst);;All files (*.*)"
     DB_DEFAULT_PATH = os.path.dirname(os.path.dirname(__file__))
         
     def attach_db_dialog(self):
@@ -135,6 +416,7 @@ class MainWindow(QMainWindow):
                 self.kamishirasawa.attach_db(path)
                 self.statusbar.showMessage(f"Attached '{os.path.basename(path)}'.")
             except DBAlreadyAttachedError:
+                self.touch_deck(path)
                 self.statusbar.showMessage(f"DB '{os.path.basename(path)}' is already attached.")
             except DBParseError as e:
                 print(e)
@@ -152,6 +434,7 @@ class MainWindow(QMainWindow):
                 except DBParseError:
                     failed.append(path)
                 except DBAlreadyAttachedError:
+                    self.touch_deck(path)
                     already_attached.append(path)
                 
             message = f"Attached {len(successfully_attached)} DBs"
@@ -183,6 +466,40 @@ class MainWindow(QMainWindow):
         else:
             self.statusbar.showMessage(f"No DBs are attached.")
 
+    def resume_session(self):
+        """Rebuilds the game widget of the last unfinished session from its snapshot."""
+        try:
+            session = snapshot.load()
+        except snapshot.SnapshotError:
+            self.statusbar.showMessage("Failed to resume the last session.")
+            return
+        
+        match session.widget_type:
+            case ChoiceFlashcardGameWidget.__name__:
+                widget = ChoiceFlashcardGameWidget(self, session.game, choices=session.choices)
+            case _:
+                widget = TextInputFlashcardGameWidget(self, session.game)
+        self.replace_central_widget(widget)
+        
+    def confirm_new_session(self) -> bool:
+        """Asks what to do with the unfinished session, whose snapshot would be replaced by a new game.
+        Returns whether the new game should start, the unfinished session is resumed instead if the user chooses so."""
+        if not snapshot.exists():
+            return True
+        
+        box = QMessageBox(QMessageBox.Icon.Question, "Unfinished session",
+                          "The last session wasn't finished. Starting a new game discards it.", parent=self)
+        resume = box.addButton("Resume it", QMessageBox.ButtonRole.AcceptRole)
+        discard = box.addButton("Discard it", QMessageBox.ButtonRole.DestructiveRole)
+        box.addButton(QMessageBox.StandardButton.Cancel)
+        box.setDefaultButton(resume)
+        box.exec()
+        
+        if box.clickedButton() is resume:
+            self.resume_session()
+            return False
+        return box.clickedButton() is discard
+        
     def replace_central_widget(self, widget: QWidget) -> None:
         """ Detaches the central widget (workspace) and replaces it with a new one, given in parameter """
         try:
@@ -193,22 +510,39 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(widget)
 
 class DBManager(QWidget):
-    list_attribute_delimiters = [",", ";"]
+    list_attribute_delimiters = LIST_DELIMITERS
+    
+    # Item data role under which word cells store the position of the voc in the DB
+    POSITION_ROLE = Qt.ItemDataRole.UserRole + 1
+    # Milliseconds after the last keystroke in the search input before the table is filtered
+    SEARCH_DELAY = 150
+    # Search queries of latin letters shorter than this show all rows
+    MIN_LATIN_QUERY = 2
     
     def __init__(self, parent: QMainWindow, *args, **kwargs) -> None:
         super().__init__(parent, *args, **kwargs)
         self.parent = parent
         self.kamishirasawa = parent.kamishirasawa
         self.selected_db = None
-        self.kamishirasawa.on_dbs_changed += self.update_db_selector
-        self.kamishirasawa.on_dbs_changed += lambda: self.db_edit_widget.setEnabled(len(self.kamishirasawa.dbs) > 0)
+        subscribe_while_alive(self, self.kamishirasawa.on_dbs_changed, self.update_db_selector)
+        subscribe_while_alive(self, self.kamishirasawa.on_dbs_changed,
+                              lambda: self.db_edit_widget.setEnabled(len(self.kamishirasawa.dbs) > 0))
+        subscribe_while_alive(self, self.parent.on_pending_decks_changed, self.update_db_selector)
+        subscribe_while_alive(self, self.kamishirasawa.on_db_data_changed, self.on_db_data_changed)
+        
+        # Unsaved changes are tracked as positions of saved vocs whose rows differ from them,
+        # and the number of edits in the history that added or removed rows
+        self.edits = EditStack()
+        self.edits.on_edit += self.on_edit
+        self.dirty_positions: set[int] = set()
+        self.structure_changes = 0
         
         self.layout = QVBoxLayout(self)
         
         self.place_db_selection_widget()
         self.place_save_changes_widget()
+        self.place_search_widget()
         self.place_table()
-        self.redraw_voc_table()
         
         self.db_edit_widget = QWidget(self)
         edit_layout = QHBoxLayout(self.db_edit_widget)
@@ -218,14 +552,30 @@ class DBManager(QWidget):
         self.db_add_voc.clicked.connect(self.add_item)
         self.db_tsv_voc = QPushButton(text="Load from TSV")
         self.db_tsv_voc.clicked.connect(self.load_tsv)
+        self.db_undo = QPushButton(text="Undo")
+        self.db_undo.clicked.connect(self.undo)
+        self.db_redo = QPushButton(text="Redo")
+        self.db_redo.clicked.connect(self.redo)
         edit_layout.addWidget(self.db_delete_voc)        
         edit_layout.addWidget(self.db_add_voc)
         edit_layout.addWidget(self.db_tsv_voc)
+        edit_layout.addWidget(self.db_undo)
+        edit_layout.addWidget(self.db_redo)
+        
+        self.undo_action = QAction(self)
+        self.undo_action.setShortcut("Ctrl+Z")
+        self.undo_action.triggered.connect(self.undo)
+        self.addAction(self.undo_action)
+        self.redo_action = QAction(self)
+        self.redo_action.setShortcut("Ctrl+Shift+Z")
+        self.redo_action.triggered.connect(self.redo)
+        self.addAction(self.redo_action)
         
         self.db_edit_widget.setEnabled(len(self.kamishirasawa.dbs) > 0)
         
         self.layout.addWidget(self.db_edit_widget)
 
+        self.redraw_voc_table()
         self.update_db_selector()
         
     def place_db_selection_widget(self):
@@ -234,6 +584,8 @@ class DBManager(QWidget):
         
         self.db_combobox = QComboBox(self.db_selection_widget)
         self.db_combobox.currentIndexChanged.connect(self.on_selected_db_changed)
+        # Only DBs selected by the user count as used, not ones selected when the list changes
+        self.db_combobox.activated.connect(lambda i: self.parent.touch_deck(self.db_combobox.itemData(i).path))
         
         self.db_selection_widget.attach_button = QPushButton(icon=QIcon("./icons/attach.png"))
         self.db_selection_widget.attach_button.setFixedSize(32, 32)
@@ -251,7 +603,7 @@ class DBManager(QWidget):
         self.db_selection_widget.layout.addWidget(self.db_selection_widget.detach_button, 0)
         self.layout.addWidget(self.db_selection_widget)
         
-        self.kamishirasawa.dbs_lock.add_on_write(lambda b: self.db_selection_widget.setDisabled(b))
+        subscribe_while_alive(self, self.kamishirasawa.dbs_lock, lambda b: self.db_selection_widget.setDisabled(b))
         
         
     def place_save_changes_widget(self):
@@ -267,14 +619,33 @@ class DBManager(QWidget):
         save_changes_layout.addWidget(self.save_changes_button)
         self.layout.addWidget(self.save_changes_widget)
         
-        self.kamishirasawa.dbs_lock.add_on_write(lambda b: self.save_changes_widget.setDisabled(not b))
+        subscribe_while_alive(self, self.kamishirasawa.dbs_lock, lambda b: self.save_changes_widget.setDisabled(not b))
         self.save_changes_widget.setDisabled(True)
         
+    def place_search_widget(self):
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search words, meanings and readings")
+        # Short queries show or hide most of the rows, so the table is filtered once typing pauses
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY)
+        self.search_timer.timeout.connect(self.filter_voc_table)
+        self.search_input.textChanged.connect(lambda *_: self.search_timer.start())
+        self.search_input.returnPressed.connect(self.filter_voc_table)
+        self.layout.addWidget(self.search_input)
+        
     def place_table(self):
+        self.row_of_position: dict[int, int] = {}
+        self.hidden_positions: set[int] = set()
+        
         self.voc_table = QTableWidget()
         self.voc_table.setColumnCount(3)
-        self.voc_table.itemClicked.connect(self.on_item_selected)
         self.voc_table.itemChanged.connect(self.on_item_changed)
+        
+        self.revert_cells_action = QAction("Revert to saved", self.voc_table)
+        self.revert_cells_action.triggered.connect(self.revert_selected_cells)
+        self.voc_table.addAction(self.revert_cells_action)
+        self.voc_table.setContextMenuPolicy(Qt.ContextMenuPolicy.ActionsContextMenu)
 
         self.layout.addWidget(self.voc_table)
         
@@ -306,26 +677,30 @@ class DBManager(QWidget):
                 self.db_combobox.setCurrentIndex(current_index)
                 for child in (selection_layout.itemAt(i).widget() for i in range(selection_layout.count())):
                     child.setDisabled(False)
+                    
+        # Decks of the workspace still being restored are listed, but can't be selected yet
+        for path in self.parent.pending_decks:
+            self.db_combobox.addItem(f"{os.path.basename(path)} (loading...)")
+            self.db_combobox.model().item(self.db_combobox.count() - 1).setEnabled(False)
         
     def on_selected_db_changed(self, index: typing.SupportsIndex):
         self.selected_db: DB = self.db_combobox.itemData(index, Qt.ItemDataRole.UserRole)
         self.redraw_voc_table()
 
+    def on_db_data_changed(self, db: DB, diff) -> None:
+        # Unsaved changes in the table take precedence over changes made outside of the app
+        if db is self.selected_db and not self.kamishirasawa.dbs_lock:
+            self.redraw_voc_table()
+
     def remove_item(self):
-        rows = list({x.row() for x in self.voc_table.selectedIndexes()})
+        rows = sorted({index.row() for index in self.voc_table.selectedIndexes()})
         if rows:
-            self.kamishirasawa.dbs_lock.value = True
-            for row in reversed(rows):
-                self.voc_table.removeRow(row)
-            self.save_changes_widget.setEnabled(True)
+            self.edits.do(RowsRemoved([(row, self.row_data(row)) for row in rows]), self)
 
     def add_item(self):
-        self.kamishirasawa.dbs_lock.value = True
-        count = self.voc_table.rowCount()
-        self.voc_table.setRowCount(count + 1)
-        self.set_voc(count, Voc("-", ["-"], []))
+        row = self.voc_table.rowCount()
+        self.edits.do(RowsInserted(row, [(None, self.cells_of(Voc("-", ["-"], [])))]), self)
         self.voc_table.scrollToBottom()
-        self.save_changes_widget.setEnabled(True)
 
     def load_tsv(self):
         path, _ = QFileDialog.getOpenFileName(
@@ -335,75 +710,143 @@ class DBManager(QWidget):
             "TSV files (*.tsv);;CSV files(*.csv);;All files (*.*)")
         if path:
             try:
-                with open(path, 'rt', encoding='utf8') as file:
-                    items = list(csv.reader(file, delimiter='\t'))
-                    self.voc_table.model().blockSignals(True)
-                    count = self.voc_table.rowCount()
-                    self.voc_table.setRowCount(count + len(items))
-                    delim = self.list_attribute_delimiters[0]
-                    for row, (word, meanings, cats) in enumerate(items):
-                        self.set_voc(row + count, Voc(
-                            word,
-                            utils.multi_split(meanings, delim),
-                            utils.multi_split(cats, delim)
-                        ))
-                    self.voc_table.model().blockSignals(False)
-                    self.voc_table.model().layoutChanged.emit()
-
-                    self.kamishirasawa.dbs_lock.value = True
-                    self.save_changes_widget.setEnabled(True)
+                vocs = read_tsv(path)
+                row = self.voc_table.rowCount()
+                self.edits.do(RowsInserted(row, [(None, self.cells_of(voc)) for voc in vocs]), self)
                 self.parent.statusbar.showMessage("File loaded")
 
             except Exception as e:
                 raise e
                 self.parent.statusbar.showMessage("Failed to load file")
-
-    def on_item_selected(self, item: QTableWidgetItem):
-        self.last_selected_text = item.text()
                 
     def on_item_changed(self, item: QTableWidgetItem):
         """Checks if changed field is still valid, formats the cell if needed
         If check fails, the change is reverted.
-        If the check passes, the DBs lock is engaged, and changes have to be reverted or confirmed"""
+        If the check passes, the change is recorded as an edit, and the DBs lock is engaged
+        until changes are saved, reverted or undone"""
+        row, column = item.row(), item.column()
+        # Editing changes only the text of the item, its data is still the old value
+        old = self.cell_of(column, item.data(Qt.ItemDataRole.UserRole))
         text = item.text().strip()
       
-        self.voc_table.blockSignals(True)
         try:
-            match item.column():
+            match column:
                 case 0:
                     if not text:
                         raise ValueError("Field 'Word' cannot be empty")
                     data = text
                 case 1:
-                    meanings = list({s.strip().casefold(): None for s in utils.multi_split(text, self.list_attribute_delimiters) if s})
-                    if not meanings:
+                    data = list({s.strip().casefold(): None for s in utils.multi_split(text, self.list_attribute_delimiters) if s})
+                    if not data:
                         raise ValueError("Field 'Meaning' cannot be empty")
-                    text = (self.list_attribute_delimiters[0] + " ").join(meanings)
-                    data = meanings
                 case 2:
-                    categories = list({s.strip().upper(): None for s in utils.multi_split(text, self.list_attribute_delimiters) if s})
-                    text = (self.list_attribute_delimiters[0] + " ").join(categories)
-                    data = categories
-
-            item.setText(text)
-            item.setData(Qt.ItemDataRole.UserRole, data)
-            self.kamishirasawa.dbs_lock.value = True
+                    # Normalized like categories in queries are, so an edited category is found by them
+                    data = list({name: None for s in utils.multi_split(text, self.list_attribute_delimiters) if (name := normalize(s))})
+            new = self.cell_of(column, data)
             
         except ValueError as e:
             self.parent.statusbar.showMessage(". ".join(e.args))
-            item.setText(self.last_selected_text)
+            new = old
         
-        self.voc_table.blockSignals(False)
+        if new[1] == old[1]:
+            self.set_cell(row, column, old)
+        else:
+            self.edits.do(CellEdit(row, column, old, new), self)
+            
+    def cell_of(self, column: int, data) -> Cell:
+        """Returns the text and the data of a cell in given column holding given value."""
+        return (data if column == 0 else (self.list_attribute_delimiters[0] + " ").join(data)), data
+    
+    def cells_of(self, voc: Voc) -> tuple[Cell, ...]:
+        return tuple(self.cell_of(column, data) for column, data in enumerate([voc.word, voc.meaning, voc.categories]))
+    
+    def row_data(self, row: int) -> Row:
+        items = [self.voc_table.item(row, column) for column in range(3)]
+        return items[0].data(self.POSITION_ROLE), tuple((item.text(), item.data(Qt.ItemDataRole.UserRole)) for item in items)
+    
+    def voc_of_row(self, row: int) -> Voc:
+        return Voc(*(self.voc_table.item(row, column).data(Qt.ItemDataRole.UserRole) for column in range(3)))
             
     def set_voc(self, row: int, voc: Voc):
-        delimiter = self.list_attribute_delimiters[0]
-        for column, (text, data) in enumerate([(voc.word, voc.word),
-                                                (delimiter.join(voc.meaning), voc.meaning),
-                                                (delimiter.join(voc.categories), voc.categories)]):
+        for column, (text, data) in enumerate(self.cells_of(voc)):
             item = QTableWidgetItem(text)
             item.setData(Qt.ItemDataRole.UserRole, data)
             self.voc_table.setItem(row, column, item)
+            
+    # Methods through which edits change the table
 
+    def set_cell(self, row: int, column: int, cell: Cell) -> None:
+        text, data = cell
+        item = self.voc_table.item(row, column)
+        self.voc_table.blockSignals(True)
+        item.setText(text)
+        item.setData(Qt.ItemDataRole.UserRole, data)
+        self.voc_table.blockSignals(False)
+        
+    def insert_rows(self, row: int, rows: list[Row]) -> None:
+        self.voc_table.blockSignals(True)
+        self.voc_table.setUpdatesEnabled(False)
+        for i, (position, cells) in enumerate(rows, start=row):
+            self.voc_table.insertRow(i)
+            for column, (text, data) in enumerate(cells):
+                item = QTableWidgetItem(text)
+                item.setData(Qt.ItemDataRole.UserRole, data)
+                self.voc_table.setItem(i, column, item)
+            self.voc_table.item(i, 0).setData(self.POSITION_ROLE, position)
+        self.voc_table.setUpdatesEnabled(True)
+        self.voc_table.blockSignals(False)
+        
+    def remove_row(self, row: int) -> None:
+        self.voc_table.removeRow(row)
+        
+    def on_edit(self, edit: Edit, reverted: bool) -> None:
+        """Updates unsaved changes after an edit was done, undone or redone."""
+        if edit.structural:
+            self.structure_changes += -1 if reverted else 1
+            self.update_row_of_position()
+        else:
+            position = self.voc_table.item(edit.row, 0).data(self.POSITION_ROLE)
+            if position is not None:
+                if self.differs_from_saved(edit.row, position):
+                    self.dirty_positions.add(position)
+                else:
+                    self.dirty_positions.discard(position)
+        self.update_edit_state()
+        
+    def differs_from_saved(self, row: int, position: int) -> bool:
+        saved = self.kamishirasawa.vocs_of(self.selected_db)[position]
+        word, meaning, categories = (self.voc_table.item(row, column).data(Qt.ItemDataRole.UserRole) for column in range(3))
+        return word != saved.word or list(meaning) != saved.meaning or list(categories) != saved.categories
+        
+    def update_edit_state(self) -> None:
+        """Engages the DBs lock while there are unsaved changes and enables undo and redo if possible."""
+        self.kamishirasawa.dbs_lock.value = bool(self.dirty_positions or self.structure_changes)
+        for widget in (self.db_undo, self.undo_action):
+            widget.setEnabled(self.edits.can_undo())
+        for widget in (self.db_redo, self.redo_action):
+            widget.setEnabled(self.edits.can_redo())
+            
+    def undo(self):
+        self.edits.undo(self)
+        
+    def redo(self):
+        self.edits.redo(self)
+        
+    def revert_selected_cells(self):
+        """Sets selected cells of saved vocs back to their saved values, as an edit which can be undone."""
+        for index in self.voc_table.selectedIndexes():
+            row, column = index.row(), index.column()
+            position = self.voc_table.item(row, 0).data(self.POSITION_ROLE)
+            if position is None:
+                continue
+            
+            saved = self.kamishirasawa.vocs_of(self.selected_db)[position]
+            old = self.row_data(row)[1][column]
+            new = self.cells_of(saved)[column]
+            if old[1] != new[1]:
+                self.edits.do(CellEdit(row, column, old, new), self)
+
+    @traced("DBManager.redraw_voc_table")
     def redraw_voc_table(self):  
         self.voc_table.model().blockSignals(True)
         self.voc_table.clearContents()
@@ -416,11 +859,12 @@ class DBManager(QWidget):
         
         # Populate the table with vocs from selected in combobox DB
         if self.selected_db:
-            vocs = self.selected_db.read_data()
+            vocs = self.kamishirasawa.vocs_of(self.selected_db)
             
             self.voc_table.setRowCount(len(vocs))
             for row, voc in enumerate(vocs):
                 self.set_voc(row, voc)
+                self.voc_table.item(row, 0).setData(self.POSITION_ROLE, row)
             self.voc_table.resizeRowsToContents()
         else:
             self.voc_table.setRowCount(0)
@@ -428,26 +872,80 @@ class DBManager(QWidget):
         self.voc_table.model().blockSignals(False)
         self.voc_table.model().layoutChanged.emit()
         
-    def save_changes(self):
-        """Serialize vocs present in the manager to the selected DB, overwriting the data"""
-        assert self.kamishirasawa.dbs_lock
+        self.update_row_of_position()
+        self.filter_voc_table()
         
-        vocs = []
+        self.edits.clear()
+        self.dirty_positions.clear()
+        self.structure_changes = 0
+        self.update_edit_state()
+        
+    def update_row_of_position(self):
+        """Maps positions of vocs in the selected DB to the rows they are currently displayed in."""
+        self.row_of_position = {}
         for row in range(self.voc_table.rowCount()):
-            [word, meaning, categories] = [self.voc_table.item(row, column).data(Qt.ItemDataRole.UserRole) for column in range(3)]
-            vocs.append(Voc(word, meaning, categories))
-            
-        self.selected_db.clear_and_write_data(vocs)
+            position = self.voc_table.item(row, 0).data(self.POSITION_ROLE)
+            if position is not None:
+                self.row_of_position[position] = row
+        self.hidden_positions = {position for position, row in self.row_of_position.items() if self.voc_table.isRowHidden(row)}
+        
+    def filter_voc_table(self):
+        """Hides rows of vocs not matching the search query. Rows added since the last save are always shown."""
+        self.search_timer.stop()
+        if not self.selected_db:
+            return
         
-        self.redraw_voc_table()
-        self.kamishirasawa.dbs_lock.value = False
+        # A single latin letter matches most of the vocs, so it doesn't filter, while a single kana or kanji does
+        query = self.search_input.text().strip()
+        if len(query) < self.MIN_LATIN_QUERY and query.isascii():
+            hidden_positions = set()
+        else:
+            hidden_positions = self.row_of_position.keys() - self.kamishirasawa.matching_positions(self.selected_db, query)
+        
+        # Toggle only the rows whose visibility changed since the last filtering, with updates suspended,
+        # as otherwise every toggled row relayouts the view
+        self.voc_table.setUpdatesEnabled(False)
+        for position in hidden_positions - self.hidden_positions:
+            self.voc_table.setRowHidden(self.row_of_position[position], True)
+        for position in self.hidden_positions - hidden_positions:
+            self.voc_table.setRowHidden(self.row_of_position[position], False)
+        self.voc_table.setUpdatesEnabled(True)
+        self.hidden_positions = hidden_positions
+        
+    def save_changes(self):
+        """Serialize changes made in the manager to the selected DB.
+        If vocs were only edited, only the changed ones are written and the edit history is kept,
+        if vocs were added or removed, vocs of all rows overwrite the data"""
+        assert self.kamishirasawa.dbs_lock
+        
+        if self.structure_changes:
+            vocs = [self.voc_of_row(row) for row in range(self.voc_table.rowCount())]
+            self.kamishirasawa.save_db(self.selected_db, vocs)
+            self.redraw_voc_table()
+        else:
+            self.kamishirasawa.update_vocs(self.selected_db, {position: self.voc_of_row(self.row_of_position[position])
+                                                             for position in self.dirty_positions})
+            self.dirty_positions.clear()
+            self.filter_voc_table()
+            self.update_edit_state()
         
     def revert_changes(self):
-        """Cancell all the changes, redrawing the table"""
+        """Cancell all the changes. Edited cells are set back to saved values,
+        the table is redrawn only if vocs were added or removed"""
         assert self.kamishirasawa.dbs_lock
         
-        self.redraw_voc_table()
-        self.kamishirasawa.dbs_lock.value = False
+        if self.structure_changes:
+            self.redraw_voc_table()
+            return
+        
+        saved_vocs = self.kamishirasawa.vocs_of(self.selected_db)
+        for position in self.dirty_positions:
+            row = self.row_of_position[position]
+            for column, cell in enumerate(self.cells_of(saved_vocs[position])):
+                self.set_cell(row, column, cell)
+        self.edits.clear()
+        self.dirty_positions.clear()
+        self.update_edit_state()
 
 
 class KanjiKanaLabel(QWidget):
@@ -468,6 +966,11 @@ class KanjiKanaLabel(QWidget):
         self.__text = ""
         self.mode = mode
         
+        # Child labels are pooled and reused between texts, column i of the grid holds
+        # i-th ruby label in the row 0 and i-th base label in the row 1
+        self.__ruby_labels: list[QLabel] = []
+        self.__base_labels: list[QLabel] = []
+        
         layout = QGridLayout(self)
         layout.setSpacing(0)
         
@@ -475,36 +978,60 @@ class KanjiKanaLabel(QWidget):
                            QLabel{{font-size: {self.base_font_size}pt; font-family: {self.font_family}}}
                            """)  
         
+    @staticmethod
+    @functools.lru_cache(maxsize=512)
+    def compute_layout(text: str, mode: Mode) -> tuple[tuple[typing.Optional[str], str], ...]:
+        """Returns a tuple of (ruby text or None, base text) columns for given text and mode.
+        Results are cached, so going back to a recent text or mode does no conversion."""
+        match mode:
+            case KanjiKanaLabel.Mode.ORIGINAL:
+                return ((None, text),)
+                
+            case KanjiKanaLabel.Mode.FURIGANA:
+                segments = lang_utils.furigana(text)
+                if all(hira is None for _, hira in segments):
+                    return ((None, text),)
+                return tuple((hira, og) for og, hira in segments)
+            
+            case KanjiKanaLabel.Mode.ROMAJI:
+                return ((None, lang_utils.to_romaji(text)),)
+        
+    def __grow_pool(self, columns: int) -> None:
+        for column in range(len(self.__base_labels), columns):
+            ruby_label = QLabel()
+            ruby_label.setStyleSheet(f"QLabel{{font-size: {self.furigana_font_size}px;}}")
+            self.layout().addWidget(ruby_label, 0, column, alignment=Qt.AlignmentFlag.AlignCenter)
+            self.__ruby_labels.append(ruby_label)
+            
+            base_label = QLabel()
+            self.layout().addWidget(base_label, 1, column, alignment=Qt.AlignmentFlag.AlignCenter)
+            self.__base_labels.append(base_label)
+        
     def text(self) -> str:
         return self.__text
         
+    @traced("KanjiKanaLabel.setText")
     def setText(self, text: str) -> None:
         self.__text = text
         
-        # Clear widgets in layout (nedded because furigana creates lot's of labels)
-        for i in reversed(range(self.layout().count())):
-            self.layout().itemAt(i).widget().setParent(None)
-        
-        match self.mode:
-            case self.Mode.ORIGINAL:
-                self.layout().addWidget(QLabel(text=text))
-                
-            case self.Mode.FURIGANA:
-                if not lang_utils.contains_kanji(text):
-                    self.layout().addWidget(QLabel(text=text))
-                else:
-                    for column, (og, hira) in enumerate(lang_utils.furigana(text)):
-                        if hira:
-                            label = QLabel(text=hira)
-                            label.setStyleSheet(f"QLabel{{font-size: {self.furigana_font_size}px;}}")
-                            self.layout().addWidget(label, 0, column, alignment=Qt.AlignmentFlag.AlignCenter)
-                        
-                        self.layout().addWidget(QLabel(text=og), 1, column, alignment=Qt.AlignmentFlag.AlignCenter)                            
-            
-            case self.Mode.ROMAJI:
-                self.layout().addWidget(QLabel(text=lang_utils.to_romaji(text)))
+        columns = self.compute_layout(text, self.mode)
+        self.__grow_pool(len(columns))
+        
+        for column, (ruby_label, base_label) in enumerate(zip(self.__ruby_labels, self.__base_labels)):
+            if column < len(columns):
+                ruby, base = columns[column]
+                ruby_label.setText(ruby or "")
+                ruby_label.setVisible(bool(ruby))
+                base_label.setText(base)
+                base_label.setVisible(True)
+            else:
+                # Spare labels are only hidden, so they can be reused by the next text
+                ruby_label.setVisible(False)
+                base_label.setVisible(False)
                 
     def setMode(self, mode: Mode) -> None:
+        if mode == self.mode:
+            return
         self.mode = mode
         self.setText(self.__text)
     
@@ -533,6 +1060,53 @@ class TTSButton(QPushButton):
         QThreadPool.globalInstance().start(self.TTSRunnable(text=self.text_supplier(), widget=self))
     
 
+class QuestionPrefetcher(QObject):
+    """Prepares upcoming questions of a game while the event loop is idle, e.g. while the user reads feedback.
+    
+    Preparing a question is a generator yielding after every piece of work, like converting a text,
+    which is resumed by a zero-interval timer for at most `step_budget` seconds per event loop iteration.
+    The value returned by the generator is kept until taken when the question is shown."""
+    
+    step_budget = 0.005
+    
+    def __init__(self, parent: QObject, prepare: typing.Callable[[typing.Any], typing.Generator], depth: int = 2) -> None:
+        super().__init__(parent)
+        self.prepare = prepare
+        self.depth = depth
+        self.prepared: dict[int, typing.Any] = {}  # results by id of the flashcard
+        self.__work: typing.Iterator = iter(())
+        
+        self.timer = QTimer(self)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.__on_idle)
+        
+    def schedule(self, flashcards: typing.Sequence) -> None:
+        """Starts preparing first `depth` of given flashcards, dropping results prepared before."""
+        self.prepared = {}
+        self.__work = self.__prepare_all(list(flashcards[:self.depth]))
+        self.timer.start()
+        
+    def __prepare_all(self, flashcards: list) -> typing.Iterator[None]:
+        for flashcard in flashcards:
+            self.prepared[id(flashcard)] = yield from self.prepare(flashcard)
+        
+    def __on_idle(self) -> None:
+        deadline = time.perf_counter() + self.step_budget
+        try:
+            while time.perf_counter() < deadline:
+                next(self.__work)
+        except StopIteration:
+            self.timer.stop()
+            
+    def take(self, flashcard) -> typing.Any:
+        """Returns the prepared result for the flashcard or None if it wasn't prepared (yet)."""
+        return self.prepared.pop(id(flashcard), None)
+    
+    def stop(self) -> None:
+        self.timer.stop()
+        self.__work = iter(())
+        
+
 class FlashcardGameWidget(QAbstractWidget):
     """Abstract widget supplying a graphical interface for playing FlashcardGame instances.
     Contains question label in from of KanjiKanaLabel and DisplayMode settings buttons but does not implement
@@ -546,6 +1120,21 @@ class FlashcardGameWidget(QAbstractWidget):
         ORIGINAL = auto()
         FURIGANA = auto()
         ROMAJI = auto()
+        
+    class RecorderRunnable(QRunnable):
+        """Packs the vocs of a session recorder, which takes a while for the pool of a big lazy game."""
+        
+        class Signals(QObject):
+            prepared = pyqtSignal()
+        
+        def __init__(self, recorder: snapshot.SessionRecorder) -> None:
+            super().__init__()
+            self.recorder = recorder
+            self.signals = self.Signals()
+            
+        def run(self) -> None:
+            self.recorder.prepare()
+            self.signals.prepared.emit()
     
     def __init__(self, parent: QWidget, game: FlashcardGame, *args, **kwargs) -> None:
         super().__init__(parent, *args, **kwargs)
@@ -553,9 +1142,21 @@ class FlashcardGameWidget(QAbstractWidget):
         self.parent = parent
         self.game = game
         self.state = self.State.READING_ANSWER
+        
+        # The session is saved after every answer, so it can be resumed after closing the app.
+        # It's first written once the vocs are packed in the background, including answers given until then
+        self.session_recorder = recorder = snapshot.SessionRecorder(
+            snapshot.SESSION_PATH, game, type(self).__name__, getattr(self, "choices", 0))
+        self.destroyed.connect(lambda: recorder.close())
+        runnable = self.RecorderRunnable(recorder)
+        runnable.signals.prepared.connect(self.on_recorder_prepared)
+        QThreadPool.globalInstance().start(runnable)
         self.display_mode = self.DisplayMode.ORIGINAL
         self.display_mode_changed = utils.Event()
         
+        # Upcoming questions are prepared in idle time, so showing them only swaps in cached results
+        self.prefetcher = QuestionPrefetcher(self, self.prepare_question)
+        
         # Display mode radio buttons
         self.display_settings = QButtonGroup()
         r1 = QRadioButton(text="Kanji/Kana")
@@ -584,6 +1185,8 @@ class FlashcardGameWidget(QAbstractWidget):
                 case self.DisplayMode.ROMAJI:
                     self.question_label.setMode(KanjiKanaLabel.Mode.ROMAJI)
         self.display_mode_changed += update_kanjikana_label
+        # Questions prepared for the previous mode would be formatted again when shown
+        self.display_mode_changed += lambda *_: self.prefetch() if self.state == self.State.GIVING_FEEDBACK else None
         
         self.question_label = KanjiKanaLabel()
         self.question_label.setText(game.question)
@@ -602,39 +1205,81 @@ class FlashcardGameWidget(QAbstractWidget):
         
     def format_inline_text(self, text):
         """Formats inline text in a simmilar way as KanjiKanaLabel, but as a single str, without rich text support."""
-        match self.display_mode:
-            case self.DisplayMode.ORIGINAL:
+        return self.format_inline(text, self.display_mode)
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def format_inline(text: str, display_mode: DisplayMode) -> str:
+        match display_mode:
+            case FlashcardGameWidget.DisplayMode.ORIGINAL:
                 return text
                 
-            case self.DisplayMode.FURIGANA:
+            case FlashcardGameWidget.DisplayMode.FURIGANA:
                 hiragana = ""
                 for orig, hira in lang_utils.furigana(text):
                     hiragana += hira if hira else orig
                 return hiragana
                 
-            case self.DisplayMode.ROMAJI:
+            case FlashcardGameWidget.DisplayMode.ROMAJI:
                 return lang_utils.to_romaji(text)
                 
     @abstractmethod
     def create_input_widget(self) -> QWidget:
         ...
+        
+    def prepare_question(self, flashcard) -> typing.Generator[None, None, typing.Any]:
+        """Does the work needed to show the question of the flashcard ahead of time, filling the caches
+        of the question label and inline formatting. Yields between pieces of work."""
+        KanjiKanaLabel.compute_layout(self.game.question_of(flashcard), self.question_label.mode)
+        yield
+        self.format_inline_text(self.game._answer_of(flashcard))
+        yield
+        
+    def prefetch(self) -> None:
+        if not self.game.is_done:
+            self.prefetcher.schedule(self.game.active)
                 
     def on_correct_answer(self) -> None:
         self.game.mark_as_correct()
+        self.record_answer(True)
+        self.prefetch()
     
     def on_incorrect_answer(self) -> None:
         self.game.mark_as_incorrect()
+        self.record_answer(False)
+        self.prefetch()
+        
+    def on_recorder_prepared(self) -> None:
+        if self.session_recorder and not self.game.is_done:
+            try:
+                self.session_recorder.compact()
+            except OSError:
+                self.session_recorder = None
+        
+    def record_answer(self, correct: bool) -> None:
+        if self.session_recorder:
+            try:
+                self.session_recorder.record(correct)
+            except OSError:
+                # Failing to save the session shouldn't interrupt the game
+                self.session_recorder = None
 
     def on_new_question(self) -> None:
         self.question_label.setText(self.game.question)
    
     def finish(self) -> None:
+        self.prefetcher.stop()
+        if self.session_recorder:
+            self.session_recorder.discard()
+            
         label = QLabel(f"That's all! Congrats'!\n{lang_utils.kaomoji.joy()}")
         label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.parent.replace_central_widget(label)
     
 class TextInputFlashcardGameWidget(FlashcardGameWidget):
-    """FlashcardGameWidget implementation in which user types in the answer via keyboard."""    
+    """FlashcardGameWidget implementation in which user types in the answer via keyboard.
+    Answers in Japanese are converted from romaji to hiragana or katakana as they are typed,
+    unless latin input is toggled on, e.g. to answer in romaji."""    
     
     def create_input_widget(self) -> QWidget:
         input_widget = QWidget()
@@ -642,6 +1287,26 @@ class TextInputFlashcardGameWidget(FlashcardGameWidget):
         self.answer_input = QLineEdit()
         self.feedback_label = QLabel()
         
+        self.kana_input = isinstance(self.game, EnToJaGame)
+        self.composer = IncrementalTransliterator(ROMAJI_TO_HIRAGANA)
+        self.answer_input.textEdited.connect(self.on_answer_edited)
+        
+        self.katakana_button = QPushButton(text="あ")
+        self.katakana_button.setCheckable(True)
+        self.katakana_button.setFixedSize(32, 32)
+        self.katakana_button.setToolTip("Type katakana (Ctrl+K)")
+        self.katakana_button.setShortcut("Ctrl+K")
+        self.katakana_button.toggled.connect(self.on_katakana_toggled)
+        self.katakana_button.setVisible(self.kana_input)
+        
+        self.latin_button = QPushButton(text="A")
+        self.latin_button.setCheckable(True)
+        self.latin_button.setFixedSize(32, 32)
+        self.latin_button.setToolTip("Type latin letters as they are (Ctrl+L)")
+        self.latin_button.setShortcut("Ctrl+L")
+        self.latin_button.toggled.connect(self.on_latin_toggled)
+        self.latin_button.setVisible(self.kana_input)
+        
         self.confirm_button = QPushButton(text="Check")
         self.confirm_button.clicked.connect(lambda: self.on_confirm_pressed())
         
@@ -650,18 +1315,61 @@ class TextInputFlashcardGameWidget(FlashcardGameWidget):
         self.confirm_action.triggered.connect(lambda: self.on_confirm_pressed())
         self.addAction(self.confirm_action)
         
+        answer_row = QWidget()
+        answer_row.layout = QHBoxLayout(answer_row)
+        answer_row.layout.addWidget(self.answer_input)
+        answer_row.layout.addWidget(self.katakana_button)
+        answer_row.layout.addWidget(self.latin_button)
+        
         layout = QVBoxLayout(input_widget)
-        layout.addWidget(self.answer_input, alignment=Qt.AlignmentFlag.AlignCenter)
+        layout.addWidget(answer_row, alignment=Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(self.feedback_label, alignment=Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(self.confirm_button, alignment=Qt.AlignmentFlag.AlignCenter)
         
         return input_widget
     
+    def on_answer_edited(self, text: str) -> None:
+        if not self.kana_input:
+            return
+        
+        # Typing or deleting at the end is passed on to the composer, which converts only the unconfirmed
+        # tail; any other edit (pasting, editing in the middle) makes it start over with the whole text
+        previous = self.composer.text
+        at_end = self.answer_input.cursorPosition() == len(text)
+        if at_end and len(text) == len(previous) + 1 and text.startswith(previous):
+            self.composer.type(text[-1])
+        elif at_end and len(text) == len(previous) - 1 and previous.startswith(text):
+            self.composer.backspace()
+        else:
+            self.composer.reset(text)
+            
+        if self.composer.text != text:
+            self.answer_input.setText(self.composer.text)
+            
+    def on_katakana_toggled(self, katakana: bool) -> None:
+        # Only what is typed afterwards is affected
+        self.composer.transliterator = ROMAJI_TO_KATAKANA if katakana else ROMAJI_TO_HIRAGANA
+        self.katakana_button.setText("ア" if katakana else "あ")
+        self.answer_input.setFocus()
+        
+    def on_latin_toggled(self, latin: bool) -> None:
+        # Romaji typed so far is converted, only what is typed afterwards is kept as it is
+        self.composer.flush()
+        self.composer.passthrough = latin
+        self.katakana_button.setEnabled(not latin)
+        if self.composer.text != self.answer_input.text():
+            self.answer_input.setText(self.composer.text)
+        self.answer_input.setFocus()
+    
     def on_confirm_pressed(self):
         match self.state:
             case self.State.READING_ANSWER:                
                 self.state = self.State.GIVING_FEEDBACK
                 
+                if self.kana_input:
+                    self.composer.flush()
+                    self.answer_input.setText(self.composer.text)
+                
                 self.answer_input.setDisabled(True)
                 self.confirm_button.setText("Next")
                 
@@ -685,6 +1393,7 @@ class TextInputFlashcardGameWidget(FlashcardGameWidget):
                 
                 self.answer_input.setDisabled(False)
                 self.answer_input.setText("")
+                self.composer.reset()
                 self.answer_input.setFocus()
                 self.feedback_label.setText("")
                 self.confirm_button.setText("Check")
@@ -692,14 +1401,35 @@ class TextInputFlashcardGameWidget(FlashcardGameWidget):
                 self.on_new_question()
                   
 class ChoiceFlashcardGameWidget(FlashcardGameWidget):
-    """FlashcardGameWidget implementation in which user selects the answer from several generated options.""" 
+    """FlashcardGameWidget implementation in which user selects the answer from several generated options.
+    Incorrect options are answers of flashcards most similar to the question, found in a `SimilarityIndex`
+    over the `pool` of flashcards (by default those the game has or draws), which is built in the background.
+    Until it's ready, incorrect options are sampled randomly.""" 
+    
+    class IndexRunnable(QRunnable):
+        def __init__(self, widget: "ChoiceFlashcardGameWidget", pool: typing.Iterable) -> None:
+            super().__init__()
+            self.widget = widget
+            self.pool = pool
+            
+        def run(self) -> None:
+            self.widget.similarity_index = SimilarityIndex(self.pool)
     
-    def __init__(self, parent: QWidget, game: FlashcardGame, choices: int, *args, **kwargs) -> None:
+    def __init__(self, parent: QWidget, game: FlashcardGame, choices: int, pool: typing.Iterable = None,
+                 *args, **kwargs) -> None:
         assert choices >= 2
         self.choices = choices
+        self.similarity_index: SimilarityIndex = None
         
         super().__init__(parent, game, *args, **kwargs)
         
+        if pool is None:
+            pool = game.pool if game.pool is not None else game.active + game.passed
+        # The pool of a resumed lazy game decodes its vocs on access, which is left to the runnable too
+        if not isinstance(pool, typing.Sequence):
+            pool = list(pool)
+        QThreadPool.globalInstance().start(self.IndexRunnable(self, pool))
+        
     def refresh_choice_buttons_text(self):
         for button in self.answer_buttons:
             button.setText(self.format_inline_text(button.answer))
@@ -741,10 +1471,24 @@ class ChoiceFlashcardGameWidget(FlashcardGameWidget):
         
         return input_widget
         
-    def set_choices(self) -> None:
+    def sample_choices(self, flashcard) -> list[str]:
         # Create a list containg one correct answer with the rest being incorrect
-        available_answers = [self.game.answer] + self.game.sample_incorrect_answers(self.choices - 1)
+        similar = self.similarity_index.similar(flashcard) if self.similarity_index else ()
+        available_answers = [self.game._answer_of(flashcard)] + self.game.sample_incorrect_answers(self.choices - 1, flashcard, similar)
         random.shuffle(available_answers)
+        return available_answers
+    
+    def prepare_question(self, flashcard) -> typing.Generator[None, None, list[str]]:
+        yield from super().prepare_question(flashcard)
+        available_answers = self.sample_choices(flashcard)
+        for answer in available_answers:
+            self.format_inline_text(answer)
+            yield
+        return available_answers
+        
+    def set_choices(self) -> None:
+        flashcard = self.game._current
+        available_answers = self.prefetcher.take(flashcard) or self.sample_choices(flashcard)
         
         for button, answer in zip(self.answer_buttons, available_answers):
             button.answer = answer
@@ -790,6 +1534,10 @@ class VocTestSetupWidget(QWidget):
     """A subwidget (not made to be a central widget) supplying a form in which user can configure the flashcard game.
     The widget relies on a voc source, that has to be supplied by another, presumably parent, widget."""
     
+    # Games over bigger selections keep only a window of active flashcards, drawing the rest lazily
+    LAZY_DECK_THRESHOLD = 1000
+    LAZY_DECK_WINDOW = 100
+    
     def __init__(self, vocs: typing.Iterable, parent: QWidget, *args, **kwargs) -> None:
         super().__init__(parent=parent, *args, **kwargs)
         self.parent = parent
@@ -804,6 +1552,11 @@ class VocTestSetupWidget(QWidget):
         self.passes_spinbox.setMinimum(1)
         self.layout.addRow("Correct guesses needed:", self.passes_spinbox)
         
+        self.max_cards_spinbox = QSpinBox(self)
+        self.max_cards_spinbox.setMaximum(1_000_000)
+        self.max_cards_spinbox.setSpecialValueText("All")
+        self.layout.addRow("Flashcards per session:", self.max_cards_spinbox)
+        
         self.place_mode_select_widget()
         self.place_gamemode_select_widget()
         
@@ -811,6 +1564,7 @@ class VocTestSetupWidget(QWidget):
         self.play_button.clicked.connect(self.play)
         self.layout.addRow(self.play_button)
         
+        self.restore_settings()
         self.update()
         
     def update(self):
@@ -824,6 +1578,8 @@ class VocTestSetupWidget(QWidget):
         mode_select.layout = QVBoxLayout(mode_select)
         self.layout.addRow("Mode", mode_select)
         
+        self.mode_buttons: list[QRadioButton] = []
+        
         ja_to_en_radio_button = QRadioButton("Question in Japanese,\nanswer in English")
         ja_to_en_radio_button.game_cls = JaToEnGame
         mode_select.layout.addWidget(ja_to_en_radio_button)
@@ -836,6 +1592,7 @@ class VocTestSetupWidget(QWidget):
         register_toggled_callback = lambda rb: rb.toggled.connect(lambda: setattr(self, "game_cls", rb.game_cls))
         for rb in (ja_to_en_radio_button, en_to_ja_radio_button):
             register_toggled_callback(rb)
+            self.mode_buttons.append(rb)
             
         # Select one button as default
         ja_to_en_radio_button.toggle()
@@ -845,6 +1602,8 @@ class VocTestSetupWidget(QWidget):
         gamemode_select.layout = QVBoxLayout(gamemode_select)
         self.layout.addRow("Gamemode", gamemode_select)
         
+        self.gamemode_buttons: list[QRadioButton] = []
+        
         choice_radio_button = QRadioButton("Choice")
         choice_radio_button.game_widget_type = ChoiceFlashcardGameWidget
         gamemode_select.layout.addWidget(choice_radio_button)
@@ -856,6 +1615,7 @@ class VocTestSetupWidget(QWidget):
         register_toggled_callback = lambda rb: rb.toggled.connect(lambda: self.on_gamemode_selected(rb.game_widget_type))
         for rb in (choice_radio_button, text_input_radio_button):
             register_toggled_callback(rb)
+            self.gamemode_buttons.append(rb)
         
         # Widget allowing to specify choice button count
         self.choices_spinbox = QSpinBox()
@@ -874,25 +1634,63 @@ class VocTestSetupWidget(QWidget):
         self.choices_spinbox.setVisible(game_widget_type == ChoiceFlashcardGameWidget) 
         self.choices_spinbox.label.setVisible(game_widget_type == ChoiceFlashcardGameWidget)
         
-    def get_game_widget(self, game: FlashcardGame) -> QWidget:
+    def restore_settings(self) -> None:
+        """Sets the form to the settings of the last played game, saved in the workspace."""
+        settings = self.main_window.workspace.game_settings
+        try:
+            self.passes_spinbox.setValue(int(settings.get("passes", 1)))
+            self.max_cards_spinbox.setValue(int(settings.get("max_cards", 0)))
+            self.choices_spinbox.setValue(int(settings.get("choices", 3)))
+        except (TypeError, ValueError):
+            pass
+        for rb in self.mode_buttons:
+            if rb.game_cls.__name__ == settings.get("game"):
+                rb.setChecked(True)
+        for rb in self.gamemode_buttons:
+            if rb.game_widget_type.__name__ == settings.get("widget"):
+                rb.setChecked(True)
+                
+    def save_settings(self) -> None:
+        self.main_window.workspace.game_settings = {
+            "passes": self.passes_spinbox.value(),
+            "max_cards": self.max_cards_spinbox.value(),
+            "game": self.game_cls.__name__,
+            "widget": self.game_widget_type.__name__,
+            "choices": self.choices_spinbox.value(),
+        }
+        self.main_window.save_workspace()
+        
+    def get_game_widget(self, game: FlashcardGame, vocs: list) -> QWidget:
         parent = self.parent.parent
         
         # Create a widget for a flashcard game, type being specified by selected radio button
         if self.game_widget_type is TextInputFlashcardGameWidget:
             return TextInputFlashcardGameWidget(parent, game)
         if self.game_widget_type is ChoiceFlashcardGameWidget:
-            return ChoiceFlashcardGameWidget(parent, game, choices=self.choices_spinbox.value())
+            return ChoiceFlashcardGameWidget(parent, game, choices=self.choices_spinbox.value(), pool=vocs)
     
     def play(self):
+        self.save_settings()
+        if not self.main_window.confirm_new_session():
+            return
+        
         # Instantiate the game widget with the parameters set in the form, set is as main widget in the window
-        game_widget = self.get_game_widget(self.game_cls(self.vocs, passes_per_flashcard=self.passes_spinbox.value()))
+        # Selected vocs change with the selection in the setup widget, the game keeps the ones it started with
+        vocs = list(self.vocs)
+        window = self.LAZY_DECK_WINDOW if len(vocs) > self.LAZY_DECK_THRESHOLD else None
+        game = self.game_cls(vocs, passes_per_flashcard=self.passes_spinbox.value(),
+                             window=window, max_cards=self.max_cards_spinbox.value() or None)
+        game_widget = self.get_game_widget(game, vocs)
         self.main_window.replace_central_widget(game_widget)
 
 class DBGameSetupWidget(QWidget):
-    """FlashcardGame setup widget where user selects the vocs based os chosen categories from attached DBs."""
+    """FlashcardGame setup widget where user selects the vocs based os chosen categories from attached DBs,
+    or by a boolean query over categories, which replaces the checked categories while it's not empty."""
     
     NO_CATEGORIES = "Non categorised"
     ALL_CATEGORIES = "All"
+    # Milliseconds after the last keystroke in the query input before the query is evaluated
+    QUERY_DELAY = 300
     
     def __init__(self, parent: MainWindow, *args, **kwargs) -> None:
         super().__init__(parent, *args, **kwargs)
@@ -903,24 +1701,23 @@ class DBGameSetupWidget(QWidget):
         
         self.layout.addWidget(QLabel("Include categories:"))
         self.place_category_select()
+        self.place_query_input()
         self.layout.addStretch()
         self.game_setup_widget = VocTestSetupWidget(self.selected_vocs, self)
         self.layout.addWidget(self.game_setup_widget)
         
         # Update categories, when
-        self.parent.kamishirasawa.on_dbs_changed += self.update_categories
+        subscribe_while_alive(self, self.parent.kamishirasawa.on_dbs_changed, self.update_categories)
+        subscribe_while_alive(self, self.parent.kamishirasawa.on_db_data_changed, lambda *_: self.update_categories())
         self.update_categories()
         
     def update_categories(self):
         # Find the set of all categories present in attached DBs
         categories = set()
         for db in self.parent.kamishirasawa.dbs:
-            for voc in db.read_data():
-                match voc.categories:
-                    case []:
-                        categories.add(self.NO_CATEGORIES)
-                    case [*cats]:
-                        categories |= set(cats)
+            categories |= db.categories()
+            if db.has_uncategorised():
+                categories.add(self.NO_CATEGORIES)
                         
         # Delete all widgets from category_select but the first two ('All' checkbox and separator)
         self.category_checkboxes.clear()
@@ -928,10 +1725,12 @@ class DBGameSetupWidget(QWidget):
         for widget in reversed([layout.itemAt(i).widget() for i in range(2, layout.count())]):
             widget.setParent(None)
             
-        # Populate the layout
+        # Populate the layout, checking categories selected the last time
+        remembered = set(self.parent.workspace.categories)
         for category in sorted(categories, key=lambda x: (x == self.NO_CATEGORIES, x)): # Ensure that NO_CATEGORIES is at the bottom
             checkbox = QCheckBox(text=category)
             checkbox.category = category
+            checkbox.setChecked(category in remembered)
             layout.addWidget(checkbox)
             self.category_checkboxes.append(checkbox)
             checkbox.stateChanged.connect(lambda *_: self.on_selected_categories_changed())
@@ -961,19 +1760,54 @@ class DBGameSetupWidget(QWidget):
         self.category_select.layout.addWidget(self.all_categories_checkbox)
         self.category_select.layout.addWidget(HSeparator())
         
-        
+    def place_query_input(self):
+        query_widget = QWidget(self)
+        query_widget.layout = QHBoxLayout(query_widget)
+        query_widget.layout.addWidget(QLabel("Or query:"))
+        
+        self.query_input = QLineEdit(query_widget)
+        self.query_input.setPlaceholderText("e.g. 1ST GRADE & !NUMBERS | FAMILY")
+        self.query_input.setToolTip("Categories combined with & (and), | (or), ! (not) and parentheses")
+        self.query_input.setText(self.parent.workspace.category_query)
+        # Evaluating the query saves the workspace, so it's done once typing pauses or the input loses focus
+        self.query_timer = QTimer(self)
+        self.query_timer.setSingleShot(True)
+        self.query_timer.setInterval(self.QUERY_DELAY)
+        self.query_timer.timeout.connect(self.on_selected_categories_changed)
+        self.query_input.textChanged.connect(lambda *_: self.query_timer.start())
+        self.query_input.editingFinished.connect(self.apply_pending_query)
+        query_widget.layout.addWidget(self.query_input)
+        
+        self.query_status = QLabel()
+        query_widget.layout.addWidget(self.query_status)
+        self.layout.addWidget(query_widget)
+        
+    def apply_pending_query(self) -> None:
+        """Evaluates the query right away if it changed since it was evaluated the last time."""
+        if self.query_timer.isActive():
+            self.query_timer.stop()
+            self.on_selected_categories_changed()
+        
+    @traced("DBGameSetupWidget.on_selected_categories_changed")
     def on_selected_categories_changed(self):
+        self.query_timer.stop()
         selected_categories = {ch.category for ch in self.category_checkboxes if ch.isChecked()}
+        query = self.query_input.text().strip()
+        self.category_select.setEnabled(not query)
         
-        # Fill selected_vocs with Vocs from attached DBs belonging to at least one of the selected categories
         self.selected_vocs.clear()
-        for db in self.parent.kamishirasawa.dbs:
-            for voc in db.read_data():
-                match voc.categories:
-                    case [] if self.NO_CATEGORIES in selected_categories:
-                        self.selected_vocs.append(voc)
-                    case [*cats] if set.intersection(set(cats), selected_categories):
-                        self.selected_vocs.append(voc)
+        if query:
+            try:
+                self.selected_vocs += self.parent.kamishirasawa.query_vocs(query)
+                self.query_status.setText(f"{len(self.selected_vocs)} vocs")
+            except QueryError as e:
+                self.query_status.setText(str(e))
+        else:
+            # Fill selected_vocs with Vocs from attached DBs belonging to at least one of the selected categories
+            self.query_status.clear()
+            for db in self.parent.kamishirasawa.dbs:
+                self.selected_vocs += db.read_by_categories(selected_categories - {self.NO_CATEGORIES},
+                                                            include_uncategorised=self.NO_CATEGORIES in selected_categories)
         
         # Update the tristate all_categories_checkbox
         checks = [ch.isChecked() for ch in self.category_checkboxes]
@@ -984,10 +1818,20 @@ class DBGameSetupWidget(QWidget):
         else:
             self.all_categories_checkbox.setCheckState(Qt.CheckState.Unchecked)
             
+        # Selected categories of decks which are not attached yet are remembered as well
+        workspace = self.parent.workspace
+        present = {ch.category for ch in self.category_checkboxes}
+        remembered = [c for c in workspace.categories if c not in present] + sorted(selected_categories)
+        if remembered != workspace.categories or query != workspace.category_query:
+            workspace.categories = remembered
+            workspace.category_query = query
+            self.parent.save_workspace()
+            
         self.game_setup_widget.update()
                           
 class HiraganaTestSetupWidget(QWidget):
-    """FlashcardGame setup widget where voc of hiragana syllables are generated based on user selection in vowel-consonant matrix."""
+    """FlashcardGame setup widget where vocs of kana syllables are selected by user in vowel-consonant matrix.
+    Syllables come from the precomputed `syllabary` table, in hiragana or katakana, with optional dakuten and yōon columns."""
     
     @property
     def minor_checkboxes(self): # all checkboxes but the 'All' chkeckbox
@@ -997,33 +1841,40 @@ class HiraganaTestSetupWidget(QWidget):
         super().__init__(parent, *args, **kwargs)
         self.parent = parent
         self.vocs = set()
+        self.script = syllabary.Script.HIRAGANA
+        self.shown_kinds = {syllabary.ColumnKind.BASIC}
         
         self.layout = QVBoxLayout(self)
         
+        self.place_options()
         self.place_matrix()
         
         self.game_setup_widget = VocTestSetupWidget(self.vocs, self)
         
         self.layout.addWidget(self.game_setup_widget)
         
+    def place_options(self):
+        options = QWidget(self)
+        options.layout = QHBoxLayout(options)
+        self.layout.addWidget(options)
+        
+        script_combobox = QComboBox()
+        script_combobox.addItem("Hiragana", syllabary.Script.HIRAGANA)
+        script_combobox.addItem("Katakana", syllabary.Script.KATAKANA)
+        script_combobox.currentIndexChanged.connect(lambda i: self.on_script_changed(script_combobox.itemData(i)))
+        options.layout.addWidget(script_combobox)
+        
+        for text, kind in (("Dakuten", syllabary.ColumnKind.DAKUTEN), ("Yōon", syllabary.ColumnKind.YOON)):
+            checkbox = QCheckBox(text)
+            checkbox.kind = kind
+            checkbox.toggled.connect(lambda b, kind=kind: self.on_kind_toggled(kind, b))
+            options.layout.addWidget(checkbox)
         
     def place_matrix(self):
         self.matrix = QWidget(self)
         self.layout.addWidget(self.matrix)
         self.matrix.layout = QGridLayout(self.matrix)
         
-        # Generate algorithmicly the hiragana syllables        
-        vowels = ['a', 'i', 'u', 'e', 'o']
-        consonants = ['', 'k', 's', 't', 'n', 'h', 'm', 'y', 'r', 'w']
-        
-        excluded = {"yi", "ye", "wi", "wu", "we"}
-        exception_dict = {
-            "si": "shi",
-            "hu": "fu",
-            "ti": "chi",
-            "tu": "tsu",
-        }
-        
         alignment = Qt.AlignmentFlag.AlignCenter
         
         # Place the 'all/some/none' checkbox in the corner
@@ -1041,47 +1892,63 @@ class HiraganaTestSetupWidget(QWidget):
         
         self.vowel_checkboxes: list[QCheckBox] = []
         self.consonant_checkboxes: list[QCheckBox] = []
+        self.syllable_labels: list[QLabel] = []
+        self.column_widgets: list[list[QWidget]] = [] # widgets of each syllabary column, shown and hidden together
         
-        # Place consonant checkbox row
-        for row, vowel in enumerate(vowels, start=1):
+        # Place vowel checkbox column
+        for row, vowel in enumerate(syllabary.VOWELS, start=1):
             checkbox = QCheckBox()
-            checkbox.row = row
+            checkbox.row = row - 1
             self.vowel_checkboxes.append(checkbox)
             self.matrix.layout.addWidget(checkbox, row, 0, alignment)
         
-        # Place vowel checkbox column   
-        for column, consonant in enumerate(consonants, start=1):
+        # Place consonant checkbox row and populate the matrix
+        for index, column in enumerate(syllabary.COLUMNS):
             checkbox = QCheckBox()
-            checkbox.column = column
+            checkbox.column = index
             self.consonant_checkboxes.append(checkbox)
-            self.matrix.layout.addWidget(checkbox, 0, column, alignment)
+            self.matrix.layout.addWidget(checkbox, 0, index + 1, alignment)
+            widgets = [checkbox]
             
-        def romaji_hiragana_label(romaji: str) -> QLabel:
-            label = QLabel()
-            label.hiragana = lang_utils.to_hiragana(romaji)
-            label.romaji = romaji
-            label.setText(f"{label.hiragana}\n{label.romaji}")
-            label.setAlignment(alignment)
-            return label
+            for row, syllable in enumerate(column.cells, start=1):
+                if syllable:
+                    label = QLabel()
+                    label.syllable = syllable
+                    label.setAlignment(alignment)
+                    self.syllable_labels.append(label)
+                    self.matrix.layout.addWidget(label, row, index + 1, alignment)
+                    widgets.append(label)
+                    
+            self.column_widgets.append(widgets)
             
-        # Populate the matrix
-        for (row, vowel), (column, consonant) in itertools.product(enumerate(vowels, start=1), enumerate(consonants, start=1)):          
-            if (syllable := consonant + vowel) in excluded:
-                continue
-            syllable = exception_dict.get(syllable, syllable)
-            self.matrix.layout.addWidget(romaji_hiragana_label(syllable), row, column, alignment)
+        self.update_syllable_labels()
+        self.update_column_visibility()
             
-        # Place 'n' consonant checkbox and label, as it is not tied to any vowel
-        n_column = len(consonants) + 1
-        checkbox = QCheckBox()
-        checkbox.column = n_column
-        self.consonant_checkboxes.append(checkbox)
-        self.matrix.layout.addWidget(checkbox, 0, n_column, alignment)
-        self.matrix.layout.addWidget(romaji_hiragana_label('n'), 1, n_column, alignment)
-        
         # Assign callbacks
         for checkbox in self.minor_checkboxes:
             checkbox.stateChanged.connect(self.on_minor_checkbox_changed)
+            
+    def update_syllable_labels(self):
+        for label in self.syllable_labels:
+            label.setText(f"{label.syllable.kana(self.script)}\n{label.syllable.romaji}")
+            
+    def update_column_visibility(self):
+        for column, widgets in zip(syllabary.COLUMNS, self.column_widgets):
+            for widget in widgets:
+                widget.setVisible(column.kind in self.shown_kinds)
+                
+    def on_script_changed(self, script: syllabary.Script):
+        self.script = script
+        self.update_syllable_labels()
+        self.on_selection_changed()
+        
+    def on_kind_toggled(self, kind: syllabary.ColumnKind, shown: bool):
+        if shown:
+            self.shown_kinds.add(kind)
+        else:
+            self.shown_kinds.discard(kind)
+        self.update_column_visibility()
+        self.on_selection_changed()
         
     def on_global_checkbox_changed(self):
         if self.global_checkbox.checkState() == Qt.CheckState.PartiallyChecked:
@@ -1091,7 +1958,7 @@ class HiraganaTestSetupWidget(QWidget):
         
         # Set minor checkboxes state to that of global_checkbox
         for ch in self.minor_checkboxes:
-            ch.blockSignals(False)
+            ch.blockSignals(True)
             ch.setCheckState(state)
             ch.blockSignals(False)
         
@@ -1113,20 +1980,13 @@ class HiraganaTestSetupWidget(QWidget):
         self.on_selection_changed()
         
     def on_selection_changed(self):
-        # Select syllables from layout depending on selected checkboxes
-        rows = [ch.row for ch in self.vowel_checkboxes if ch.isChecked()]
-        columns = [ch.column for ch in self.consonant_checkboxes[:-1] if ch.isChecked()]
+        # Select syllables from the table by bitmasks of selected rows and shown, selected columns
+        row_mask = syllabary.mask_of(ch.row for ch in self.vowel_checkboxes if ch.isChecked())
+        column_mask = syllabary.mask_of(ch.column for ch in self.consonant_checkboxes
+                                        if ch.isChecked() and syllabary.COLUMNS[ch.column].kind in self.shown_kinds)
         
         self.vocs.clear()
-        for row, column in itertools.product(rows, columns):
-            try:
-                label = self.matrix.layout.itemAtPosition(row, column).widget()
-                self.vocs.add(Voc(label.hiragana, [label.romaji], []))
-            except:
-                pass
-        # Add 'n' syllable, not affected by vowel selection
-        if self.consonant_checkboxes[-1].isChecked():
-                self.vocs.add(Voc(lang_utils.to_hiragana("n"), ["n"], []))
+        self.vocs.update(Voc(syllable.kana(self.script), [syllable.romaji], [])
+                         for syllable in syllabary.select(row_mask, column_mask))
             
         self.game_setup_widget.update()
-                       
\ No newline at end of file
@@ -1,9 +1,22 @@
+import csv
+import gzip
 import json
+import lzma
 import os
-from dataclasses import dataclass
-from typing import Iterable, Set
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Iterable, Mapping, Set, Union
 
-from utils import Event, ObservableFlag
+import audiopack
+from category_query import (CategoryIndex, CategoryQuery, QueryError, normalize,
+                            positions)
+from search import SearchIndex
+from tracing import traced
+from utils import Event, ObservableFlag, multi_split
 
 
 @dataclass
@@ -16,8 +29,10 @@ class Voc:
     categories: list[str]
     
     def __post_init__(self):
-        self.meaning = list({s.casefold().strip() for s in self.meaning})
-        self.categories = list({s.upper().strip() for s in self.categories})
+        # Duplicates are dropped keeping the first occurrence, so the order of meanings and categories is kept
+        self.meaning = list(dict.fromkeys(s.casefold().strip() for s in self.meaning))
+        # Compared with names in category queries, so normalized the same way
+        self.categories = list(dict.fromkeys(normalize(s) for s in self.categories))
     
     @classmethod
     def get_from_json(cls, path: str) -> list:        
@@ -37,70 +52,577 @@ class DBAlreadyAttachedError(Exception):
 class DBFileError(Exception):
     pass
 
-class DB:
-    # DB represents a file containing vocs, structured as JSON
-    def __init__(self, path) -> None:
+class DB(ABC):
+    # DB represents a file containing vocs, the storage format is up to the implementation
+    path: str
+    
+    @abstractmethod
+    def read_data(self) -> list[Voc]:
+        ...
+    
+    # Removes all the vocs and writes given ones
+    @abstractmethod
+    def clear_and_write_data(self, data: Iterable[Voc]) -> None:
+        ...
+        
+    @abstractmethod
+    def close(self) -> None:
+        ...
+        
+    def reopen(self) -> None:
+        """Reopens the underlying file, needed when it was replaced by another program."""
+        
+    def categories(self) -> Set[str]:
+        """Returns the set of categories used by the vocs in the DB."""
+        return {category for voc in self.read_data() for category in voc.categories}
+    
+    def has_uncategorised(self) -> bool:
+        return any(not voc.categories for voc in self.read_data())
+    
+    def read_by_categories(self, categories: Iterable[str], include_uncategorised: bool = False) -> list[Voc]:
+        """Returns vocs belonging to at least one of given categories,
+        and vocs with no categories if `include_uncategorised` is set."""
+        categories = set(categories)
+        return [voc for voc in self.read_data()
+                if categories.intersection(voc.categories) or (include_uncategorised and not voc.categories)]
+        
+    def update_voc(self, position: int, voc: Voc) -> None:
+        """Replaces a single voc at given position."""
+        self.update_vocs({position: voc})
+        
+    def update_vocs(self, vocs_by_position: dict[int, Voc]) -> None:
+        """Replaces vocs at given positions, leaving the others untouched."""
+        vocs = self.read_data()
+        for position, voc in vocs_by_position.items():
+            vocs[position] = voc
+        self.clear_and_write_data(vocs)
+        
+    def find(self, word: str) -> list[Voc]:
+        """Returns all vocs with given word."""
+        return [voc for voc in self.read_data() if voc.word == word]
+        
+        
+def _dump_vocs(data: Iterable[Voc], file, compact: bool) -> None:
+    if compact:
+        json.dump([d.__dict__ for d in data], file, ensure_ascii=False, separators=(",", ":"))
+    else:
+        json.dump([d.__dict__ for d in data], file, indent=4)
+
+
+class JsonDB(DB):
+    # JsonDB represents a file containing vocs, structured as JSON
+    # If `compact` is set, vocs are written without indentation and with unescaped Japanese
+    def __init__(self, path, compact: bool = False) -> None:
         try:
-            self.file = open(path, 'a+')
+            self.file = open(path, 'a+', encoding="utf-8")
             self.path = os.path.normpath(path)
+            self.compact = compact
             
         except AttributeError as e:
             self.close()
             raise DBParseError(" .".join(e.args))
         
-    def read_data(self) -> Iterable[Voc]:
+    @traced("JsonDB.read_data")
+    def read_data(self) -> list[Voc]:
         self.file.seek(0)
         return json.load(self.file, object_hook=lambda kwargs: Voc(**kwargs))
     
     # Truncates the file and writes given vocs
+    @traced("JsonDB.clear_and_write_data")
     def clear_and_write_data(self, data: Iterable[Voc]) -> None:
         self.file.truncate(0)
-        json.dump([d.__dict__ for d in data], self.file, indent=4)
+        _dump_vocs(data, self.file, self.compact)
+        self.file.flush()
+        
+    def reopen(self) -> None:
+        self.file.close()
+        self.file = open(self.path, 'a+', encoding="utf-8")
         
     def close(self):
         self.file.close()
         
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compressed JSON decks by extension: (magic bytes, opener), zstd is available only with zstandard installed
+CODECS = {
+    ".gz": (b"\x1f\x8b", gzip.open),
+    ".xz": (b"\xfd7zXZ\x00", lzma.open),
+}
+if zstandard:
+    CODECS[".zst"] = (b"\x28\xb5\x2f\xfd", zstandard.open)
+
+
+class CompressedJsonDB(DB):
+    """CompressedJsonDB is a compact JSON deck compressed with one of the `CODECS`, e.g. 'deck.kamidb.gz'.
+    The file isn't kept open: it is decompressed while being parsed, and replaced atomically when written."""
+    
+    def __init__(self, path, extension: str) -> None:
+        self.path = os.path.normpath(path)
+        self.open = CODECS[extension][1]
+        if not os.path.isfile(self.path):
+            self.clear_and_write_data([])
+        
+    @traced("CompressedJsonDB.read_data")
+    def read_data(self) -> list[Voc]:
+        try:
+            with self.open(self.path, "rt", encoding="utf-8") as file:
+                return json.load(file, object_hook=lambda kwargs: Voc(**kwargs))
+        except (OSError, EOFError, lzma.LZMAError) as e:
+            raise DBParseError(*e.args)
+    
+    @traced("CompressedJsonDB.clear_and_write_data")
+    def clear_and_write_data(self, data: Iterable[Voc]) -> None:
+        temp_path = self.path + ".tmp"
+        with self.open(temp_path, "wt", encoding="utf-8") as file:
+            _dump_vocs(data, file, compact=True)
+        os.replace(temp_path, self.path)
+        
+    def close(self) -> None:
+        pass
+
+
+class SqliteDB(DB):
+    """SqliteDB stores vocs in normalized SQLite tables, so that category selection,
+    single voc edits and word lookups run as indexed queries instead of full loads."""
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS voc (
+            id INTEGER PRIMARY KEY,
+            word TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meaning (
+            voc_id INTEGER NOT NULL REFERENCES voc(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            meaning TEXT NOT NULL,
+            PRIMARY KEY (voc_id, position)
+        );
+        CREATE TABLE IF NOT EXISTS category (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS voc_category (
+            voc_id INTEGER NOT NULL REFERENCES voc(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            category_id INTEGER NOT NULL REFERENCES category(id),
+            PRIMARY KEY (voc_id, position)
+        );
+        CREATE INDEX IF NOT EXISTS voc_word_index ON voc(word);
+        CREATE INDEX IF NOT EXISTS voc_category_index ON voc_category(category_id, voc_id);
+    """
+    
+    def __init__(self, path) -> None:
+        self.path = os.path.normpath(path)
+        self.__connect()
+        
+    def __connect(self) -> None:
+        # Ids of vocs by their positions, read on the first edit, so a voc at a position is found by its rowid
+        self.__voc_ids: list[int] = None
+        try:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA foreign_keys=ON")
+            self.connection.executescript(self.SCHEMA)
+            
+        except sqlite3.DatabaseError as e:
+            raise DBParseError(*e.args)
+            
+    def reopen(self) -> None:
+        self.connection.close()
+        self.__connect()
+        
+    def __vocs(self, voc_ids_query: str, parameters: Iterable = ()) -> list[Voc]:
+        """Builds vocs with ids returned by given query, in order of their ids."""
+        cursor = self.connection.cursor()
+        words = dict(cursor.execute(f"SELECT id, word FROM voc WHERE id IN ({voc_ids_query}) ORDER BY id", tuple(parameters)))
+        
+        meanings, categories = {voc_id: [] for voc_id in words}, {voc_id: [] for voc_id in words}
+        for voc_id, meaning in cursor.execute(
+                f"SELECT voc_id, meaning FROM meaning WHERE voc_id IN ({voc_ids_query}) ORDER BY voc_id, position", tuple(parameters)):
+            meanings[voc_id].append(meaning)
+        for voc_id, category in cursor.execute(
+                f"""SELECT voc_id, name FROM voc_category JOIN category ON category.id = category_id
+                    WHERE voc_id IN ({voc_ids_query}) ORDER BY voc_id, position""", tuple(parameters)):
+            categories[voc_id].append(category)
+            
+        return [Voc(word, meanings[voc_id], categories[voc_id]) for voc_id, word in words.items()]
+    
+    def __insert(self, voc: Voc, voc_id: int = None) -> None:
+        cursor = self.connection.cursor()
+        cursor.execute("INSERT INTO voc (id, word) VALUES (?, ?)", (voc_id, voc.word))
+        voc_id = cursor.lastrowid
+        
+        cursor.executemany("INSERT INTO meaning (voc_id, position, meaning) VALUES (?, ?, ?)",
+                           [(voc_id, i, meaning) for i, meaning in enumerate(voc.meaning)])
+        cursor.executemany("INSERT OR IGNORE INTO category (name) VALUES (?)", [(c,) for c in voc.categories])
+        cursor.executemany("""INSERT INTO voc_category (voc_id, position, category_id)
+                              SELECT ?, ?, id FROM category WHERE name = ?""",
+                           [(voc_id, i, category) for i, category in enumerate(voc.categories)])
+    
+    @traced("SqliteDB.read_data")
+    def read_data(self) -> list[Voc]:
+        return self.__vocs("SELECT id FROM voc")
+    
+    @traced("SqliteDB.clear_and_write_data")
+    def clear_and_write_data(self, data: Iterable[Voc]) -> None:
+        self.__voc_ids = None
+        with self.connection:
+            self.connection.execute("DELETE FROM voc")
+            self.connection.execute("DELETE FROM category")
+            for voc in data:
+                self.__insert(voc)
+                
+    def categories(self) -> Set[str]:
+        return {name for name, in self.connection.execute(
+            "SELECT name FROM category WHERE EXISTS (SELECT 1 FROM voc_category WHERE category_id = category.id)")}
+    
+    def has_uncategorised(self) -> bool:
+        return self.connection.execute(
+            "SELECT EXISTS (SELECT 1 FROM voc WHERE id NOT IN (SELECT voc_id FROM voc_category))").fetchone()[0] == 1
+    
+    def read_by_categories(self, categories: Iterable[str], include_uncategorised: bool = False) -> list[Voc]:
+        categories = list(categories)
+        query = f"""SELECT voc_id FROM voc_category JOIN category ON category.id = category_id
+                    WHERE name IN ({", ".join("?" * len(categories))})"""
+        if include_uncategorised:
+            query += " UNION SELECT id FROM voc WHERE id NOT IN (SELECT voc_id FROM voc_category)"
+        return self.__vocs(query, categories)
+    
+    def __voc_id(self, position: int) -> int:
+        if self.__voc_ids is None:
+            self.__voc_ids = [voc_id for voc_id, in self.connection.execute("SELECT id FROM voc ORDER BY id")]
+        return self.__voc_ids[position]
+            
+    def update_voc(self, position: int, voc: Voc) -> None:
+        self.update_vocs({position: voc})
+            
+    def update_vocs(self, vocs_by_position: dict[int, Voc]) -> None:
+        # A replaced voc keeps its id, so the ids of positions don't change
+        with self.connection:
+            for position, voc in vocs_by_position.items():
+                voc_id = self.__voc_id(position)
+                self.connection.execute("DELETE FROM voc WHERE id = ?", (voc_id,))
+                self.__insert(voc, voc_id)
+            
+    def find(self, word: str) -> list[Voc]:
+        return self.__vocs("SELECT id FROM voc WHERE word = ?", (word,))
+        
+    def close(self):
+        self.connection.close()
+        
+
+SQLITE_EXTENSIONS = (".kamisql", ".sqlite", ".sqlite3")
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+def is_sqlite_file(path: str) -> bool:
+    """Checks the header of an existing file, or the extension of a new one."""
+    if os.path.isfile(path) and os.path.getsize(path) > 0:
+        with open(path, "rb") as file:
+            return file.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    return path.lower().endswith(SQLITE_EXTENSIONS)
+
+def compression_of(path: str) -> str:
+    """Returns the extension of the codec an existing file is compressed with, or the codec matching
+    the extension of a new one, or None."""
+    if os.path.isfile(path) and os.path.getsize(path) > 0:
+        with open(path, "rb") as file:
+            header = file.read(8)
+        return next((extension for extension, (magic, _) in CODECS.items() if header.startswith(magic)), None)
+    return next((extension for extension in CODECS if path.lower().endswith(extension)), None)
+
+def open_db(path: str, compact: bool = False) -> DB:
+    """Opens a DB with the implementation matching the file.
+    `compact` makes plain JSON DBs written without indentation, compressed ones are always compact."""
+    if is_sqlite_file(path):
+        return SqliteDB(path)
+    if extension := compression_of(path):
+        return CompressedJsonDB(path, extension)
+    return JsonDB(path, compact)
+
+# Delimiters of meanings and categories in TSV files and DB manager cells, the first one is used when writing
+LIST_DELIMITERS = [",", ";"]
+
+def read_tsv(path: str) -> list[Voc]:
+    """Reads vocs from a TSV file with word, meanings and categories columns."""
+    with open(path, "rt", encoding="utf8", newline="") as file:
+        return [Voc(word,
+                    [s for s in multi_split(meanings, LIST_DELIMITERS) if s.strip()],
+                    [s for s in multi_split(categories, LIST_DELIMITERS) if s.strip()])
+                for word, meanings, categories in csv.reader(file, delimiter="\t")]
+
+def write_tsv(path: str, vocs: Iterable[Voc]) -> None:
+    with open(path, "wt", encoding="utf8", newline="") as file:
+        writer = csv.writer(file, delimiter="\t", lineterminator="\n")
+        writer.writerows([voc.word, LIST_DELIMITERS[0].join(voc.meaning), LIST_DELIMITERS[0].join(voc.categories)]
+                         for voc in vocs)
+
+def is_tsv_file(path: str) -> bool:
+    return path.lower().endswith((".tsv", ".csv"))
+
+def read_deck(path: str) -> list[Voc]:
+    """Reads all vocs from a DB file or a TSV file."""
+    if not os.path.isfile(path):
+        # Opening a DB creates its file, which reading shouldn't do
+        raise FileNotFoundError(f"No such file: '{path}'")
+    if is_tsv_file(path):
+        return read_tsv(path)
+
+    db = open_db(path)
+    try:
+        return db.read_data()
+    finally:
+        db.close()
+
+def write_deck(path: str, vocs: Iterable[Voc], compact: bool = False) -> None:
+    """Overwrites a DB file or a TSV file with given vocs."""
+    if is_tsv_file(path):
+        write_tsv(path, vocs)
+        return
+
+    db = open_db(path, compact)
+    try:
+        db.clear_and_write_data(vocs)
+    finally:
+        db.close()
+
+def load_db(path: str) -> tuple[DB, list[Voc]]:
+    """Opens a DB and reads its data, without attaching it. Safe to call from any thread."""
+    db = open_db(path)
+    try:
+        return db, db.read_data()
+    except Exception as e:
+        db.close()
+        raise DBParseError(*e.args)
+
+def migrate_db(source_path: str, destination_path: str) -> None:
+    """Copies all vocs between DB or TSV files of any format, e.g. from a JSON .kamidb to a SQLite file.
+    The destination is overwritten, order of vocs, meanings and categories is preserved."""
+    write_deck(destination_path, read_deck(source_path))
+    
+
+@dataclass
+class DBDiff:
+    """Difference between two versions of DB data, vocs are matched by their words."""
+    added: list[Voc] = field(default_factory=list)
+    removed: list[Voc] = field(default_factory=list)
+    changed: list[tuple[Voc, Voc]] = field(default_factory=list)  # (old, new) pairs
+    
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+    
+    @classmethod
+    def between(cls, old: Iterable[Voc], new: Iterable[Voc]) -> "DBDiff":
+        def keyed(vocs: Iterable[Voc]) -> dict[tuple[str, int], Voc]:
+            # Repeated words are told apart by their occurrence number
+            occurrences = defaultdict(int)
+            result = {}
+            for voc in vocs:
+                result[(voc.word, occurrences[voc.word])] = voc
+                occurrences[voc.word] += 1
+            return result
+        
+        old, new = keyed(old), keyed(new)
+        diff = cls()
+        diff.added = [voc for key, voc in new.items() if key not in old]
+        diff.removed = [voc for key, voc in old.items() if key not in new]
+        diff.changed = [(old[key], voc) for key, voc in new.items()
+                        if key in old and (old[key].meaning, old[key].categories) != (voc.meaning, voc.categories)]
+        return diff
+    
+
+@dataclass(frozen=True)
+class DecksSnapshot:
+    """Immutable state of attached DBs at one point in time. Every change of the attached DBs or their data
+    publishes a new snapshot instead of modifying the current one, so a snapshot can be read from any thread
+    without locks. Vocs in a snapshot are shared between snapshots and must not be modified."""
+    version: int
+    dbs: tuple[DB, ...]
+    vocs: Mapping[DB, tuple[Voc, ...]]
+    
+    def vocs_by_path(self) -> dict[str, tuple[Voc, ...]]:
+        """Returns vocs keyed by paths of DBs, which unlike DBs can be sent to worker processes."""
+        return {db.path: self.vocs[db] for db in self.dbs}
+
+
 class Kamishirasawa:
-    """A main runtime object handling DB operations"""
+    """A main runtime object handling DB operations
+    
+    State of attached DBs is published as immutable `DecksSnapshot`s (read-copy-update). Readers take
+    `snapshot` once and use it, writers build a new snapshot under a lock and swap it in atomically.
+    The search index is updated incrementally in place rather than copied for every snapshot, so it's
+    private and searches take the write lock too, which keeps them consistent with the published snapshot."""
     def __init__(self) -> None:
-        self.dbs: Set[DB] = set()
+        self.__snapshot = DecksSnapshot(0, (), MappingProxyType({}))
+        self.__write_lock = threading.Lock()
         
         self.on_dbs_changed = Event()
+        # Fired with (db, DBDiff) when data of an attached DB was changed outside of the app
+        self.on_db_data_changed = Event()
+        # Fired with the version of every newly published snapshot
+        self.on_snapshot_published = Event()
         
         self.dbs_lock = ObservableFlag(False)
         
+        # Mutated in place by writers, so unlike the snapshot it's only ever used under the write lock
+        self.__search_index = SearchIndex()
+        # Category indexes of DBs with the vocs they were built from, rebuilt on first use after the vocs changed
+        self.__category_indexes: dict[DB, tuple[tuple[Voc, ...], CategoryIndex]] = {}
+        
+    @property
+    def snapshot(self) -> DecksSnapshot:
+        return self.__snapshot
+        
+    @property
+    def dbs(self) -> tuple[DB, ...]:
+        return self.__snapshot.dbs
+        
+    def __publish(self, dbs: tuple[DB, ...], vocs: dict[DB, tuple[Voc, ...]]) -> int:
+        """Swaps in a new snapshot, must be called holding the write lock. Returns its version."""
+        snapshot = DecksSnapshot(self.__snapshot.version + 1, dbs, MappingProxyType(vocs))
+        self.__snapshot = snapshot
+        return snapshot.version
+    
+    def __with_vocs(self, db: DB, vocs: Iterable[Voc]) -> int:
+        return self.__publish(self.dbs, {**self.__snapshot.vocs, db: tuple(vocs)})
+        
     def attach_db(self, path) -> None:
         if os.path.normpath(path) in {db.path for db in self.dbs}:
             raise DBAlreadyAttachedError("DB is already attached.")
+        self.attach_loaded_db(*load_db(path))
         
-        db = DB(path)
-        try:
-            db.read_data()
+    def attach_loaded_db(self, db: DB, vocs: list[Voc], search_terms: list[tuple[str, ...]] = None) -> None:
+        """Attaches a DB opened and read by `load_db`, e.g. in another thread, along with search terms
+        of its vocs (by `search.voc_terms`) if they were computed there too. The DB is closed if it can't be attached."""
+        with self.__write_lock:
+            if db.path in {d.path for d in self.dbs}:
+                db.close()
+                raise DBAlreadyAttachedError("DB is already attached.")
             
-            self.dbs.add(db)
-            self.on_dbs_changed()
-        except Exception as e:
-            db.close()
-            raise DBParseError(*e.args)
+            self.__search_index.add(db, vocs, search_terms)
+            version = self.__publish(self.dbs + (db,), {**self.__snapshot.vocs, db: tuple(vocs)})
+            
+        self.on_snapshot_published(version)
+        self.on_dbs_changed()
 
     def create_db(self, path: str):
-        try:
-            db = DB(path)
-            db.clear_and_write_data([])
-            self.dbs.add(db)
-            self.on_dbs_changed()
-        except Exception as e:
-            db.close()
-            raise DBFileError(*e.args)
+        with self.__write_lock:
+            try:
+                db = open_db(path)
+                db.clear_and_write_data([])
+                self.__search_index.add(db, [])
+                version = self.__publish(self.dbs + (db,), {**self.__snapshot.vocs, db: ()})
+            except Exception as e:
+                db.close()
+                raise DBFileError(*e.args)
+            
+        self.on_snapshot_published(version)
+        self.on_dbs_changed()
+
+    def save_db(self, db: DB, vocs: list[Voc]) -> None:
+        """Overwrites the data of an attached DB, keeping the search index up to date."""
+        with self.__write_lock:
+            db.clear_and_write_data(vocs)
+            self.__search_index.update(db, vocs)
+            version = self.__with_vocs(db, vocs)
+        self.on_snapshot_published(version)
+        
+    def update_vocs(self, db: DB, vocs_by_position: dict[int, Voc]) -> None:
+        """Replaces vocs at given positions of an attached DB, writing only them if the DB supports it."""
+        with self.__write_lock:
+            db.update_vocs(vocs_by_position)
+            vocs = list(self.__snapshot.vocs[db])
+            for position, voc in vocs_by_position.items():
+                vocs[position] = voc
+            self.__search_index.update(db, vocs)
+            version = self.__with_vocs(db, vocs)
+        self.on_snapshot_published(version)
+        
+    def vocs_of(self, db: DB) -> tuple[Voc, ...]:
+        """Returns cached data of an attached DB."""
+        return self.__snapshot.vocs[db]
+        
+    def db_of_path(self, path: str) -> DB:
+        path = os.path.normpath(path)
+        return next((db for db in self.dbs if db.path == path), None)
+    
+    def reload_db(self, db: DB) -> DBDiff:
+        """Rereads a DB changed on disk and applies only the vocs that were added, removed or changed
+        to the caches and indexes. Fires `on_db_data_changed` if anything changed."""
+        with self.__write_lock:
+            db.reopen()
+            vocs = db.read_data()
+            diff = DBDiff.between(self.__snapshot.vocs[db], vocs)
+            
+            if diff:
+                self.__search_index.update(db, vocs)
+                version = self.__with_vocs(db, vocs)
+                
+        if diff:
+            self.on_snapshot_published(version)
+            self.on_db_data_changed(db, diff)
+        return diff
+
+    def build_audio_packs(self, dbs: Iterable[DB] = None, **options) -> dict[DB, "audiopack.PackResult"]:
+        """Builds audio packs next to attached DBs (all of them by default) from their cached data.
+        Options are passed to `audiopack.build_pack`."""
+        snapshot = self.snapshot
+        return {db: audiopack.build_pack(snapshot.vocs[db], audiopack.archive_path(db.path), **options)
+                for db in (snapshot.dbs if dbs is None else dbs)}
+
+    def search(self, query: str, limit: int = 50, dbs: Iterable[DB] = None):
+        """Returns vocs from attached DBs matching the query, ranked by relevance. Positions of the results
+        are positions in the vocs of the snapshot published when the search was made."""
+        with self.__write_lock:
+            return self.__search_index.search(query, limit, dbs)
+        
+    def matching_positions(self, db: DB, query: str) -> set[int]:
+        """Returns positions of all vocs of an attached DB matching the query, all of them for an empty one."""
+        with self.__write_lock:
+            return self.__search_index.matching_positions(db, query)
+
+    def __category_index(self, snapshot: DecksSnapshot, db: DB) -> CategoryIndex:
+        vocs = snapshot.vocs[db]
+        cached = self.__category_indexes.get(db)
+        if cached is None or cached[0] is not vocs:
+            cached = self.__category_indexes[db] = (vocs, CategoryIndex(vocs))
+        return cached[1]
+
+    def query_vocs(self, query: Union[str, CategoryQuery], dbs: Iterable[DB] = None) -> list[Voc]:
+        """Returns vocs of attached DBs (all of them by default) whose categories match a boolean query,
+        like '1ST GRADE & !NUMBERS | FAMILY'. Raises QueryError if the query is malformed
+        or uses a category none of the DBs has."""
+        if isinstance(query, str):
+            query = CategoryQuery(query)
+        snapshot = self.snapshot
+        dbs = snapshot.dbs if dbs is None else tuple(dbs)
+        indexes = [self.__category_index(snapshot, db) for db in dbs]
+        if unknown := query.categories.difference(*(index.bits for index in indexes)):
+            raise QueryError(f"Unknown {'category' if len(unknown) == 1 else 'categories'} {', '.join(sorted(unknown))}.")
+        vocs = []
+        for db, index in zip(dbs, indexes):
+            db_vocs = snapshot.vocs[db]
+            vocs += [db_vocs[position] for position in positions(index.evaluate(query))]
+        return vocs
 
     def detach_db(self, db: DB) -> None:
-        db.close()
-        self.dbs.remove(db)
+        with self.__write_lock:
+            db.close()
+            self.__search_index.remove(db)
+            self.__category_indexes.pop(db, None)
+            version = self.__publish(tuple(d for d in self.dbs if d is not db),
+                                     {d: vocs for d, vocs in self.__snapshot.vocs.items() if d is not db})
+        self.on_snapshot_published(version)
         self.on_dbs_changed()
         
     def close_all_dbs(self) -> None:
-        for db in self.dbs:
-            db.close()
-        self.dbs.clear()
+        with self.__write_lock:
+            for db in self.dbs:
+                db.close()
+                self.__search_index.remove(db)
+            self.__category_indexes.clear()
+            version = self.__publish((), {})
+        self.on_snapshot_published(version)
         self.on_dbs_changed()
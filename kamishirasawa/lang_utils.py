@@ -1,11 +1,24 @@
+import functools
+import itertools
 import random
+import re
+import threading
 from collections import defaultdict
-from typing import Dict, Iterable, Tuple
+from typing import Dict, Iterable, Optional, Tuple
 
 import pykakasi
-import romkan
 
-convert = pykakasi.Kakasi().convert
+import transliterate
+from tracing import traced
+
+_kakasi = pykakasi.Kakasi()
+# The converter is shared by the GUI thread and background workers building indexes, and isn't thread-safe
+_kakasi_lock = threading.Lock()
+
+@traced("lang_utils.convert")
+def convert(text: str) -> list[Dict[str, str]]:
+    with _kakasi_lock:
+        return _kakasi.convert(text)
 
 def convert_concat(text: str) -> Dict[str, str]:
     concatenated = defaultdict(lambda: "")
@@ -16,7 +29,10 @@ def convert_concat(text: str) -> Dict[str, str]:
     return concatenated
 
 def to_hiragana(text: str) -> str:
-    return romkan.to_hiragana(text)
+    return transliterate.romaji_to_hiragana(text)
+
+def to_hiragana_many(texts: Iterable[str]) -> list[str]:
+    return transliterate.romaji_to_hiragana_many(texts)
 
 def to_romaji(text: str) -> str:
     return " ".join([x["hepburn"] for x in convert(text)])
@@ -25,27 +41,46 @@ def contains_kanji(text: str):
     converted = convert_concat(text)
     return text not in {converted["hira"], converted["kana"]}
 
-def furigana(text: str) -> Iterable[Tuple[str, str]]:
-    """Returns an iterable of tuples (kanji sequence, hiragana spelling) or (kana/latin, None)"""
-    
-    tuples = []
+# Characters written with kanji readings: CJK ideographs, the iteration mark 々, 〆 and the counters ヵ and ヶ
+KANJI_RANGES = ((0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xF900, 0xFAFF), (0x20000, 0x3134F))
+KANJI_MARKS = set("々〆ヵヶ")
+
+def is_kanji(char: str) -> bool:
+    return char in KANJI_MARKS or any(low <= ord(char) <= high for low, high in KANJI_RANGES)
+
+def align_reading(text: str, reading: str) -> Tuple[Tuple[str, Optional[str]], ...]:
+    """Splits text into runs of kanji with their readings and runs of other characters, given the hiragana
+    reading of the whole text. Runs of kana (or latin) between the kanji are anchors, which have to appear
+    in the reading as they are, so okurigana is found at the end as well as in the middle, like in 取り扱い.
+    A reading which doesn't fit the anchors is given to the whole text."""
+    runs = [(kanji, "".join(chars)) for kanji, chars in itertools.groupby(text, is_kanji)]
+    if not any(kanji for kanji, _ in runs):
+        return ((text, None),)
     
+    # Kanji runs read as at least one character each, the shortest readings are tried first
+    pattern = "".join("(.+?)" if kanji else re.escape(transliterate.katakana_to_hiragana(run)) for kanji, run in runs)
+    if (match := re.fullmatch(pattern, reading)) is None:
+        return ((text, reading),)
+    readings = iter(match.groups())
+    return tuple((run, next(readings) if kanji else None) for kanji, run in runs)
+
+@functools.lru_cache(maxsize=8192)
+def furigana(text: str) -> Tuple[Tuple[str, Optional[str]], ...]:
+    """Returns a tuple of pairs (kanji sequence, hiragana spelling) or (kana/latin, None), covering the whole text.
+    Results are memoized, repeated words cost a dictionary lookup."""
+    segments = []
     for d in convert(text):
-        orig, hira, kata = d["orig"], d["hira"], d["kana"]
-        if orig in {hira, kata}:
-            tuples.append((orig, None))
-            
-        else:
-            i = -1            
-            for i, (orig_char, hira_char) in enumerate(zip(reversed(orig), reversed(hira))):
-                if orig_char != hira_char:
-                    break
-                
-            if i != -1:
-                tuples.append((orig[-i:], hira[-i:]))
-                tuples.append((hira[:-i], None))
+        if d["orig"]:
+            segments += align_reading(d["orig"], d["hira"])
     
-    return tuples
+    # Neighbouring runs without readings are joined, as they come from separate words of the converter
+    merged = []
+    for orig, hira in segments:
+        if merged and hira is None and merged[-1][1] is None:
+            merged[-1] = (merged[-1][0] + orig, None)
+        else:
+            merged.append((orig, hira))
+    return tuple(merged)
 
 class kaomoji:
     @staticmethod
@@ -0,0 +1,241 @@
+import bisect
+import heapq
+import itertools
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Set, Tuple
+
+import lang_utils
+
+
+def normalize(text: str) -> str:
+    return "".join(text.casefold().split())
+
+def ngrams(term: str) -> Set[str]:
+    """Returns all unigrams and bigrams of a normalized term."""
+    return set(term) | {term[i:i + 2] for i in range(len(term) - 1)}
+
+def voc_terms(voc) -> Tuple[str, ...]:
+    """Returns normalized searchable terms of a voc: word, meanings and readings."""
+    terms = [voc.word, *voc.meaning]
+
+    converted = lang_utils.convert_concat(voc.word)
+    terms += [converted["hira"], converted["kana"], converted["hepburn"]]
+
+    return tuple(dict.fromkeys(normalize(t) for t in terms if t))
+
+
+@dataclass
+class SearchResult:
+    owner: Any  # object the voc was indexed under, usually a DB
+    position: int  # position of the voc in the owner's data
+    voc: Any
+
+
+class SearchIndex:
+    """An inverted n-gram index over words, meanings and readings of vocs.
+
+    Vocs are indexed per owner (a DB) and the index can be updated incrementally,
+    so only changed vocs have their readings recomputed.
+
+    Short queries match a large part of the vocs, so when there are more than `RANK_LIMIT` candidates,
+    `search` doesn't rank all of them but walks distinct terms by length, from a sorted list per length,
+    and stops as soon as the best `limit` vocs are known."""
+
+    RANK_LIMIT = 2000
+
+    def __init__(self) -> None:
+        self.__postings: Dict[str, Set[int]] = defaultdict(set)
+        self.__docs: Dict[int, SearchResult] = {}
+        self.__terms: Dict[int, Tuple[str, ...]] = {}
+        self.__owned: Dict[Any, Dict[int, int]] = {}  # doc ids of an owner and their positions
+        self.__next_id = 0
+
+        # Distinct terms and their docs, sorted per term length and also joined by newlines, so terms
+        # containing a query are found by a single scan of a string. Changed lengths are resorted in `__invalidate`
+        self.__term_docs: Dict[str, Set[int]] = defaultdict(set)
+        self.__by_length: Dict[int, List[str]] = defaultdict(list)
+        self.__joined: Dict[int, str] = {}
+        self.__unsorted: Set[int] = set()
+
+        # Candidates of the last query, reused when the user keeps typing
+        self.__last_query, self.__last_candidates = None, None
+
+    def __len__(self) -> int:
+        return len(self.__docs)
+
+    def __add_doc(self, owner: Any, position: int, voc: Any, terms: Tuple[str, ...] = None) -> int:
+        doc_id, self.__next_id = self.__next_id, self.__next_id + 1
+
+        terms = voc_terms(voc) if terms is None else terms
+        for gram in set().union(*map(ngrams, terms)):
+            self.__postings[gram].add(doc_id)
+        for term in terms:
+            if not self.__term_docs[term]:
+                self.__by_length[len(term)].append(term)
+                self.__unsorted.add(len(term))
+            self.__term_docs[term].add(doc_id)
+
+        self.__docs[doc_id] = SearchResult(owner, position, voc)
+        self.__terms[doc_id] = terms
+        return doc_id
+
+    def __remove_doc(self, doc_id: int) -> None:
+        terms = self.__terms.pop(doc_id)
+        for gram in set().union(*map(ngrams, terms)):
+            postings = self.__postings[gram]
+            postings.discard(doc_id)
+            if not postings:
+                del self.__postings[gram]
+        for term in terms:
+            docs = self.__term_docs[term]
+            docs.discard(doc_id)
+            if not docs:
+                del self.__term_docs[term]
+                self.__unsorted.add(len(term))
+        del self.__docs[doc_id]
+
+    def __invalidate(self) -> None:
+        self.__last_query, self.__last_candidates = None, None
+
+        for length in self.__unsorted:
+            terms = sorted(term for term in self.__by_length[length] if term in self.__term_docs)
+            if terms:
+                self.__by_length[length], self.__joined[length] = terms, "\n".join(terms)
+            else:
+                del self.__by_length[length], self.__joined[length]
+        self.__unsorted.clear()
+
+    def add(self, owner: Any, vocs: Iterable[Any], terms: Iterable[Tuple[str, ...]] = None) -> None:
+        """Indexes vocs of a new owner. Computing their terms converts every word to its readings, which is
+        the slow part, so `terms` (by `voc_terms`) can be given if they were computed beforehand in another thread."""
+        assert owner not in self.__owned
+
+        terms = itertools.repeat(None) if terms is None else terms
+        self.__owned[owner] = {self.__add_doc(owner, position, voc, doc_terms): position
+                               for position, (voc, doc_terms) in enumerate(zip(vocs, terms))}
+        self.__invalidate()
+
+    def remove(self, owner: Any) -> None:
+        """Removes all vocs of given owner from the index."""
+        for doc_id in self.__owned.pop(owner, {}):
+            self.__remove_doc(doc_id)
+        self.__invalidate()
+
+    def update(self, owner: Any, vocs: Iterable[Any]) -> None:
+        """Replaces vocs of an owner, reindexing only the vocs that were added or changed."""
+        if owner not in self.__owned:
+            self.add(owner, vocs)
+            return
+
+        # Match unchanged vocs by content, so their terms don't have to be recomputed
+        unchanged = defaultdict(list)
+        for doc_id in self.__owned[owner]:
+            voc = self.__docs[doc_id].voc
+            unchanged[(voc.word, tuple(voc.meaning), tuple(voc.categories))].append(doc_id)
+
+        doc_ids = {}
+        for position, voc in enumerate(vocs):
+            if same := unchanged.get((voc.word, tuple(voc.meaning), tuple(voc.categories))):
+                doc_id = same.pop()
+                self.__docs[doc_id] = SearchResult(owner, position, voc)
+            else:
+                doc_id = self.__add_doc(owner, position, voc)
+            doc_ids[doc_id] = position
+
+        for doc_id in itertools.chain.from_iterable(unchanged.values()):
+            self.__remove_doc(doc_id)
+
+        self.__owned[owner] = doc_ids
+        self.__invalidate()
+
+    def __candidates(self, query: str) -> Set[int]:
+        """Returns ids of docs matching the query. The returned set must not be modified."""
+        grams = {query} if len(query) == 1 else {query[i:i + 2] for i in range(len(query) - 1)}
+        postings = sorted((self.__postings.get(gram, set()) for gram in grams), key=len)
+
+        # Typing usually extends the previous query, so its candidates can be narrowed down
+        if self.__last_query and query.startswith(self.__last_query):
+            postings.insert(0, self.__last_candidates)
+
+        if len(postings) == 1:
+            candidates = postings[0]
+        else:
+            candidates = postings[0].intersection(*postings[1:])
+
+        # Postings of a one or two characters long query are exact, longer ones only have all their bigrams
+        if len(query) > 2:
+            candidates = {doc_id for doc_id in candidates if any(query in term for term in self.__terms[doc_id])}
+
+        self.__last_query, self.__last_candidates = query, candidates
+        return candidates
+
+    def __search_terms(self, query: str, limit: int, owners: Set[Any] = None) -> List[int]:
+        """Finds the best `limit` docs by walking terms by length, first terms with the query as prefix, then terms
+        containing it elsewhere. Docs found in one length rank before docs of any greater length."""
+        found: Dict[int, tuple] = {}
+        lengths = sorted(length for length in self.__by_length if length >= len(query))
+
+        def collect(terms: Iterable[str], kind: int, length: int) -> None:
+            for term in terms:
+                for doc_id in self.__term_docs[term]:
+                    if doc_id not in found:
+                        doc = self.__docs[doc_id]
+                        if owners is None or doc.owner in owners:
+                            found[doc_id] = ((kind, length), doc.position, doc_id)
+
+        def containing(length: int) -> Iterator[str]:
+            # All terms in the joined string have the same length, so a match tells the term it is in
+            terms, joined, stride = self.__by_length[length], self.__joined[length], length + 1
+            index = joined.find(query)
+            while index != -1:
+                term = terms[index // stride]
+                if not term.startswith(query):
+                    yield term
+                index = joined.find(query, (index // stride + 1) * stride)
+
+        for length in lengths:
+            terms = self.__by_length[length]
+            start = end = bisect.bisect_left(terms, query)
+            while end < len(terms) and terms[end].startswith(query):
+                end += 1
+            collect(terms[start:end], 0 if length == len(query) else 1, length)
+            if len(found) >= limit:
+                break
+        else:
+            for length in lengths:
+                collect(containing(length), 2, length)
+                if len(found) >= limit:
+                    break
+
+        return heapq.nsmallest(limit, found, key=found.get)
+
+    def search(self, query: str, limit: int = 50, owners: Iterable[Any] = None) -> List[SearchResult]:
+        """Returns at most `limit` vocs matching the query, ranked by exact, prefix and substring matches."""
+        query = normalize(query)
+        if not query or limit <= 0:
+            return []
+
+        owners = None if owners is None else set(owners)
+        candidates = self.__candidates(query)
+        if len(candidates) > self.RANK_LIMIT:
+            return [self.__docs[doc_id] for doc_id in self.__search_terms(query, limit, owners)]
+
+        if owners is not None:
+            candidates = {doc_id for doc_id in candidates if self.__docs[doc_id].owner in owners}
+
+        def rank(doc_id: int):
+            terms = self.__terms[doc_id]
+            best = min((0 if term == query else 1 if term.startswith(query) else 2, len(term))
+                       for term in terms if query in term)
+            return best, self.__docs[doc_id].position, doc_id
+
+        return [self.__docs[doc_id] for doc_id in heapq.nsmallest(limit, candidates, key=rank)]
+
+    def matching_positions(self, owner: Any, query: str) -> Set[int]:
+        """Returns positions of all vocs of given owner matching the query, used for filtering views."""
+        owned = self.__owned.get(owner, {})
+        query = normalize(query)
+        if not query:
+            return set(owned.values())
+        return set(map(owned.__getitem__, owned.keys() & self.__candidates(query)))
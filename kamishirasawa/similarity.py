@@ -0,0 +1,91 @@
+"""Approximate similarity search over flashcards with MinHash and locality-sensitive hashing.
+
+Every flashcard is described by a set of features (shingles): for vocs, characters of
+the word, characters and bigrams of its reading and words of its meanings. A MinHash
+signature of `BANDS * ROWS` values estimates the Jaccard similarity of two feature
+sets by the fraction of equal values. Signatures are split into bands, and flashcards sharing a
+whole band land in the same bucket. Similar flashcards are looked up only among those
+sharing a bucket with the query, ranked by the number of shared bands, so a query
+doesn't score every flashcard.
+"""
+
+import hashlib
+import random
+from collections import defaultdict
+from typing import Any, Callable, Hashable, Iterable
+
+import lang_utils
+from kamishirasawa import Voc
+
+# Vocs have only a few features, so even related ones have a low Jaccard similarity (around 0.2),
+# which single-row bands still find; with 2 rows per band most of them were missed
+BANDS = 32
+ROWS = 1
+# Buckets this big are shared by features nearly every flashcard has, they say nothing about similarity
+MAX_BUCKET_SIZE = 256
+
+
+def stable_hash(feature: Hashable) -> int:
+    """Returns a 64-bit hash of a feature which, unlike `hash` of strings, is the same in every process,
+    so an index built with the same seed has the same signatures and buckets in every run."""
+    return int.from_bytes(hashlib.blake2b(str(feature).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def voc_features(voc: Voc) -> set[str]:
+    reading = lang_utils.convert_concat(voc.word)["hira"]
+    features = {"w" + char for char in voc.word}
+    features |= {"r" + char for char in reading}
+    features |= {"r" + reading[i:i + 2] for i in range(len(reading) - 1)}
+    features |= {"m" + token for meaning in voc.meaning for token in meaning.casefold().split()}
+    return features
+
+
+class SimilarityIndex:
+    def __init__(self, flashcards: Iterable[Any], features: Callable[[Any], set[Hashable]] = voc_features,
+                 seed: int = None) -> None:
+        self.features = features
+        rng = random.Random(seed)
+        # Hashes are permuted by XOR with random masks, which is much cheaper than a universal hash family
+        self.masks = [rng.getrandbits(64) for _ in range(BANDS * ROWS)]
+
+        self.flashcards: list[Any] = []
+        self.signatures: dict[int, tuple[int, ...]] = {}  # by id() of the flashcard
+        self.buckets: dict[tuple[int, tuple[int, ...]], list[int]] = defaultdict(list)
+        for flashcard in flashcards:
+            self.add(flashcard)
+
+    def __len__(self) -> int:
+        return len(self.flashcards)
+
+    def signature(self, flashcard: Any) -> tuple[int, ...]:
+        if (signature := self.signatures.get(id(flashcard))) is not None:
+            return signature
+        hashes = [stable_hash(feature) for feature in self.features(flashcard)] or [0]
+        return tuple(min(h ^ mask for h in hashes) for mask in self.masks)
+
+    def __bands(self, signature: tuple[int, ...]) -> Iterable[tuple[int, tuple[int, ...]]]:
+        return ((band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS))
+
+    def add(self, flashcard: Any) -> None:
+        if id(flashcard) in self.signatures:
+            return
+        signature = self.signature(flashcard)
+        self.signatures[id(flashcard)] = signature
+        for key in self.__bands(signature):
+            self.buckets[key].append(len(self.flashcards))
+        self.flashcards.append(flashcard)
+
+    def similar(self, flashcard: Any, limit: int = 32) -> list[Any]:
+        """Returns up to `limit` flashcards most similar to the given one, most similar first,
+        not including the flashcard itself. Flashcards sharing no band with it are never returned."""
+        shared_bands = defaultdict(int)
+        for key in self.__bands(self.signature(flashcard)):
+            if len(bucket := self.buckets.get(key, ())) <= MAX_BUCKET_SIZE:
+                for i in bucket:
+                    shared_bands[i] += 1
+
+        candidates = [i for i in shared_bands if self.flashcards[i] is not flashcard]
+        # Equally similar flashcards are returned in random order, so distractors vary between questions
+        random.shuffle(candidates)
+        candidates.sort(key=shared_bands.__getitem__, reverse=True)
+        return [self.flashcards[i] for i in candidates[:limit]]
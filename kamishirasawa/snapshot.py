@@ -0,0 +1,232 @@
+"""Compact binary snapshots of flashcard game sessions.
+
+A snapshot file consists of:
+    header      magic, format version, game and widget type names, game settings,
+                and window, card limit and seed of lazy games
+    voc table   all vocs of the game (of its whole pool if it's lazy), packed once
+    state       active and passed piles as voc ids (indices into the voc table),
+                passes done per active voc and the number of vocs drawn by a lazy game
+    journal     one byte per answer given after the state was written
+
+Recording an answer appends a single byte to the journal. Every `compact_every`
+answers the state is rewritten (atomically, by replacing the file) and the journal
+is emptied. Resuming replays the journal on top of the state, which is cheap, as
+marking answers is deterministic. A lazy game draws vocs from its pool in the order
+given by its seed, so a resumed one goes on with the vocs it hadn't drawn yet, and
+vocs of the table are decoded only once they are drawn.
+"""
+
+import os
+import struct
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from games import GAME_TYPES, FlashcardGame
+from kamishirasawa import Voc
+
+MAGIC = b"KSNP"
+VERSION = 3
+
+SESSION_DIR = os.path.join(os.path.expanduser("~"), ".kamishirasawa")
+SESSION_PATH = os.path.join(SESSION_DIR, "session.ksnp")
+
+CORRECT, INCORRECT = b"\x01", b"\x00"
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _pack_str(s: str) -> bytes:
+    encoded = s.encode("utf-8")
+    return struct.pack("<I", len(encoded)) + encoded
+
+# The voc table is a single UTF-8 string split by ASCII separator control characters,
+# so it can be decoded with a few str.split calls instead of parsing every field
+RECORD_SEPARATOR, FIELD_SEPARATOR, ITEM_SEPARATOR = "\x1e", "\x1f", "\x1d"
+
+def _pack_vocs(vocs: list[Voc]) -> bytes:
+    return _pack_str(RECORD_SEPARATOR.join(
+        FIELD_SEPARATOR.join([voc.word, ITEM_SEPARATOR.join(voc.meaning), ITEM_SEPARATOR.join(voc.categories)])
+        for voc in vocs))
+
+class _VocTable(Sequence):
+    """Vocs of a packed voc table, each decoded when it's first accessed.
+    The same index always gives the same voc, even if it's accessed from several threads."""
+
+    def __init__(self, table: str) -> None:
+        self.table = table
+        self.records = table.split(RECORD_SEPARATOR) if table else []
+        self.vocs: dict[int, Voc] = {}
+        self.indices: dict[int, int] = {}  # indices of decoded vocs by their ids
+        # Every record has three fields, checked up front, as records are decoded only later
+        if table.count(FIELD_SEPARATOR) != 2 * len(self.records):
+            raise ValueError("Malformed voc table.")
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, index: int) -> Voc:
+        index = range(len(self.records))[index]
+        if (voc := self.vocs.get(index)) is None:
+            word, meaning, categories = self.records[index].split(FIELD_SEPARATOR)
+            voc = self.vocs.setdefault(index, Voc(word, meaning.split(ITEM_SEPARATOR) if meaning else [],
+                                                  categories.split(ITEM_SEPARATOR) if categories else []))
+            self.indices[id(voc)] = index
+        return voc
+
+def _pack_ids(ids: list[int]) -> bytes:
+    return struct.pack(f"<I{len(ids)}I", len(ids), *ids)
+
+
+class _Reader:
+    def __init__(self, data: bytes) -> None:
+        self.data, self.offset = data, 0
+
+    def unpack(self, fmt: str) -> tuple:
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def str(self) -> str:
+        length, = self.unpack("<I")
+        self.offset += length
+        return self.data[self.offset - length:self.offset].decode("utf-8")
+
+    def ids(self) -> list[int]:
+        count, = self.unpack("<I")
+        return list(self.unpack(f"<{count}I"))
+
+
+@dataclass
+class Session:
+    game: FlashcardGame
+    widget_type: str  # name of the game widget class
+    choices: int  # choice count of choice widgets, 0 for others
+
+
+class SessionRecorder:
+    """Writes snapshots of a game and records every answer given after the last one.
+
+    Nothing is written until the voc table is packed by `prepare` and the first snapshot is written
+    by `compact`, which includes answers given until then. Packing the pool of a big lazy game takes
+    a while, but `prepare` only reads the vocs captured when the recorder was created, so it can be
+    called in another thread while the game goes on."""
+
+    def __init__(self, path: str, game: FlashcardGame, widget_type: str, choices: int = 0,
+                 compact_every: int = 256) -> None:
+        self.path = path
+        self.game = game
+        self.compact_every = compact_every
+        self.file: BinaryIO = None
+        self.journal_length = 0
+
+        self.header = b"".join([
+            MAGIC, struct.pack("<B", VERSION),
+            _pack_str(type(game).__name__), _pack_str(widget_type),
+            struct.pack("<HHI", choices, game.passes_per_flashcard, game.total_count),
+            struct.pack("<III", game.window or 0, game.max_cards or 0, game.seed or 0),
+        ])
+        self.vocs = game.pool if game.window else game.active + game.passed
+        self.ids: dict[int, int] = None
+        self.prefix: bytes = None
+
+    @property
+    def prepared(self) -> bool:
+        return self.prefix is not None
+
+    def prepare(self) -> None:
+        """Packs the voc table, must be called before the first `compact`."""
+        if isinstance(self.vocs, _VocTable):
+            # A resumed lazy game keeps the table it was loaded from, and only vocs it decoded can be in its piles
+            self.ids = self.vocs.indices
+            self.prefix = self.header + _pack_str(self.vocs.table)
+        else:
+            self.ids = {id(voc): i for i, voc in enumerate(self.vocs)}
+            self.prefix = self.header + _pack_vocs(self.vocs)
+
+    def __state(self) -> bytes:
+        passes = [self.game.passes_done_dict.get(voc, 0) for voc in self.game.active]
+        return b"".join([
+            _pack_ids([self.ids[id(voc)] for voc in self.game.active]),
+            _pack_ids([self.ids[id(voc)] for voc in self.game.passed]),
+            struct.pack(f"<{len(passes)}HI", *passes, self.game.drawn_count),
+        ])
+
+    def compact(self) -> None:
+        """Rewrites the snapshot with the current state and an empty journal."""
+        assert self.prepared
+        if self.file:
+            self.file.close()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(self.prefix + self.__state())
+        os.replace(temp_path, self.path)
+
+        self.file = open(self.path, "ab", buffering=0)
+        self.journal_length = 0
+
+    def record(self, correct: bool) -> None:
+        """Records an answer, must be called after the game was marked with it.
+        Answers given before the first snapshot is written are left to it."""
+        if not self.file:
+            return
+        if self.journal_length >= self.compact_every:
+            self.compact()
+        else:
+            self.file.write(CORRECT if correct else INCORRECT)
+            self.journal_length += 1
+
+    def discard(self) -> None:
+        """Closes and removes the snapshot, e.g. when the game is finished."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self) -> None:
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+def load(path: str = SESSION_PATH) -> Session:
+    """Rebuilds the game saved in a snapshot, replaying its journal."""
+    try:
+        with open(path, "rb") as file:
+            reader = _Reader(file.read())
+
+        magic, version = reader.unpack("<4sB")
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError(f"Unsupported snapshot format {magic!r} version {version}.")
+
+        game_type, widget_type = reader.str(), reader.str()
+        choices, passes_per_flashcard, total_count = reader.unpack("<HHI")
+        window, max_cards, seed = reader.unpack("<III")
+
+        vocs = _VocTable(reader.str())
+        active = [vocs[i] for i in reader.ids()]
+        passed = [vocs[i] for i in reader.ids()]
+        *passes, drawn_count = reader.unpack(f"<{len(active)}HI")
+
+        # Passed vocs are done with all their passes
+        passes_done = {voc: p for voc, p in zip(active, passes) if p} | dict.fromkeys(passed, passes_per_flashcard)
+        game = GAME_TYPES[game_type].restore(active, passed, passes_done, passes_per_flashcard, total_count,
+                                             pool=vocs if window else None, window=window or None,
+                                             max_cards=max_cards or None, seed=seed, drawn_count=drawn_count)
+        
+        for entry in reader.data[reader.offset:]:
+            if not game.is_done:
+                game.mark_as_correct() if entry == CORRECT[0] else game.mark_as_incorrect()
+
+    except KeyError:
+        raise SnapshotError(f"Unknown game type '{game_type}'.")
+    except (OSError, struct.error, UnicodeDecodeError, IndexError, ValueError) as e:
+        raise SnapshotError(*e.args)
+
+    return Session(game, widget_type, choices)
+
+def exists(path: str = SESSION_PATH) -> bool:
+    return os.path.isfile(path)
@@ -0,0 +1,114 @@
+"""Precomputed kana syllabary, laid out as the gojūon table.
+
+The table has one row per vowel and one column per consonant. Selecting syllables
+is a lookup: every column stores its syllables for each of the 32 possible vowel
+row bitmasks, so a selection is a concatenation of the looked up tuples of the
+selected columns, with no conversion work.
+"""
+
+from dataclasses import dataclass
+from enum import Enum, auto
+from typing import Iterable, Optional
+
+VOWELS = ("a", "i", "u", "e", "o")
+ALL_ROWS = (1 << len(VOWELS)) - 1
+
+
+class Script(Enum):
+    HIRAGANA = auto()
+    KATAKANA = auto()
+
+class ColumnKind(Enum):
+    BASIC = auto()
+    DAKUTEN = auto()  # voiced consonants marked with dakuten or handakuten
+    YOON = auto()  # consonant combined with a small ya, yu or yo
+
+
+@dataclass(frozen=True)
+class Syllable:
+    hiragana: str
+    katakana: str
+    romaji: str
+
+    def kana(self, script: Script) -> str:
+        return self.hiragana if script == Script.HIRAGANA else self.katakana
+
+
+@dataclass(frozen=True)
+class Column:
+    consonant: str
+    kind: ColumnKind
+    cells: tuple[Optional[Syllable], ...]  # one per vowel row
+    vowel_independent: bool = False  # the syllable is selected regardless of selected rows, like 'n'
+    by_row_mask: tuple[tuple[Syllable, ...], ...] = ()
+
+    def select(self, row_mask: int) -> tuple[Syllable, ...]:
+        return self.by_row_mask[ALL_ROWS if self.vowel_independent else row_mask]
+
+
+def _column(consonant: str, kind: ColumnKind, hiragana: str, katakana: str, romaji: str,
+            vowel_independent: bool = False) -> Column:
+    """Builds a column from space separated cells, '-' marking syllables that don't exist."""
+    cells = tuple(None if h == "-" else Syllable(h, k, r)
+                  for h, k, r in zip(hiragana.split(), katakana.split(), romaji.split()))
+    cells += (None,) * (len(VOWELS) - len(cells))
+
+    by_row_mask = tuple(tuple(cell for row, cell in enumerate(cells) if cell and mask & (1 << row))
+                        for mask in range(ALL_ROWS + 1))
+    return Column(consonant, kind, cells, vowel_independent, by_row_mask)
+
+
+B, D, Y = ColumnKind.BASIC, ColumnKind.DAKUTEN, ColumnKind.YOON
+
+COLUMNS: tuple[Column, ...] = (
+    _column("", B, "あ い う え お", "ア イ ウ エ オ", "a i u e o"),
+    _column("k", B, "か き く け こ", "カ キ ク ケ コ", "ka ki ku ke ko"),
+    _column("s", B, "さ し す せ そ", "サ シ ス セ ソ", "sa shi su se so"),
+    _column("t", B, "た ち つ て と", "タ チ ツ テ ト", "ta chi tsu te to"),
+    _column("n", B, "な に ぬ ね の", "ナ ニ ヌ ネ ノ", "na ni nu ne no"),
+    _column("h", B, "は ひ ふ へ ほ", "ハ ヒ フ ヘ ホ", "ha hi fu he ho"),
+    _column("m", B, "ま み む め も", "マ ミ ム メ モ", "ma mi mu me mo"),
+    _column("y", B, "や - ゆ - よ", "ヤ - ユ - ヨ", "ya - yu - yo"),
+    _column("r", B, "ら り る れ ろ", "ラ リ ル レ ロ", "ra ri ru re ro"),
+    _column("w", B, "わ - - - を", "ワ - - - ヲ", "wa - - - wo"),
+    _column("n", B, "ん", "ン", "n", vowel_independent=True),
+
+    _column("g", D, "が ぎ ぐ げ ご", "ガ ギ グ ゲ ゴ", "ga gi gu ge go"),
+    _column("z", D, "ざ じ ず ぜ ぞ", "ザ ジ ズ ゼ ゾ", "za ji zu ze zo"),
+    _column("d", D, "だ ぢ づ で ど", "ダ ヂ ヅ デ ド", "da ji zu de do"),
+    _column("b", D, "ば び ぶ べ ぼ", "バ ビ ブ ベ ボ", "ba bi bu be bo"),
+    _column("p", D, "ぱ ぴ ぷ ぺ ぽ", "パ ピ プ ペ ポ", "pa pi pu pe po"),
+
+    # Yōon only exist with a, u and o vowels
+    _column("ky", Y, "きゃ - きゅ - きょ", "キャ - キュ - キョ", "kya - kyu - kyo"),
+    _column("sh", Y, "しゃ - しゅ - しょ", "シャ - シュ - ショ", "sha - shu - sho"),
+    _column("ch", Y, "ちゃ - ちゅ - ちょ", "チャ - チュ - チョ", "cha - chu - cho"),
+    _column("ny", Y, "にゃ - にゅ - にょ", "ニャ - ニュ - ニョ", "nya - nyu - nyo"),
+    _column("hy", Y, "ひゃ - ひゅ - ひょ", "ヒャ - ヒュ - ヒョ", "hya - hyu - hyo"),
+    _column("my", Y, "みゃ - みゅ - みょ", "ミャ - ミュ - ミョ", "mya - myu - myo"),
+    _column("ry", Y, "りゃ - りゅ - りょ", "リャ - リュ - リョ", "rya - ryu - ryo"),
+    _column("gy", Y, "ぎゃ - ぎゅ - ぎょ", "ギャ - ギュ - ギョ", "gya - gyu - gyo"),
+    _column("j", Y, "じゃ - じゅ - じょ", "ジャ - ジュ - ジョ", "ja - ju - jo"),
+    _column("by", Y, "びゃ - びゅ - びょ", "ビャ - ビュ - ビョ", "bya - byu - byo"),
+    _column("py", Y, "ぴゃ - ぴゅ - ぴょ", "ピャ - ピュ - ピョ", "pya - pyu - pyo"),
+)
+
+del B, D, Y
+
+
+def mask_of(indices: Iterable[int]) -> int:
+    mask = 0
+    for i in indices:
+        mask |= 1 << i
+    return mask
+
+def select(row_mask: int, column_mask: int) -> list[Syllable]:
+    """Returns syllables in selected rows and columns, bit i of a mask selecting i-th row or column."""
+    selected = []
+    column = 0
+    while column_mask:
+        if column_mask & 1:
+            selected += COLUMNS[column].select(row_mask)
+        column_mask >>= 1
+        column += 1
+    return selected
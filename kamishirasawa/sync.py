@@ -0,0 +1,212 @@
+"""Deck synchronisation over TCP with asyncio.
+
+A `SyncServer` serves deck files to any number of concurrent clients from one event
+loop. A client pulls a deck into a local DB by exchanging per-voc content hashes:
+the server sends hashes of its vocs in order, the client requests only the vocs it
+has no copy of, and rebuilds the deck from its own and the received vocs. Decks that
+didn't change are recognised by a single digest, without sending any hashes.
+
+Messages are JSON objects, one per line:
+    -> {"op": "list"}
+    <- {"decks": {name: digest}}
+    -> {"op": "hashes", "deck": name, "known": digest of the client's copy}
+    <- {"digest": digest, "count": n}, followed by {"hashes": [...]} lines with
+       up to HASH_CHUNK hashes, unless the known digest is the current one
+    -> {"op": "fetch", "deck": name, "hashes": [...]}
+    <- {"hash": hash, "voc": {...}} for every requested hash, then {"end": true}
+Failed requests are answered with {"error": message}.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Iterable, Optional, Sequence
+
+from kamishirasawa import DB, Voc, read_deck
+
+HASH_CHUNK = 4096
+LINE_LIMIT = 2**20
+
+
+class SyncError(Exception):
+    pass
+
+
+def voc_hash(voc: Voc) -> str:
+    """Returns a hash of the content of a voc. Meanings and categories are hashed sorted,
+    so reordering them isn't a change worth sending."""
+    content = "\x1f".join([voc.word, "\x1e".join(sorted(voc.meaning)), "\x1e".join(sorted(voc.categories))])
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=8).hexdigest()
+
+def deck_digest(hashes: Iterable[str]) -> str:
+    return hashlib.blake2b("".join(hashes).encode("ascii"), digest_size=16).hexdigest()
+
+
+async def _send(writer: asyncio.StreamWriter, message: dict) -> None:
+    writer.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+    await writer.drain()
+
+async def _receive(reader: asyncio.StreamReader) -> Optional[dict]:
+    line = await reader.readline()
+    return json.loads(line) if line else None
+
+
+@dataclass
+class _Deck:
+    stat: tuple[int, int]
+    hashes: list[str]
+    by_hash: dict[str, Voc]
+    digest: str
+
+
+class SyncServer:
+    """Serves deck files, named by their file names. Decks are read on the first request
+    and reread whenever their file changes."""
+
+    def __init__(self, paths: Iterable[str]) -> None:
+        self.paths = {os.path.basename(path): path for path in paths}
+        self.__decks: dict[str, _Deck] = {}
+        self.__locks: dict[str, asyncio.Lock] = {}
+        self.server: asyncio.AbstractServer = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Starts listening and returns the port, which is chosen by the system if `port` is 0."""
+        self.server = await asyncio.start_server(self.__handle, host, port, limit=LINE_LIMIT)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        await self.server.serve_forever()
+
+    async def close(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def deck(self, name: str) -> _Deck:
+        if name not in self.paths:
+            raise SyncError(f"Unknown deck '{name}'.")
+
+        # Concurrent requests for a changed deck wait for a single reload
+        async with self.__locks.setdefault(name, asyncio.Lock()):
+            stat = os.stat(self.paths[name])
+            stat = stat.st_mtime_ns, stat.st_size
+            if (deck := self.__decks.get(name)) is None or deck.stat != stat:
+                vocs = await asyncio.to_thread(read_deck, self.paths[name])
+                hashes = [voc_hash(voc) for voc in vocs]
+                deck = self.__decks[name] = _Deck(stat, hashes, dict(zip(hashes, vocs)), deck_digest(hashes))
+            return deck
+
+    async def __handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while (request := await _receive(reader)) is not None:
+                try:
+                    await self.__respond(request, writer)
+                except (SyncError, OSError, ValueError, KeyError) as e:
+                    await _send(writer, {"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def __respond(self, request: dict, writer: asyncio.StreamWriter) -> None:
+        match request.get("op"):
+            case "list":
+                await _send(writer, {"decks": {name: (await self.deck(name)).digest for name in self.paths}})
+
+            case "hashes":
+                deck = await self.deck(request["deck"])
+                if request.get("known") == deck.digest:
+                    await _send(writer, {"digest": deck.digest, "count": 0})
+                    return
+                await _send(writer, {"digest": deck.digest, "count": len(deck.hashes)})
+                for i in range(0, len(deck.hashes), HASH_CHUNK):
+                    await _send(writer, {"hashes": deck.hashes[i:i + HASH_CHUNK]})
+
+            case "fetch":
+                deck = await self.deck(request["deck"])
+                for h in request["hashes"]:
+                    if (voc := deck.by_hash.get(h)) is None:
+                        raise SyncError(f"Deck '{request['deck']}' changed, no voc with hash {h}.")
+                    await _send(writer, {"hash": h, "voc": voc.__dict__})
+                await _send(writer, {"end": True})
+
+            case op:
+                raise SyncError(f"Unknown operation '{op}'.")
+
+
+@dataclass
+class SyncResult:
+    vocs: list[Voc]
+    fetched: int  # number of vocs received from the server
+    up_to_date: bool  # the local copy was already the same as the served deck
+
+
+class SyncClient:
+    def __init__(self, host: str, port: int) -> None:
+        self.host, self.port = host, port
+        self.reader: asyncio.StreamReader = None
+        self.writer: asyncio.StreamWriter = None
+
+    async def __aenter__(self) -> "SyncClient":
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, limit=LINE_LIMIT)
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+
+    async def __request(self, message: dict) -> dict:
+        await _send(self.writer, message)
+        return await self.__response()
+
+    async def __response(self) -> dict:
+        response = await _receive(self.reader)
+        if response is None:
+            raise SyncError("Connection closed by the server.")
+        if "error" in response:
+            raise SyncError(response["error"])
+        return response
+
+    async def list_decks(self) -> dict[str, str]:
+        """Returns digests of served decks by their names."""
+        return (await self.__request({"op": "list"}))["decks"]
+
+    async def pull(self, deck: str, local: Sequence[Voc]) -> SyncResult:
+        """Returns vocs of a served deck, received only where `local` has no voc with the same content."""
+        local_hashes = [voc_hash(voc) for voc in local]
+        header = await self.__request({"op": "hashes", "deck": deck, "known": deck_digest(local_hashes)})
+        if header["count"] == 0 and header["digest"] == deck_digest(local_hashes):
+            return SyncResult(list(local), 0, True)
+
+        hashes = []
+        while len(hashes) < header["count"]:
+            hashes += (await self.__response())["hashes"]
+
+        known = dict(zip(local_hashes, local))
+        missing = list(dict.fromkeys(h for h in hashes if h not in known))
+        for i in range(0, len(missing), HASH_CHUNK):
+            await _send(self.writer, {"op": "fetch", "deck": deck, "hashes": missing[i:i + HASH_CHUNK]})
+            while "end" not in (response := await self.__response()):
+                known[response["hash"]] = Voc(**response["voc"])
+
+        return SyncResult([known[h] for h in hashes], len(missing), False)
+
+
+def apply_vocs(db: DB, old: Sequence[Voc], new: Sequence[Voc]) -> None:
+    """Writes new vocs to a DB holding the old ones. If their count didn't change, only changed vocs are written."""
+    if len(old) != len(new):
+        db.clear_and_write_data(new)
+        return
+    changed = {i: voc for i, (old_voc, voc) in enumerate(zip(old, new)) if voc_hash(old_voc) != voc_hash(voc)}
+    if changed:
+        db.update_vocs(changed)
+
+async def pull_into_db(host: str, port: int, deck: str, db: DB) -> SyncResult:
+    """Brings a local DB up to date with a served deck."""
+    local = db.read_data()
+    async with SyncClient(host, port) as client:
+        result = await client.pull(deck, local)
+    if not result.up_to_date:
+        apply_vocs(db, local, result.vocs)
+    return result
@@ -0,0 +1,127 @@
+"""Lightweight timing spans for hot paths.
+
+Tracing is enabled by setting the KAMISHIRASAWA_TRACE environment variable to a path
+of a Chrome trace JSON file (any other non-empty value writes 'kamishirasawa_trace.json').
+On exit, recorded spans are exported as a trace viewable in chrome://tracing or Perfetto,
+and aggregated percentiles are printed to stderr. When disabled, `traced` returns
+the decorated function unchanged and `span` returns a shared no-op context manager.
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Callable
+
+TRACE_ENV_VAR = "KAMISHIRASAWA_TRACE"
+DEFAULT_TRACE_PATH = "kamishirasawa_trace.json"
+
+ENABLED = bool(os.environ.get(TRACE_ENV_VAR))
+
+# Recorded spans as (name, thread id, start in ns, duration in ns), list.append is thread-safe
+_spans: list[tuple[str, int, int, int]] = []
+
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *_):
+        _spans.append((self.name, threading.get_ident(), self.start, time.perf_counter_ns() - self.start))
+        return False
+
+
+def span(name: str):
+    """Returns a context manager recording the time spent in its block under given name."""
+    return _Span(name) if ENABLED else _NULL_SPAN
+
+def traced(name: str = None) -> Callable[[Callable], Callable]:
+    """Decorator recording a span for every call of the decorated function."""
+    def decorator(func: Callable) -> Callable:
+        if not ENABLED:
+            return func
+
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _spans.append((span_name, threading.get_ident(), start, time.perf_counter_ns() - start))
+
+        return wrapper
+    return decorator
+
+
+def percentile(sorted_values: list, q: float):
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))]
+
+def summary() -> dict[str, dict[str, float]]:
+    """Returns count, total and p50/p90/p99/max durations in milliseconds per span name."""
+    durations = defaultdict(list)
+    for name, _, _, duration in list(_spans):
+        durations[name].append(duration / 1e6)
+
+    stats = {}
+    for name, values in durations.items():
+        values.sort()
+        stats[name] = {
+            "count": len(values),
+            "total": sum(values),
+            "p50": percentile(values, 0.5),
+            "p90": percentile(values, 0.9),
+            "p99": percentile(values, 0.99),
+            "max": values[-1],
+        }
+    return stats
+
+def export_chrome_trace(path: str) -> None:
+    """Writes recorded spans as complete ('X') events of the Chrome trace event format."""
+    pid = os.getpid()
+    events = [{"name": name, "ph": "X", "pid": pid, "tid": tid, "ts": start / 1e3, "dur": duration / 1e3}
+              for name, tid, start, duration in list(_spans)]
+
+    with open(path, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+def print_summary(file=sys.stderr) -> None:
+    stats = summary()
+    if not stats:
+        return
+
+    width = max(map(len, stats))
+    print(f"{'span':<{width}} {'count':>7} {'total':>10} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}  (ms)", file=file)
+    for name, s in sorted(stats.items(), key=lambda item: -item[1]["total"]):
+        print(f"{name:<{width}} {s['count']:>7} {s['total']:>10.2f} {s['p50']:>9.3f} "
+              f"{s['p90']:>9.3f} {s['p99']:>9.3f} {s['max']:>9.3f}", file=file)
+
+
+def _on_exit() -> None:
+    if not _spans:
+        return
+
+    path = os.environ[TRACE_ENV_VAR]
+    if not path.endswith(".json"):
+        path = DEFAULT_TRACE_PATH
+
+    export_chrome_trace(path)
+    print_summary()
+
+if ENABLED:
+    atexit.register(_on_exit)
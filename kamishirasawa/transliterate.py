@@ -0,0 +1,237 @@
+"""Kana/romaji transliteration with greedy longest-match tries.
+
+Tables are built once on import. Every conversion is a single left-to-right pass
+over the text: at each position the trie is walked as far as the text allows,
+and the output of the longest matched key is emitted (unmatched characters are
+copied as they are).
+"""
+
+from typing import Iterable, Optional
+
+# (kana, hepburn, kunrei, *other accepted romaji spellings)
+SYLLABLES = [
+    ("あ", "a", "a"), ("い", "i", "i"), ("う", "u", "u"), ("え", "e", "e"), ("お", "o", "o"),
+    ("か", "ka", "ka"), ("き", "ki", "ki"), ("く", "ku", "ku"), ("け", "ke", "ke"), ("こ", "ko", "ko"),
+    ("が", "ga", "ga"), ("ぎ", "gi", "gi"), ("ぐ", "gu", "gu"), ("げ", "ge", "ge"), ("ご", "go", "go"),
+    ("さ", "sa", "sa"), ("し", "shi", "si"), ("す", "su", "su"), ("せ", "se", "se"), ("そ", "so", "so"),
+    ("ざ", "za", "za"), ("じ", "ji", "zi"), ("ず", "zu", "zu"), ("ぜ", "ze", "ze"), ("ぞ", "zo", "zo"),
+    ("た", "ta", "ta"), ("ち", "chi", "ti"), ("つ", "tsu", "tu"), ("て", "te", "te"), ("と", "to", "to"),
+    ("だ", "da", "da"), ("ぢ", "ji", "zi", "di"), ("づ", "zu", "zu", "du", "dzu"), ("で", "de", "de"), ("ど", "do", "do"),
+    ("な", "na", "na"), ("に", "ni", "ni"), ("ぬ", "nu", "nu"), ("ね", "ne", "ne"), ("の", "no", "no"),
+    ("は", "ha", "ha"), ("ひ", "hi", "hi"), ("ふ", "fu", "hu"), ("へ", "he", "he"), ("ほ", "ho", "ho"),
+    ("ば", "ba", "ba"), ("び", "bi", "bi"), ("ぶ", "bu", "bu"), ("べ", "be", "be"), ("ぼ", "bo", "bo"),
+    ("ぱ", "pa", "pa"), ("ぴ", "pi", "pi"), ("ぷ", "pu", "pu"), ("ぺ", "pe", "pe"), ("ぽ", "po", "po"),
+    ("ま", "ma", "ma"), ("み", "mi", "mi"), ("む", "mu", "mu"), ("め", "me", "me"), ("も", "mo", "mo"),
+    ("や", "ya", "ya"), ("ゆ", "yu", "yu"), ("よ", "yo", "yo"),
+    ("ら", "ra", "ra"), ("り", "ri", "ri"), ("る", "ru", "ru"), ("れ", "re", "re"), ("ろ", "ro", "ro"),
+    ("わ", "wa", "wa"), ("を", "wo", "o"), ("ん", "n", "n", "nn", "n'"),
+
+    ("きゃ", "kya", "kya"), ("きゅ", "kyu", "kyu"), ("きょ", "kyo", "kyo"),
+    ("ぎゃ", "gya", "gya"), ("ぎゅ", "gyu", "gyu"), ("ぎょ", "gyo", "gyo"),
+    ("しゃ", "sha", "sya"), ("しゅ", "shu", "syu"), ("しょ", "sho", "syo"),
+    ("じゃ", "ja", "zya", "jya"), ("じゅ", "ju", "zyu", "jyu"), ("じょ", "jo", "zyo", "jyo"),
+    ("ちゃ", "cha", "tya", "cya"), ("ちゅ", "chu", "tyu", "cyu"), ("ちょ", "cho", "tyo", "cyo"),
+    ("ぢゃ", "ja", "zya", "dya"), ("ぢゅ", "ju", "zyu", "dyu"), ("ぢょ", "jo", "zyo", "dyo"),
+    ("にゃ", "nya", "nya"), ("にゅ", "nyu", "nyu"), ("にょ", "nyo", "nyo"),
+    ("ひゃ", "hya", "hya"), ("ひゅ", "hyu", "hyu"), ("ひょ", "hyo", "hyo"),
+    ("びゃ", "bya", "bya"), ("びゅ", "byu", "byu"), ("びょ", "byo", "byo"),
+    ("ぴゃ", "pya", "pya"), ("ぴゅ", "pyu", "pyu"), ("ぴょ", "pyo", "pyo"),
+    ("みゃ", "mya", "mya"), ("みゅ", "myu", "myu"), ("みょ", "myo", "myo"),
+    ("りゃ", "rya", "rya"), ("りゅ", "ryu", "ryu"), ("りょ", "ryo", "ryo"),
+
+    # Combinations used in loanwords
+    ("しぇ", "she", "sye"), ("じぇ", "je", "zye"), ("ちぇ", "che", "tye"),
+    ("ふぁ", "fa", "fa"), ("ふぃ", "fi", "fi"), ("ふぇ", "fe", "fe"), ("ふぉ", "fo", "fo"),
+    ("てぃ", "ti", "ti", "thi"), ("でぃ", "di", "di", "dhi"), ("うぃ", "wi", "wi"), ("うぇ", "we", "we"),
+    ("ゔ", "vu", "vu"), ("ゔぁ", "va", "va"), ("ゔぃ", "vi", "vi"), ("ゔぇ", "ve", "ve"), ("ゔぉ", "vo", "vo"),
+
+    # Small kana, typed explicitly with an 'x' or 'l' prefix. A sokuon not followed by a consonant
+    # is spelled like it's typed, as it can't double one
+    ("ぁ", "a", "a", "xa", "la"), ("ぃ", "i", "i", "xi", "li"), ("ぅ", "u", "u", "xu", "lu"),
+    ("ぇ", "e", "e", "xe", "le"), ("ぉ", "o", "o", "xo", "lo"),
+    ("ゃ", "ya", "ya", "xya", "lya"), ("ゅ", "yu", "yu", "xyu", "lyu"), ("ょ", "yo", "yo", "xyo", "lyo"),
+    ("っ", "xtsu", "xtu", "ltsu", "ltu"),
+
+    ("ー", "-", "-"),
+]
+
+SOKUON = "っ"
+VOWELS = "aiueo"
+
+HIRAGANA_RANGE = range(ord("ぁ"), ord("ゖ") + 1)
+KATAKANA_OFFSET = ord("ァ") - ord("ぁ")
+
+
+class Transliterator:
+    """Converts text with a greedy longest-match trie built from a {key: output} table."""
+
+    # Key of the output stored in trie nodes, no key of a table can be empty so it never collides
+    OUTPUT = ""
+
+    def __init__(self, table: dict[str, str]) -> None:
+        self.trie: dict = {}
+        for key, output in table.items():
+            node = self.trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[self.OUTPUT] = output
+
+    def longest_match(self, text: str, start: int = 0) -> tuple[int, Optional[str], bool]:
+        """Walks the trie from `start`, returning (length of the longest matched key, its output, is it
+        a prefix of a longer key that could still be matched if the text went on)."""
+        node, length, output, i = self.trie, 0, None, start
+        while i < len(text) and (child := node.get(text[i])) is not None:
+            node, i = child, i + 1
+            if self.OUTPUT in node:
+                length, output = i - start, node[self.OUTPUT]
+
+        extendable = i == len(text) and len(node) > (self.OUTPUT in node)
+        return length, output, extendable
+
+    def convert(self, text: str) -> str:
+        trie, output_key = self.trie, self.OUTPUT
+        result, i, n = [], 0, len(text)
+        while i < n:
+            # Inlined longest_match, as this is the hot loop
+            node, j, length, output = trie, i, 0, None
+            while j < n and (child := node.get(text[j])) is not None:
+                node, j = child, j + 1
+                if output_key in node:
+                    length, output = j - i, node[output_key]
+
+            if length:
+                result.append(output)
+                i += length
+            else:
+                result.append(text[i])
+                i += 1
+        return "".join(result)
+
+    def convert_many(self, texts: Iterable[str]) -> list[str]:
+        """Converts a batch of texts, converting repeated ones only once."""
+        converted = {}
+        return [converted[text] if text in converted else converted.setdefault(text, self.convert(text))
+                for text in texts]
+
+
+class IncrementalTransliterator:
+    """Converts text typed one character at a time, as in an input method. Converted output is kept
+    as confirmed, only the unconfirmed tail, which could still become a part of a longer key
+    (like 'ky' of 'kya'), is matched again on the next character. The tail is never longer than
+    the longest key, so every keystroke takes the same time however long the text is.
+    Keys are matched case insensitively, characters which aren't converted are kept as typed.
+    With `passthrough` set, typed characters are confirmed unchanged, e.g. to type romaji or latin words."""
+
+    def __init__(self, transliterator: Transliterator) -> None:
+        self.transliterator = transliterator
+        self.passthrough = False
+        self.confirmed = ""  # output, extended at the end by every keystroke
+        self.pending = ""  # as typed
+
+    @property
+    def text(self) -> str:
+        """Confirmed output followed by the unconfirmed input as it was typed."""
+        return self.confirmed + self.pending
+
+    def type(self, char: str) -> None:
+        if self.passthrough:
+            self.flush()
+            self.confirmed += char
+            return
+        
+        self.pending += char
+        while self.pending:
+            length, output, extendable = self.transliterator.longest_match(self.pending.lower())
+            if extendable:
+                break
+            if length:
+                self.confirmed += output
+                self.pending = self.pending[length:]
+            else:
+                self.confirmed += self.pending[0]
+                self.pending = self.pending[1:]
+
+    def backspace(self) -> None:
+        if self.pending:
+            self.pending = self.pending[:-1]
+        elif self.confirmed:
+            self.confirmed = self.confirmed[:-1]
+
+    def flush(self) -> None:
+        """Confirms the unconfirmed tail, converting what can be converted, e.g. a final 'n' to 'ん'."""
+        while self.pending:
+            length, output, _ = self.transliterator.longest_match(self.pending.lower())
+            self.confirmed += output if length else self.pending[0]
+            self.pending = self.pending[length or 1:]
+
+    def reset(self, text: str = "") -> None:
+        """Starts over with the given text, typed character by character."""
+        self.confirmed, self.pending = "", ""
+        for char in text:
+            self.type(char)
+
+
+def _romaji_table() -> dict[str, str]:
+    table = {}
+    for kana, *spellings in SYLLABLES:
+        for spelling in spellings:
+            # Earlier rows win for ambiguous spellings, e.g. 'ji' is 'じ' rather than 'ぢ', 'a' is 'あ' rather than 'ぁ'
+            table.setdefault(spelling, kana)
+
+    # A doubled consonant is a sokuon: 'kka' -> 'っか', hepburn also writes 'tch' for 'っch'
+    for spelling, kana in list(table.items()):
+        if spelling[0] not in VOWELS + "n'-xl":
+            table[spelling[0] + spelling] = SOKUON + kana
+            if spelling.startswith("ch"):
+                table["t" + spelling] = SOKUON + kana
+
+    # 'nn' followed by a vowel or 'y' is read as 'ん' and a n-syllable, as in 'onna' -> 'おんな'
+    for spelling, kana in list(table.items()):
+        if spelling[0] == "n" and len(spelling) > 1 and spelling[1] in VOWELS + "y":
+            table["n" + spelling] = "ん" + kana
+    return table
+
+def _kana_table(system: int) -> dict[str, str]:
+    """Builds a kana to romaji table, `system` being the index of the spelling column (0 - hepburn, 1 - kunrei)."""
+    table = {}
+    for kana, *spellings in SYLLABLES:
+        table.setdefault(kana, spellings[system])
+
+    for kana, romaji in list(table.items()):
+        # The sokuon doubles the first consonant of the next syllable
+        if romaji[0] not in VOWELS + "n-x":
+            table[SOKUON + kana] = ("t" if romaji.startswith("ch") else romaji[0]) + romaji
+        # 'ん' before a vowel or 'y' is written as "n'", so it isn't read as a n-syllable
+        if romaji[0] in VOWELS + "y":
+            table["ん" + kana] = "n'" + romaji
+
+    table.update({hiragana_to_katakana(kana): romaji for kana, romaji in table.items()})
+    return table
+
+
+def hiragana_to_katakana(text: str) -> str:
+    return "".join(chr(ord(c) + KATAKANA_OFFSET) if ord(c) in HIRAGANA_RANGE else c for c in text)
+
+def katakana_to_hiragana(text: str) -> str:
+    return "".join(chr(ord(c) - KATAKANA_OFFSET) if ord(c) - KATAKANA_OFFSET in HIRAGANA_RANGE else c for c in text)
+
+
+_ROMAJI_TABLE = _romaji_table()
+ROMAJI_TO_HIRAGANA = Transliterator(_ROMAJI_TABLE)
+ROMAJI_TO_KATAKANA = Transliterator({k: hiragana_to_katakana(v) for k, v in _ROMAJI_TABLE.items()})
+KANA_TO_HEPBURN = Transliterator(_kana_table(0))
+KANA_TO_KUNREI = Transliterator(_kana_table(1))
+
+
+def romaji_to_hiragana(text: str) -> str:
+    return ROMAJI_TO_HIRAGANA.convert(text.lower())
+
+def romaji_to_katakana(text: str) -> str:
+    return ROMAJI_TO_KATAKANA.convert(text.lower())
+
+def kana_to_romaji(text: str, system: str = "hepburn") -> str:
+    """Converts hiragana and katakana to hepburn or kunrei romaji."""
+    return (KANA_TO_HEPBURN if system == "hepburn" else KANA_TO_KUNREI).convert(text)
+
+def romaji_to_hiragana_many(texts: Iterable[str]) -> list[str]:
+    return ROMAJI_TO_HIRAGANA.convert_many(text.lower() for text in texts)
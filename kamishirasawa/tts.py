@@ -1,32 +1,121 @@
+"""Text-to-speech: clips are taken from audio packs or synthesized into memory, and played by an audio sink.
+
+Audio never touches the disk unless the sink can only play files, in which case
+the clip is written to a private temporary directory, removed on exit.
+"""
+
+import atexit
 import os
+import shutil
+import tempfile
+import threading
+import uuid
+from abc import ABC, abstractmethod
+
 import langdetect
 from playsound import playsound, PlaysoundException
-import tempfile
-import gtts
+
+import audiopack
+from tracing import span, traced
 
 
 JA_FALLBACK = {"zh-cn", "ko"}
 
-def tts(text: str, lang: str = None):
+backend: audiopack.SynthesisBackend = audiopack.GTTSBackend()
+
+# Audio packs of attached decks by the paths of the decks, clips found in them aren't synthesized
+packs: dict[str, audiopack.AudioArchive] = {}
+
+def use_packs(deck_paths) -> None:
+    """Opens audio packs next to the given decks, closing packs of other decks."""
+    deck_paths = set(deck_paths)
+    for path in set(packs) - deck_paths:
+        packs.pop(path).close()
+    for path in deck_paths - set(packs):
+        if os.path.isfile(pack_path := audiopack.archive_path(path)):
+            try:
+                packs[path] = audiopack.AudioArchive(pack_path)
+            except (OSError, audiopack.AudioPackError):
+                pass
+
+def packed_clip(text: str, lang: str = None) -> bytes:
+    for pack in list(packs.values()):
+        if (clip := pack.get(text, lang)) is not None:
+            return clip
+    return None
+
+
+class AudioSink(ABC):
+    # Sinks which can play only files get a path to the clip written to a temporary file instead of the clip
+    needs_path = False
+
+    @abstractmethod
+    def play(self, audio) -> None:
+        """Plays an MP3 clip, given as a bytes-like object (or a path if `needs_path` is set), blocking until it ends."""
+        ...
+
+class PlaysoundSink(AudioSink):
+    needs_path = True
+
+    def play(self, audio: str) -> None:
+        try:
+            playsound(audio)
+        except PlaysoundException:
+            pass
+
+sink: AudioSink = PlaysoundSink()
+
+def set_sink(new_sink: AudioSink) -> None:
+    global sink
+    sink = new_sink
+
+
+_temp_dir: str = None
+_temp_dir_lock = threading.Lock()
+
+def _temp_path(suffix: str) -> str:
+    """Returns a new path in a directory private to this process, created on first use."""
+    global _temp_dir
+    with _temp_dir_lock:
+        if _temp_dir is None:
+            _temp_dir = tempfile.mkdtemp(prefix="kamishirasawa-tts-")
+            atexit.register(shutil.rmtree, _temp_dir, True)
+    return os.path.join(_temp_dir, uuid.uuid4().hex + suffix)
+
+
+def detect_lang(text: str) -> str:
+    lang = langdetect.detect(text)
+    if lang in JA_FALLBACK:
+        # Korean and Chinese use the same characters as Japanese
+        # If one of these is detected, lang is set to Japanese
+        return "ja"
+    # Short words written in latin alphabet are hard to accurately parse without context
+    # As the app uses English, it's assumed that any non-Japanese script is written in English
+    return "en"
+
+def synthesize(text: str, lang: str = None) -> bytes:
+    if (clip := packed_clip(text, lang)) is not None:
+        return clip
+    with span("tts.synthesis"):
+        return backend.synthesize(text, lang or detect_lang(text))
+
+def play(audio: bytes) -> None:
+    current_sink = sink
+    if not current_sink.needs_path:
+        current_sink.play(memoryview(audio))
+        return
+
+    path = _temp_path(".mp3")
     try:
-        with tempfile.NamedTemporaryFile(dir="", suffix='.mp3', delete=False) as file:
-            if not lang:
-                lang = langdetect.detect(text)
-                if lang in JA_FALLBACK: 
-                    # Korean and Chinese use the same characters as Japanese
-                    # If one of these is detected, lang is set to Japanese
-                    lang = "ja"
-                else:
-                    # Short words written in latin alphabet are hard to accurately parse without context
-                    # As the app uses English, it's assumed that any non-Japanese script is written in English
-                    lang = "en"                
-            gtts.gTTS(text, lang=lang, slow=True).write_to_fp(file)
-            
-        playsound(file.name)
-        
-    except PlaysoundException:
-        pass
-    
+        with open(path, "wb") as file:
+            file.write(audio)
+        current_sink.play(path)
     finally:
-        os.remove(file.name)
-        
\ No newline at end of file
+        if os.path.exists(path):
+            os.remove(path)
+
+@traced("tts.tts")
+def tts(text: str, lang: str = None):
+    audio = synthesize(text, lang)
+    with span("tts.playback"):
+        play(audio)
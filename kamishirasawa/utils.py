@@ -11,6 +11,10 @@ class Event:
     def __isub__(self, callable: Callable):
         self.__callables.remove(callable)
         return self
+    
+    @property
+    def handler_count(self) -> int:
+        return len(self.__callables)
         
     def __call__(self, *args, **kwargs):
         for arg in args:
@@ -49,6 +53,10 @@ class ObservableFlag:
             
     def remove_on_write(self, callable: Callable[[bool], Any]):
         self.__on_write_callables.remove(callable)
+        
+    @property
+    def handler_count(self) -> int:
+        return len(self.__on_write_callables)
 
     def __bool__(self):
         return self.__value
@@ -0,0 +1,62 @@
+import os
+import threading
+from typing import Callable, Optional
+
+from utils import Event
+
+
+class PollingWatcher:
+    """A stat-polling file watcher, a fallback for platforms where inotify-like notifications
+    (QFileSystemWatcher) are unavailable. It runs in a daemon thread and fires `file_changed`
+    with the path from that thread whenever modification time or size of a watched file changes."""
+
+    def __init__(self, interval: float = 1.0) -> None:
+        self.interval = interval
+        self.file_changed = Event()
+
+        self.__stats: dict[str, Optional[tuple[int, int]]] = {}
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name="PollingWatcher", daemon=True)
+        self.__thread.start()
+
+    @staticmethod
+    def __stat(path: str) -> Optional[tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def add_path(self, path: str) -> None:
+        with self.__lock:
+            self.__stats[path] = self.__stat(path)
+
+    def remove_path(self, path: str) -> None:
+        with self.__lock:
+            self.__stats.pop(path, None)
+
+    def paths(self) -> list[str]:
+        with self.__lock:
+            return list(self.__stats)
+
+    def poll(self) -> list[str]:
+        """Checks all watched files once, returns and announces the changed ones."""
+        changed = []
+        with self.__lock:
+            for path, last in self.__stats.items():
+                if (current := self.__stat(path)) != last:
+                    self.__stats[path] = current
+                    changed.append(path)
+
+        for path in changed:
+            self.file_changed(path)
+        return changed
+
+    def __run(self) -> None:
+        while not self.__stopped.wait(self.interval):
+            self.poll()
+
+    def stop(self) -> None:
+        self.__stopped.set()
+        self.__thread.join()
@@ -0,0 +1,46 @@
+"""Workspace restored between launches: attached decks, selected categories or category query and game settings.
+
+The workspace is a small JSON file, rewritten atomically whenever it changes. Decks
+are kept most recently used first, which is also the order they are restored in.
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass, field
+
+WORKSPACE_DIR = os.path.join(os.path.expanduser("~"), ".kamishirasawa")
+WORKSPACE_PATH = os.path.join(WORKSPACE_DIR, "workspace.json")
+
+
+@dataclass
+class Workspace:
+    decks: list[str] = field(default_factory=list)  # absolute paths, most recently used first
+    categories: list[str] = field(default_factory=list)
+    category_query: str = ""
+    # Settings of the test setup: passes, max_cards, game, widget and choices
+    game_settings: dict = field(default_factory=dict)
+
+    def touch(self, path: str) -> None:
+        """Marks a deck as the most recently used one."""
+        path = os.path.abspath(path)
+        self.decks = [path] + [p for p in self.decks if p != path]
+
+    def save(self, path: str = WORKSPACE_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(asdict(self), file, ensure_ascii=False, indent=4)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str = WORKSPACE_PATH) -> "Workspace":
+        """Returns the saved workspace, or an empty one if there is none or it can't be read."""
+        try:
+            with open(path, encoding="utf-8") as file:
+                data = json.load(file)
+            return cls([str(p) for p in data.get("decks", [])],
+                       [str(c) for c in data.get("categories", [])],
+                       str(data.get("category_query", "")),
+                       dict(data.get("game_settings", {})))
+        except (OSError, ValueError, TypeError, AttributeError):
+            return cls()
@@ -0,0 +1,18 @@
+"""Entry point of the installed `kamishirasawa-cli` script.
+
+Modules of the app import each other by their plain names, like when started from
+kamishirasawa/app.py, so their directory is put on the path once, before the CLI is
+imported. The entry point can't be a module of that directory: importing it as
+`kamishirasawa.cli` would make the name `kamishirasawa` refer to the directory
+instead of the core module.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "kamishirasawa"))
+
+from cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
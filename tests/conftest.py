@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules of the app import each other by their plain names, like when started from app.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "kamishirasawa"))
@@ -0,0 +1,113 @@
+import pytest
+
+import audiopack
+from audiopack import WORD_LANG, AudioArchive, FakeBackend, archive_path, build_pack, texts_of
+from kamishirasawa import Kamishirasawa, Voc, write_deck
+
+VOCS = [
+    Voc("家族", ["family"], ["FAMILY"]),
+    Voc("父", ["father", "dad"], ["FAMILY"]),
+    Voc("母", ["mother"], ["FAMILY"]),
+    Voc("一", ["one"], ["NUMBERS"]),
+]
+
+OPTIONS = dict(workers=3, rate=0, backoff=0)
+
+
+def clip(text: str, lang: str) -> bytes:
+    """Returns the 'audio' FakeBackend synthesizes for the text."""
+    return f"FAKE {lang} {text}".encode("utf-8")
+
+
+def assert_pack(path: str, texts: list[tuple[str, str]]) -> None:
+    archive = AudioArchive(path)
+    try:
+        assert len(archive) == len(texts)
+        for text, lang in texts:
+            assert (text, lang) in archive
+            assert archive.get(text, lang) == clip(text, lang)
+    finally:
+        archive.close()
+
+
+@pytest.mark.parametrize("include_meanings", [False, True])
+def test_build_pack_stores_every_clip(tmp_path, include_meanings):
+    path = str(tmp_path / "family.kamidb.kamiaudio")
+    backend = FakeBackend(seed=0)
+    result = build_pack(VOCS, path, backend, include_meanings, **OPTIONS)
+
+    texts = texts_of(VOCS, include_meanings)
+    assert len(texts) == (9 if include_meanings else 4)
+    assert (result.synthesized, result.reused, result.failed) == (len(texts), 0, [])
+    assert backend.calls == len(texts)
+    assert_pack(path, texts)
+
+
+def test_rebuild_synthesizes_only_new_texts(tmp_path):
+    path = str(tmp_path / "family.kamidb.kamiaudio")
+    build_pack(VOCS, path, FakeBackend(), **OPTIONS)
+
+    changed = VOCS[1:] + [Voc("二", ["two"], ["NUMBERS"])]
+    backend = FakeBackend()
+    result = build_pack(changed, path, backend, **OPTIONS)
+
+    assert (result.synthesized, result.reused, result.failed) == (1, 3, [])
+    assert backend.calls == 1
+    # Clips of removed vocs are left out of the rebuilt pack
+    assert_pack(path, texts_of(changed))
+    archive = AudioArchive(path)
+    assert archive.get("家族", WORD_LANG) is None
+    archive.close()
+
+
+def test_failed_texts_are_retried_and_reported(tmp_path):
+    path = str(tmp_path / "family.kamidb.kamiaudio")
+    progress = []
+    result = build_pack(VOCS, path, FakeBackend(failure_rate=1), retries=2,
+                        on_progress=lambda done, total: progress.append((done, total)), **OPTIONS)
+
+    assert result.synthesized == 0
+    assert sorted(result.failed) == sorted(texts_of(VOCS))
+    assert progress[-1] == (len(VOCS), len(VOCS))
+    assert_pack(path, [])
+
+    # A rebuild with a working backend fills in the failed texts
+    result = build_pack(VOCS, path, FakeBackend(), **OPTIONS)
+    assert (result.synthesized, result.reused) == (len(VOCS), 0)
+    assert_pack(path, texts_of(VOCS))
+
+
+def test_archive_rejects_other_files(tmp_path):
+    path = tmp_path / "deck.kamiaudio"
+    path.write_bytes(b"")
+    with pytest.raises(audiopack.AudioPackError):
+        AudioArchive(str(path))
+    path.write_bytes(b"[]" * 16)
+    with pytest.raises(audiopack.AudioPackError):
+        AudioArchive(str(path))
+
+
+def test_build_audio_packs_of_attached_dbs(tmp_path):
+    paths = [str(tmp_path / "family.kamidb"), str(tmp_path / "numbers.kamisql")]
+    write_deck(paths[0], VOCS[:3])
+    write_deck(paths[1], VOCS[3:])
+
+    kamishirasawa = Kamishirasawa()
+    try:
+        for path in paths:
+            kamishirasawa.attach_db(path)
+        results = kamishirasawa.build_audio_packs(backend=FakeBackend(), include_meanings=True, **OPTIONS)
+
+        assert {db.path for db in results} == set(paths)
+        for db, result in results.items():
+            assert result.path == archive_path(db.path)
+            assert_pack(result.path, texts_of(kamishirasawa.vocs_of(db), include_meanings=True))
+
+        # Only the given DBs are built, reusing clips of the existing pack
+        family = kamishirasawa.db_of_path(paths[0])
+        results = kamishirasawa.build_audio_packs([family], backend=FakeBackend(), **OPTIONS)
+        assert list(results) == [family]
+        assert (results[family].synthesized, results[family].reused) == (0, 3)
+        assert_pack(archive_path(paths[0]), texts_of(VOCS[:3]))
+    finally:
+        kamishirasawa.close_all_dbs()
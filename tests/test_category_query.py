@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+from category_query import CategoryIndex, CategoryQuery, QueryError, normalize, positions
+from kamishirasawa import Voc
+
+
+@pytest.mark.parametrize("expression, tree", [
+    ("a | b & c", ("|", "A", ("&", "B", "C"))),
+    ("a & b | c", ("|", ("&", "A", "B"), "C")),
+    ("!a & b", ("&", ("!", "A"), "B")),
+    ("!!a", ("!", ("!", "A"))),
+    ("!(a | b)", ("!", ("|", "A", "B"))),
+    ("a & (b | c)", ("&", "A", ("|", "B", "C"))),
+    ("((a))", "A"),
+    ("a | b | c", ("|", ("|", "A", "B"), "C")),
+    (" 1st  grade & !numbers | Family ", ("|", ("&", "1ST GRADE", ("!", "NUMBERS")), "FAMILY")),
+])
+def test_operators_bind_by_precedence(expression, tree):
+    query = CategoryQuery(expression)
+    assert query.tree == tree
+    assert str(query) == expression
+
+
+def test_categories_of_query():
+    assert CategoryQuery("a & !(b | c d) | a").categories == {"A", "B", "C D"}
+    assert normalize("  1st \t grade ") == "1ST GRADE"
+
+
+@pytest.mark.parametrize("expression, message", [
+    ("", "Unexpected end of the query."),
+    ("   ", "Unexpected end of the query."),
+    ("a &", "Unexpected end of the query."),
+    ("!", "Unexpected end of the query."),
+    ("(a", "Unexpected end of the query."),
+    ("(a | b", "Unexpected end of the query."),
+    ("(a b", "Unexpected end of the query."),
+    ("a )", "Unexpected ')'."),
+    ("a (b)", "Unexpected '('."),
+    ("& a", "Expected a category before '&'."),
+    ("a | | b", "Expected a category before '|'."),
+    ("()", "Expected a category before ')'."),
+])
+def test_malformed_queries(expression, message):
+    with pytest.raises(QueryError) as error:
+        CategoryQuery(expression)
+    assert error.value.args == (message,)
+
+
+VOCS = [
+    Voc("一", ["one"], ["1st grade", "numbers"]),
+    Voc("家族", ["family"], ["family", " 2nd  grade"]),
+    Voc("月曜日", ["monday"], []),
+    Voc("二", ["two"], ["NUMBERS", "1st grade"]),
+    Voc("母", ["mother"], ["Family"]),
+]
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("1st grade", [0, 3]),
+    ("numbers & !1st grade", []),
+    ("family | numbers", [0, 1, 3, 4]),
+    ("!family & !numbers", [2]),
+    ("!(family | numbers)", [2]),
+    ("2nd grade | 1st grade & numbers", [0, 1, 3]),
+    ("(2nd grade | 1st grade) & numbers", [0, 3]),
+    ("missing", []),
+    ("!missing", [0, 1, 2, 3, 4]),
+])
+def test_index_evaluates_queries(expression, expected):
+    # Categories of vocs are normalized like names in queries are
+    index = CategoryIndex(VOCS)
+    query = CategoryQuery(expression)
+    assert positions(index.evaluate(query)) == expected
+    assert [position for position in range(len(VOCS)) if index.matches(position, query)] == expected
+
+
+def test_bitsets_match_single_vocs():
+    categories = ["A", "B", "C", "D E"]
+    rng = random.Random(0)
+    vocs = [Voc(str(i), ["meaning"], rng.sample(categories, rng.randint(0, 3))) for i in range(1000)]
+    index = CategoryIndex(vocs)
+    assert index.size == 1000 and index.all == (1 << 1000) - 1
+    assert set(index.bits) == set(categories)
+
+    for expression in ["a", "a & b", "!a | d e", "!(a & !c) & (b | d e)", "a | b | c | d e", "x | !x"]:
+        query = CategoryQuery(expression)
+        bitset = index.evaluate(query)
+        assert bitset >> index.size == 0
+        assert positions(bitset) == [position for position in range(index.size) if index.matches(position, query)]
+
+
+def test_positions_of_bits():
+    assert positions(0) == []
+    assert positions(0b1011) == [0, 1, 3]
+    assert positions(1 << 100_000 | 1 << 7) == [7, 100_000]
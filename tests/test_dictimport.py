@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from dictimport import (COMMON, DictionaryFormatError, DictionaryReader, JMDICT, JOUYOU, JINMEIYOU, KANJIDIC,
+                        KYOUIKU, import_dictionary)
+from kamishirasawa import Voc, read_deck, write_deck
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+JMDICT_SAMPLE = os.path.join(FIXTURES, "JMdict_sample.xml")
+KANJIDIC_SAMPLE = os.path.join(FIXTURES, "kanjidic2_sample.xml")
+
+EXTENSIONS = [".kamidb", ".kamidb.gz", ".kamidb.xz", ".tsv", ".sqlite"]
+
+
+def contents(vocs: list[Voc]) -> list[tuple]:
+    """Returns vocs in a comparable form, with meanings and categories sorted to compare them as sets."""
+    return [(voc.word, sorted(voc.meaning), sorted(voc.categories)) for voc in vocs]
+
+
+def test_jmdict_entries_map_to_vocs():
+    reader = DictionaryReader(JMDICT_SAMPLE)
+    vocs = {voc.word: voc for voc in reader}
+
+    assert (reader.format, reader.entries, reader.skipped) == (JMDICT, 5, 1)
+    # German glosses are left out, the first writing is the kanji one
+    assert contents([vocs["明白"]]) == [("明白", ["clear", "obvious"], [COMMON])]
+    assert contents([vocs["買う"]]) == [("買う", ["to buy", "to purchase", "to value"], [COMMON])]
+    # Kana-only words are written with their reading, field lists are split into categories
+    assert contents([vocs["コンピューター"]]) == [("コンピューター", ["computer"], [COMMON, "COMPUTING"])]
+    assert "FOOD" in vocs["寿司"].categories and "COOKING" in vocs["寿司"].categories
+
+
+def test_kanjidic_characters_map_to_vocs():
+    reader = DictionaryReader(KANJIDIC_SAMPLE)
+    vocs = {voc.word: voc for voc in reader}
+
+    assert (reader.format, reader.entries, reader.skipped) == (KANJIDIC, 5, 1)
+    assert contents([vocs["一"]]) == [("一", ["one", "one radical (no.1)"], sorted(["1ST GRADE", KYOUIKU, "JLPT 4"]))]
+    assert vocs["瞭"].categories == [JOUYOU]
+    assert vocs["之"].categories == [JINMEIYOU]
+    assert "丂" not in vocs
+
+
+@pytest.mark.parametrize("source", [JMDICT_SAMPLE, KANJIDIC_SAMPLE])
+@pytest.mark.parametrize("extension", EXTENSIONS)
+def test_import_matches_read_deck(tmp_path, source, extension):
+    expected = list(DictionaryReader(source))
+    path = str(tmp_path / ("deck" + extension))
+    # Small chunks, so JSON decks are put together from several of them
+    result = import_dictionary(source, path, chunk_size=2, workers=2)
+
+    assert (result.path, result.vocs, result.skipped) == (path, 4, 1)
+    assert result.format == (JMDICT if source == JMDICT_SAMPLE else KANJIDIC)
+    assert contents(read_deck(path)) == contents(expected)
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_import_overwrites_deck(tmp_path, compact):
+    path = str(tmp_path / "deck.kamidb")
+    write_deck(path, [Voc("古い", ["old"], [])])
+    import_dictionary(JMDICT_SAMPLE, path, compact=compact, chunk_size=3, workers=1)
+
+    assert contents(read_deck(path)) == contents(list(DictionaryReader(JMDICT_SAMPLE)))
+
+
+@pytest.mark.parametrize("extension", EXTENSIONS)
+def test_wrong_root_fails_and_keeps_deck(tmp_path, extension):
+    source = tmp_path / "other.xml"
+    source.write_text("<?xml version='1.0'?><dictionary><entry/></dictionary>", encoding="utf-8")
+    path = str(tmp_path / ("deck" + extension))
+    old = [Voc("古い", ["old"], [])]
+    write_deck(path, old)
+
+    with pytest.raises(DictionaryFormatError, match="<dictionary>"):
+        import_dictionary(str(source), path, workers=1)
+    # The deck is untouched and no temporary file is left behind
+    assert contents(read_deck(path)) == contents(old)
+    assert sorted(os.listdir(tmp_path)) == sorted(["other.xml", os.path.basename(path)])
+
+
+@pytest.mark.parametrize("extension", [".kamidb.gz", ".tsv", ".sqlite"])
+def test_malformed_dictionary_fails_midway(tmp_path, extension):
+    with open(JMDICT_SAMPLE, encoding="utf-8") as file:
+        text = file.read()
+    source = tmp_path / "JMdict_broken.xml"
+    source.write_text(text[:text.rindex("<entry>")] + "<entry><ent_seq>", encoding="utf-8")
+    path = str(tmp_path / ("deck" + extension))
+
+    with pytest.raises(DictionaryFormatError):
+        import_dictionary(str(source), path, chunk_size=1, workers=1)
+    assert os.listdir(tmp_path) == ["JMdict_broken.xml"]
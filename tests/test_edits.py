@@ -0,0 +1,95 @@
+import pytest
+
+from edits import CellEdit, EditStack, RowsInserted, RowsRemoved
+
+
+class Table:
+    """A list of rows, each a (position in the DB, cells) tuple, edited like the DB manager's table."""
+
+    def __init__(self, rows: list) -> None:
+        self.rows = [(position, list(cells)) for position, cells in rows]
+
+    def set_cell(self, row: int, column: int, cell) -> None:
+        self.rows[row][1][column] = cell
+
+    def insert_rows(self, row: int, rows: list) -> None:
+        self.rows[row:row] = [(position, list(cells)) for position, cells in rows]
+
+    def remove_row(self, row: int) -> None:
+        del self.rows[row]
+
+    @property
+    def words(self) -> list[str]:
+        return [cells[0][0] for _, cells in self.rows]
+
+
+def row(position, word: str, meaning: str = "meaning") -> tuple:
+    return position, ((word, word), (meaning, [meaning]), ("", []))
+
+
+@pytest.fixture
+def table() -> Table:
+    return Table([row(i, word) for i, word in enumerate(["一", "二", "三", "四"])])
+
+
+def test_undo_and_redo_are_last_in_first_out(table):
+    stack = EditStack()
+    events = []
+    stack.on_edit += lambda edit, reverted: events.append((type(edit).__name__, reverted))
+
+    stack.do(CellEdit(1, 0, ("二", "二"), ("弐", "弐")), table)
+    stack.do(RowsRemoved([(0, row(0, "一")), (2, row(2, "三"))]), table)
+    assert table.words == ["弐", "四"]
+    stack.do(RowsInserted(1, [row(None, "五"), row(None, "六")]), table)
+    assert table.words == ["弐", "五", "六", "四"]
+
+    while stack.undo(table):
+        pass
+    assert table.words == ["一", "二", "三", "四"]
+    assert stack.undo(table) is None and not stack.can_undo() and stack.can_redo()
+    assert stack.memory_used == 0
+
+    stack.redo(table)
+    stack.redo(table)
+    assert table.words == ["弐", "四"]
+    assert events == [("CellEdit", False), ("RowsRemoved", False), ("RowsInserted", False),
+                      ("RowsInserted", True), ("RowsRemoved", True), ("CellEdit", True),
+                      ("CellEdit", False), ("RowsRemoved", False)]
+
+    # A new edit forgets the undone ones
+    stack.do(CellEdit(0, 1, ("meaning", ["meaning"]), ("second", ["second"])), table)
+    assert not stack.can_redo() and stack.redo(table) is None
+    assert [cells[1][1] for _, cells in table.rows] == [["second"], ["meaning"]]
+
+
+def test_structural_edits():
+    assert RowsInserted.structural and RowsRemoved.structural and not CellEdit.structural
+
+
+def test_memory_limit_forgets_the_oldest_edits(table):
+    edits = [CellEdit(0, 1, ("meaning", ["meaning"]), (str(i) * 100, [str(i) * 100])) for i in range(10)]
+    stack = EditStack(memory_limit=sum(edit.size for edit in edits[:3]))
+    for edit in edits:
+        stack.do(edit, table)
+    assert list(stack.undo_stack) == edits[-3:]
+    assert stack.memory_used == sum(edit.size for edit in edits[-3:]) <= stack.memory_limit
+
+    # Undone edits are not counted, redoing them counts them again
+    stack.undo(table)
+    assert stack.memory_used == sum(edit.size for edit in edits[-3:-1])
+    stack.redo(table)
+    assert list(stack.undo_stack) == edits[-3:]
+
+    stack.clear()
+    assert (stack.memory_used, stack.can_undo(), stack.can_redo()) == (0, False, False)
+
+
+def test_newest_edit_is_kept_over_the_limit(table):
+    stack = EditStack(memory_limit=1)
+    inserted = RowsInserted(0, [row(None, "大" * 1000)])
+    stack.do(CellEdit(0, 0, ("一", "一"), ("壱", "壱")), table)
+    stack.do(inserted, table)
+    assert list(stack.undo_stack) == [inserted]
+    assert stack.memory_used == inserted.size > stack.memory_limit
+    assert stack.undo(table) is inserted
+    assert table.words == ["壱", "二", "三", "四"]
@@ -0,0 +1,52 @@
+import pytest
+
+from kamishirasawa import DBDiff, Voc, migrate_db, open_db, read_deck, write_deck
+
+VOCS = [
+    Voc("家族", ["family", "household"], ["FAMILY", "1ST GRADE"]),
+    Voc("父", ["father", "dad"], ["FAMILY"]),
+    Voc("一", ["one"], ["NUMBERS", "1ST GRADE"]),
+]
+
+
+def test_voc_drops_duplicates_keeping_order():
+    voc = Voc("父", [" Father", "dad", "father ", "papa"], ["family", "2nd  grade", " FAMILY", "1st grade"])
+    assert voc.meaning == ["father", "dad", "papa"]
+    assert voc.categories == ["FAMILY", "2ND GRADE", "1ST GRADE"]
+
+
+def test_db_diff_detects_reordered_meanings_and_categories():
+    reordered = [Voc("家族", ["household", "family"], ["FAMILY", "1ST GRADE"]),
+                 Voc("父", ["father", "dad"], ["FAMILY"]),
+                 Voc("一", ["one"], ["1ST GRADE", "NUMBERS"])]
+    diff = DBDiff.between(VOCS, reordered)
+    assert diff.changed == [(VOCS[0], reordered[0]), (VOCS[2], reordered[2])]
+    assert not diff.added and not diff.removed
+    assert not DBDiff.between(VOCS, list(VOCS))
+
+
+@pytest.mark.parametrize("destination", ["deck.kamisql", "deck.kamidb.gz", "deck.tsv", "deck.kamidb"])
+def test_migrate_db_keeps_order(tmp_path, destination):
+    source = str(tmp_path / "source.kamidb")
+    write_deck(source, VOCS)
+    migrate_db(source, str(tmp_path / destination))
+    assert read_deck(str(tmp_path / destination)) == VOCS
+
+
+def test_sqlite_update_vocs_by_position(tmp_path):
+    path = str(tmp_path / "deck.kamisql")
+    write_deck(path, VOCS)
+    db = open_db(path)
+    try:
+        db.update_voc(1, Voc("母", ["mother"], ["FAMILY"]))
+        db.update_vocs({0: Voc("家", ["house"], []), 2: Voc("二", ["two"], ["NUMBERS"])})
+        assert db.read_data() == [Voc("家", ["house"], []), Voc("母", ["mother"], ["FAMILY"]), Voc("二", ["two"], ["NUMBERS"])]
+
+        # Positions of rewritten data are looked up again
+        db.clear_and_write_data(VOCS[:2])
+        db.update_voc(1, Voc("母", ["mother"], ["FAMILY"]))
+        assert db.read_data() == [VOCS[0], Voc("母", ["mother"], ["FAMILY"])]
+        with pytest.raises(IndexError):
+            db.update_voc(2, VOCS[2])
+    finally:
+        db.close()
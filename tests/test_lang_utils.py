@@ -0,0 +1,44 @@
+import pytest
+
+from lang_utils import align_reading, furigana, is_kanji
+
+
+@pytest.mark.parametrize("text, reading, expected", [
+    ("取り扱い", "とりあつかい", (("取", "と"), ("り", None), ("扱", "あつか"), ("い", None))),
+    ("食べる", "たべる", (("食", "た"), ("べる", None))),
+    ("入り口", "いりぐち", (("入", "い"), ("り", None), ("口", "ぐち"))),
+    # Katakana anchors are matched against the hiragana reading
+    ("ソ連", "それん", (("ソ", None), ("連", "れん"))),
+    ("ボール箱", "ぼーるばこ", (("ボール", None), ("箱", "ばこ"))),
+    ("今日は", "きょうは", (("今日", "きょう"), ("は", None))),
+    ("ひらがな", "ひらがな", (("ひらがな", None),)),
+])
+def test_align_reading(text, reading, expected):
+    assert align_reading(text, reading) == expected
+
+
+def test_align_reading_gives_unfitting_reading_to_whole_text():
+    # The okurigana of the reading doesn't match the one of the text
+    assert align_reading("取り扱い", "とりあつかう") == (("取り扱い", "とりあつかう"),)
+    assert align_reading("入り口", "いぐち") == (("入り口", "いぐち"),)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("取り扱い", (("取", "と"), ("り", None), ("扱", "あつか"), ("い", None))),
+    ("食べる", (("食", "た"), ("べる", None))),
+    ("入り口", (("入", "い"), ("り", None), ("口", "ぐち"))),
+    ("ソ連", (("ソ", None), ("連", "れん"))),
+    ("ひらがな", (("ひらがな", None),)),
+])
+def test_furigana(text, expected):
+    assert furigana(text) == expected
+
+
+@pytest.mark.parametrize("text", ["取り扱い", "食べる", "入り口", "ソ連", "ボール箱", "今日は", "お茶を飲む", "ABCと漢字"])
+def test_furigana_covers_text(text):
+    segments = furigana(text)
+    assert "".join(orig for orig, _ in segments) == text
+    for orig, hira in segments:
+        # Only kanji get readings, and neighbouring runs without one are merged
+        assert (hira is not None) == any(is_kanji(char) for char in orig)
+    assert all(a[1] is not None or b[1] is not None for a, b in zip(segments, segments[1:]))
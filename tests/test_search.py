@@ -0,0 +1,72 @@
+import pytest
+
+from kamishirasawa import Voc
+from search import SearchIndex, normalize, voc_terms
+
+VOCS = [
+    Voc("一", ["one"], []),
+    Voc("一つ", ["one thing"], []),
+    Voc("家族", ["family"], []),
+    Voc("月曜日", ["monday"], []),
+    Voc("お金", ["money"], []),
+]
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.add("db", VOCS)
+    return index
+
+
+def words(results) -> list:
+    return [result.voc.word for result in results]
+
+
+def test_voc_terms_include_readings():
+    assert voc_terms(Voc("家族", ["Family "], [])) == ("家族", "family", "かぞく", "カゾク", "kazoku")
+    assert normalize(" One Thing ") == "onething"
+
+
+def test_search_ranks_exact_prefix_and_substring_matches(index):
+    assert words(index.search("one")) == ["一", "一つ", "お金"]
+    assert words(index.search("mon")) == ["お金", "月曜日"]
+    assert words(index.search("かぞく")) == ["家族"]
+    assert words(index.search("ichi", limit=1)) == ["一"]
+    assert index.search("") == index.search("xyz") == []
+
+
+def test_matching_positions_while_typing(index):
+    # Every query extends the previous one, so its candidates are narrowed down
+    assert [index.matching_positions("db", "mone"[:end]) for end in range(1, 5)] == [
+        {2, 3, 4}, {3, 4}, {3, 4}, {4}]
+    assert index.matching_positions("db", "ey") == {4}
+    assert index.matching_positions("db", "") == {0, 1, 2, 3, 4}
+    assert index.matching_positions("other", "one") == set()
+
+
+def test_update_reindexes_changed_vocs(index):
+    index.matching_positions("db", "mon")
+    index.update("db", [VOCS[2], Voc("月曜日", ["moon day"], []), VOCS[4]])
+    assert index.matching_positions("db", "mon") == {2}
+    assert index.matching_positions("db", "moo") == {1}
+    assert words(index.search("family")) == ["家族"]
+    assert words(index.search("one")) == ["お金"]
+
+    index.remove("db")
+    assert len(index) == 0 and index.search("mon") == []
+
+
+def test_search_of_many_candidates_ranks_like_all_of_them(monkeypatch):
+    vocs = [Voc(f"{voc.word}{i}", voc.meaning, []) for i in range(30) for voc in VOCS]
+    index = SearchIndex()
+    index.add("db", vocs[:100])
+    index.add("other", vocs[100:])
+    queries = ["o", "on", "ne", "y", "mo", "ey", "one", "つ", "1", "2"]
+    expected = {(query, owners): index.search(query, limit=20, owners=owners)
+                for query in queries for owners in (None, ("other",))}
+
+    # Walking the terms by length instead of ranking every candidate must not change the results
+    monkeypatch.setattr(SearchIndex, "RANK_LIMIT", 0)
+    for (query, owners), results in expected.items():
+        assert index.search(query, limit=20, owners=owners) == results
@@ -0,0 +1,90 @@
+import os
+import random
+import subprocess
+import sys
+
+import similarity
+from kamishirasawa import Voc
+from similarity import BANDS, MAX_BUCKET_SIZE, ROWS, SimilarityIndex, stable_hash, voc_features
+
+
+def test_voc_features():
+    assert voc_features(Voc("家族", ["Family members", "kin"], [])) == {
+        "w家", "w族", "rか", "rぞ", "rく", "rかぞ", "rぞく", "mfamily", "mmembers", "mkin"}
+
+
+def test_stable_hash_is_the_same_in_every_process():
+    code = "import similarity; print(similarity.stable_hash('w家'), similarity.stable_hash(('a', 1)))"
+    outputs = {subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                              env={**os.environ, "PYTHONHASHSEED": seed, "PYTHONPATH": os.path.dirname(similarity.__file__)}
+                              ).stdout for seed in ("1", "2")}
+    assert outputs == {f"{stable_hash('w家')} {stable_hash(('a', 1))}\n"}
+    assert 0 <= stable_hash("w家") < 2**64
+
+
+def sets(count: int, size: int, rng: random.Random, universe: int = 10_000) -> list[frozenset]:
+    return [frozenset(rng.sample(range(universe), size)) for _ in range(count)]
+
+
+def test_signatures_estimate_jaccard_similarity():
+    index = SimilarityIndex([], features=lambda flashcard: flashcard, seed=0)
+    a = frozenset(range(100))
+    assert len(index.signature(a)) == BANDS * ROWS
+    assert index.signature(a) == SimilarityIndex([], features=lambda flashcard: flashcard, seed=0).signature(a)
+    assert index.signature(frozenset(range(100))) == index.signature(a)
+
+    # Averaged over many pairs, the fraction of equal values is close to the Jaccard similarity
+    for shared in (0, 25, 50, 75):
+        fractions = []
+        for seed in range(40):
+            index = SimilarityIndex([], features=lambda flashcard: flashcard, seed=seed)
+            b = frozenset(range(100 - shared, 200 - shared))
+            fractions.append(sum(x == y for x, y in zip(index.signature(a), index.signature(b))) / (BANDS * ROWS))
+        jaccard = shared / (200 - shared)
+        assert abs(sum(fractions) / len(fractions) - jaccard) < 0.05
+
+
+def test_similar_ranks_by_shared_bands():
+    rng = random.Random(0)
+    unrelated = sets(500, 10, rng)
+    query = frozenset(range(10_000, 10_010))
+    near = query - {10_000} | {20_000}  # Jaccard similarity 9/11
+    far = frozenset(list(query)[:3]) | frozenset(range(30_000, 30_007))  # 3/17
+    index = SimilarityIndex(unrelated + [far, near, query], features=lambda flashcard: flashcard, seed=1)
+    assert len(index) == 503
+
+    similar = index.similar(query)
+    assert query not in similar
+    assert similar[:2] == [near, far]
+    assert index.similar(query, limit=1) == [near]
+
+    # A flashcard not in the index is looked up by its signature just as well
+    assert index.similar(frozenset(query | {40_000}), limit=2)[:2] == [query, near]
+    assert index.similar(frozenset(range(50_000, 50_010))) == []
+
+
+def test_add_ignores_indexed_flashcards():
+    flashcards = sets(3, 5, random.Random(1))
+    index = SimilarityIndex(flashcards, features=lambda flashcard: flashcard, seed=2)
+    index.add(flashcards[0])
+    assert len(index) == 3
+    assert sum(map(len, index.buckets.values())) == 3 * BANDS
+
+
+def test_oversized_buckets_are_skipped():
+    # Every flashcard has the same single feature, so every bucket holds all of them
+    flashcards = [Voc(str(i), ["meaning"], []) for i in range(MAX_BUCKET_SIZE + 1)]
+    index = SimilarityIndex(flashcards, features=lambda flashcard: {"same"}, seed=3)
+    assert index.similar(flashcards[0]) == []
+
+    index = SimilarityIndex(flashcards[:MAX_BUCKET_SIZE], features=lambda flashcard: {"same"}, seed=3)
+    similar = index.similar(flashcards[0], limit=MAX_BUCKET_SIZE)
+    assert len(similar) == MAX_BUCKET_SIZE - 1 and flashcards[0] not in similar
+
+
+def test_similar_vocs():
+    vocs = [Voc("家族", ["family"], []), Voc("家", ["house", "home"], []), Voc("家庭", ["home", "family"], []),
+            Voc("月曜日", ["monday"], []), Voc("火曜日", ["tuesday"], []), Voc("水", ["water"], [])]
+    index = SimilarityIndex(vocs, seed=4)
+    assert set(index.similar(vocs[3], limit=1)) == {vocs[4]}
+    assert vocs[3] not in index.similar(vocs[0])
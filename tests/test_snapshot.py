@@ -0,0 +1,145 @@
+import random
+import struct
+
+import pytest
+
+import snapshot
+from games import EnToJaGame, JaToEnGame
+from kamishirasawa import Voc
+
+VOCS = [Voc(f"語{i}", [f"meaning {i}", "other"], ["CATEGORY"] if i % 2 else []) for i in range(500)]
+
+
+def state(game) -> tuple:
+    return ([voc.word for voc in game.active], [voc.word for voc in game.passed],
+            {voc.word: passes for voc, passes in game.passes_done_dict.items() if passes},
+            game.drawn_count, game.total_count, game.passes_per_flashcard)
+
+
+def play(game, recorder, answers: int, rng: random.Random) -> None:
+    for _ in range(answers):
+        if game.is_done:
+            return
+        correct = rng.random() < 0.7
+        game.mark_as_correct() if correct else game.mark_as_incorrect()
+        recorder.record(correct)
+
+
+def start(path, game, widget_type="ChoiceFlashcardGameWidget", choices=4, **kwargs) -> snapshot.SessionRecorder:
+    recorder = snapshot.SessionRecorder(str(path), game, widget_type, choices, **kwargs)
+    recorder.prepare()
+    recorder.compact()
+    return recorder
+
+
+@pytest.mark.parametrize("game", [
+    lambda: JaToEnGame(VOCS[:50], passes_per_flashcard=2),
+    lambda: EnToJaGame(VOCS, passes_per_flashcard=3, window=20, seed=7),
+    lambda: JaToEnGame(VOCS, passes_per_flashcard=2, window=10, max_cards=100, seed=1),
+], ids=["eager", "lazy", "lazy with card limit"])
+def test_resume_replays_the_journal(tmp_path, game):
+    game = game()
+    recorder = start(tmp_path / "session.ksnp", game)
+    play(game, recorder, 100, random.Random(0))
+    recorder.close()
+
+    session = snapshot.load(str(tmp_path / "session.ksnp"))
+    assert type(session.game) is type(game)
+    assert (session.widget_type, session.choices) == ("ChoiceFlashcardGameWidget", 4)
+    assert state(session.game) == state(game)
+
+    # A resumed lazy game draws the same vocs the original one would
+    rng = random.Random(1)
+    while not game.is_done:
+        assert session.game.question == game.question
+        correct = rng.random() < 0.7
+        for played in (game, session.game):
+            played.mark_as_correct() if correct else played.mark_as_incorrect()
+    assert session.game.is_done
+
+
+def test_resume_after_compaction(tmp_path):
+    path = tmp_path / "session.ksnp"
+    game = JaToEnGame(VOCS, passes_per_flashcard=2, window=30, seed=3)
+    recorder = start(path, game, compact_every=256)
+    play(game, recorder, 256, random.Random(2))
+    assert recorder.journal_length == 256
+
+    # The answer after `compact_every` ones rewrites the state and empties the journal
+    play(game, recorder, 1, random.Random(3))
+    assert recorder.journal_length == 0
+    assert state(snapshot.load(str(path)).game) == state(game)
+    play(game, recorder, 300, random.Random(4))
+    recorder.close()
+    assert state(snapshot.load(str(path)).game) == state(game)
+
+    # A resumed game is recorded and resumed again
+    session = snapshot.load(str(path))
+    recorder = start(path, session.game, compact_every=16)
+    play(session.game, recorder, 100, random.Random(5))
+    recorder.close()
+    assert state(snapshot.load(str(path)).game) == state(session.game)
+
+
+def test_truncated_journal_tail_loses_only_its_answers(tmp_path):
+    path = tmp_path / "session.ksnp"
+    game = JaToEnGame(VOCS, passes_per_flashcard=2, window=20, seed=5)
+    recorder = start(path, game)
+    states = [state(game)]
+    rng = random.Random(6)
+    for _ in range(40):
+        play(game, recorder, 1, rng)
+        states.append(state(game))
+    recorder.close()
+
+    data = path.read_bytes()
+    for lost in (1, 7, 40):
+        path.write_bytes(data[:-lost])
+        assert state(snapshot.load(str(path)).game) == states[-1 - lost]
+
+    # Cutting into the state itself is an error, not a silently different game
+    path.write_bytes(data[:-41])
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.load(str(path))
+
+
+def test_header_and_journal_bytes(tmp_path):
+    path = tmp_path / "session.ksnp"
+    game = JaToEnGame(VOCS, passes_per_flashcard=2, window=20, max_cards=60, seed=9)
+    recorder = start(path, game, widget_type="TextInputFlashcardGameWidget", choices=0)
+    compacted = path.read_bytes()
+    for correct in (True, False, True):
+        game.mark_as_correct() if correct else game.mark_as_incorrect()
+        recorder.record(correct)
+    recorder.close()
+
+    data = path.read_bytes()
+    assert data[:len(compacted)] == compacted
+    assert data[len(compacted):] == snapshot.CORRECT + snapshot.INCORRECT + snapshot.CORRECT
+
+    header = snapshot.MAGIC + struct.pack("<B", snapshot.VERSION)
+    for name in ("JaToEnGame", "TextInputFlashcardGameWidget"):
+        header += struct.pack("<I", len(name)) + name.encode()
+    header += struct.pack("<HHI", 0, 2, 60) + struct.pack("<III", 20, 60, 9)
+    assert data.startswith(header)
+
+    path.write_bytes(snapshot.MAGIC + struct.pack("<B", snapshot.VERSION - 1) + data[len(snapshot.MAGIC) + 1:])
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.load(str(path))
+
+
+def test_nothing_is_written_before_the_first_compaction(tmp_path):
+    path = tmp_path / "session.ksnp"
+    game = JaToEnGame(VOCS[:20], passes_per_flashcard=1)
+    recorder = snapshot.SessionRecorder(str(path), game, "TextInputFlashcardGameWidget")
+    play(game, recorder, 5, random.Random(7))
+    assert not snapshot.exists(str(path))
+
+    # Answers given while the voc table was packed are part of the first snapshot
+    recorder.prepare()
+    recorder.compact()
+    recorder.close()
+    assert state(snapshot.load(str(path)).game) == state(game)
+
+    recorder.discard()
+    assert not snapshot.exists(str(path))
@@ -0,0 +1,54 @@
+import pytest
+
+import syllabary
+from syllabary import ALL_ROWS, COLUMNS, ColumnKind, Script, mask_of, select
+from transliterate import hiragana_to_katakana, romaji_to_hiragana
+
+SYLLABLES = [cell for column in COLUMNS for cell in column.cells if cell]
+
+
+def column_mask(*consonants: str, kind: ColumnKind = ColumnKind.BASIC) -> int:
+    return mask_of(i for i, column in enumerate(COLUMNS) if column.consonant in consonants and column.kind == kind)
+
+
+def test_table_is_consistent():
+    assert len(SYLLABLES) == len({syllable.hiragana for syllable in SYLLABLES}) == 104
+    assert all(len(column.cells) == len(syllabary.VOWELS) for column in COLUMNS)
+    for syllable in SYLLABLES:
+        assert syllable.katakana == hiragana_to_katakana(syllable.hiragana)
+        assert syllable.kana(Script.HIRAGANA) == syllable.hiragana
+        assert syllable.kana(Script.KATAKANA) == syllable.katakana
+
+    # ぢ and づ are spelled like じ and ず, which is what their romaji is typed as
+    different = {syllable.hiragana for syllable in SYLLABLES if romaji_to_hiragana(syllable.romaji) != syllable.hiragana}
+    assert different == {"ぢ", "づ"}
+
+
+def test_yoon_exist_with_a_u_o_only():
+    for column in COLUMNS:
+        if column.kind == ColumnKind.YOON:
+            assert [cell is not None for cell in column.cells] == [True, False, True, False, True]
+
+
+@pytest.mark.parametrize("rows, consonants, kind, expected", [
+    ([0], ["", "k"], ColumnKind.BASIC, ["あ", "か"]),
+    ([1, 3], ["", "k", "y"], ColumnKind.BASIC, ["い", "え", "き", "け"]),  # y has no i and e
+    ([0, 4], ["w"], ColumnKind.BASIC, ["わ", "を"]),
+    ([1], ["n"], ColumnKind.BASIC, ["に", "ん"]),  # ん is selected with any rows
+    ([], ["n"], ColumnKind.BASIC, ["ん"]),
+    ([2], ["z", "d"], ColumnKind.DAKUTEN, ["ず", "づ"]),
+    ([0, 1, 2], ["ky", "j"], ColumnKind.YOON, ["きゃ", "きゅ", "じゃ", "じゅ"]),
+    ([0, 1, 2, 3, 4], [], ColumnKind.BASIC, []),
+])
+def test_select(rows, consonants, kind, expected):
+    assert [syllable.hiragana for syllable in select(mask_of(rows), column_mask(*consonants, kind=kind))] == expected
+
+
+def test_select_all():
+    everything = select(ALL_ROWS, (1 << len(COLUMNS)) - 1)
+    assert everything == SYLLABLES
+    for mask in range(ALL_ROWS + 1):
+        for column in COLUMNS:
+            if not column.vowel_independent:
+                assert column.select(mask) == tuple(cell for row, cell in enumerate(column.cells)
+                                                    if cell and mask >> row & 1)
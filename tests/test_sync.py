@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+import pytest
+
+import cli
+from kamishirasawa import Voc, read_deck, write_deck
+from sync import SyncError, SyncServer, voc_hash
+
+VOCS = [
+    Voc("家族", ["family"], ["FAMILY"]),
+    Voc("父", ["father"], ["FAMILY"]),
+    Voc("母", ["mother"], ["FAMILY"]),
+    Voc("一", ["one"], ["NUMBERS", "1ST GRADE"]),
+    Voc("二", ["two"], ["NUMBERS", "1ST GRADE"]),
+]
+
+
+def hashes(vocs: list[Voc]) -> list[str]:
+    return [voc_hash(voc) for voc in vocs]
+
+
+@pytest.fixture
+def served(tmp_path):
+    """Serves a deck on localhost from a thread of its own, yields its path and the server address."""
+    path = tmp_path / "family.kamidb"
+    write_deck(str(path), VOCS)
+
+    loop = asyncio.new_event_loop()
+    server = SyncServer([str(path)])
+    port = loop.run_until_complete(server.start("127.0.0.1", 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield path, f"127.0.0.1:{port}"
+
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result(timeout=5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+    loop.close()
+
+
+@pytest.mark.parametrize("extension", [".kamidb", ".kamidb.gz", ".kamisql"])
+def test_pull_creates_missing_deck(served, tmp_path, extension):
+    path, address = served
+    local = str(tmp_path / ("local" + extension))
+
+    assert cli.pull(address, "family.kamidb", local) == f"{local}: {len(VOCS)} vocs, {len(VOCS)} received"
+    assert hashes(read_deck(local)) == hashes(VOCS)
+
+
+def test_pull_unchanged_deck_is_up_to_date(served, tmp_path):
+    path, address = served
+    local = str(tmp_path / "local.kamidb")
+    cli.pull(address, "family.kamidb", local)
+
+    assert cli.pull(address, "family.kamidb", local) == f"{local} is up to date"
+    assert hashes(read_deck(local)) == hashes(VOCS)
+
+
+@pytest.mark.parametrize("extension", [".kamidb", ".kamisql"])
+def test_pull_receives_only_changed_vocs(served, tmp_path, extension):
+    path, address = served
+    local = str(tmp_path / ("local" + extension))
+    cli.pull(address, "family.kamidb", local)
+
+    # Same voc count, so the local deck is updated in place
+    changed = [VOCS[0], Voc("父", ["father", "dad"], ["FAMILY"]), *VOCS[2:]]
+    write_deck(str(path), changed)
+    assert cli.pull(address, "family.kamidb", local) == f"{local}: {len(changed)} vocs, 1 received"
+    assert hashes(read_deck(local)) == hashes(changed)
+
+    # Reordered, with a voc removed and one added
+    changed = [Voc("三", ["three"], ["NUMBERS"]), *reversed(changed[1:])]
+    write_deck(str(path), changed)
+    assert cli.pull(address, "family.kamidb", local) == f"{local}: {len(changed)} vocs, 1 received"
+    assert hashes(read_deck(local)) == hashes(read_deck(str(path)))
+
+
+def test_pull_unknown_deck_fails(served, tmp_path):
+    _, address = served
+    with pytest.raises(SyncError, match="Unknown deck"):
+        cli.pull(address, "missing.kamidb", str(tmp_path / "local.kamidb"))
@@ -0,0 +1,94 @@
+import pytest
+
+from transliterate import (ROMAJI_TO_HIRAGANA, IncrementalTransliterator, Transliterator, kana_to_romaji,
+                           katakana_to_hiragana, romaji_to_hiragana, romaji_to_katakana)
+
+
+@pytest.mark.parametrize("romaji, kana", [
+    ("kon'ya", "こんや"), ("konya", "こにゃ"), ("onna", "おんな"), ("nn", "ん"), ("hon", "ほん"), ("n'", "ん"),
+    ("matcha", "まっちゃ"), ("kitte", "きって"), ("zasshi", "ざっし"), ("xtsu", "っ"), ("ltu", "っ"),
+    ("Tokyo", "ときょ"), ("ji", "じ"), ("dzu", "づ"), ("a-", "あー"), ("q!", "q!"),
+])
+def test_romaji_to_hiragana(romaji, kana):
+    assert romaji_to_hiragana(romaji) == kana
+
+
+def test_romaji_to_katakana():
+    assert romaji_to_katakana("konpyu-ta-") == "コンピューター"
+
+
+@pytest.mark.parametrize("kana, hepburn, kunrei", [
+    ("こんや", "kon'ya", "kon'ya"), ("おんな", "onna", "onna"), ("まっちゃ", "matcha", "mattya"),
+    ("きって", "kitte", "kitte"), ("シャツ", "shatsu", "syatu"), ("っ", "xtsu", "xtu"), ("あっ", "axtsu", "axtu"),
+])
+def test_kana_to_romaji(kana, hepburn, kunrei):
+    assert kana_to_romaji(kana) == hepburn
+    assert kana_to_romaji(kana, "kunrei") == kunrei
+    assert romaji_to_hiragana(hepburn) == romaji_to_hiragana(kunrei) == katakana_to_hiragana(kana)
+
+
+def test_longest_match_tells_if_the_key_can_go_on():
+    transliterator = Transliterator({"k": "K", "kya": "KYA", "n": "N"})
+    assert transliterator.longest_match("ky") == (1, "K", True)
+    assert transliterator.longest_match("xk") == (0, None, False)
+    assert transliterator.longest_match("kyak") == (3, "KYA", False)
+    assert transliterator.longest_match("k") == (1, "K", True)
+    assert transliterator.convert("kyakxn") == "KYAKxN"
+    assert transliterator.convert_many(["k", "n", "k"]) == ["K", "N", "K"]
+
+
+def typed(text: str, composer: IncrementalTransliterator = None) -> IncrementalTransliterator:
+    composer = composer or IncrementalTransliterator(ROMAJI_TO_HIRAGANA)
+    for char in text:
+        composer.type(char)
+    return composer
+
+
+@pytest.mark.parametrize("romaji, pending_text, flushed", [
+    ("kon", "こn", "こん"),  # a trailing 'n' waits for the next character
+    ("kon'", "こん", "こん"),
+    ("konn", "こnn", "こん"),  # 'nn' could still become 'んな'
+    ("konna", "こんな", "こんな"),
+    ("kony", "こny", "こんy"),
+    ("kot", "こt", "こt"),
+    ("kotc", "こtc", "こtc"),
+    ("kotch", "こtch", "こtch"),
+    ("kotcha", "こっちゃ", "こっちゃ"),
+    ("KYA", "きゃ", "きゃ"),
+])
+def test_incremental_typing(romaji, pending_text, flushed):
+    composer = typed(romaji)
+    assert composer.text == pending_text
+    assert composer.text == composer.confirmed + composer.pending
+
+    # Confirming converts whatever the tail can be converted to
+    composer.flush()
+    assert (composer.text, composer.pending) == (flushed, "")
+
+
+def test_incremental_matches_whole_conversion():
+    line = "kon'nichiha, matcha wo nondeimasu. onna no hito ha kitte wo kaimashita"
+    composer = typed(line)
+    composer.flush()
+    assert composer.text == romaji_to_hiragana(line)
+
+
+def test_incremental_editing():
+    composer = typed("kan")
+    composer.backspace()
+    assert composer.text == "か"
+    composer.backspace()
+    assert composer.text == ""
+
+    composer.reset("sushi")
+    assert composer.text == "すし"
+    composer.passthrough = True
+    typed("ka", composer)
+    assert composer.text == "すしka"
+
+    composer.passthrough = False
+    composer.reset("tsun")
+    assert composer.pending == "n"
+    composer.passthrough = True
+    typed("!", composer)
+    assert composer.text == "つん!"
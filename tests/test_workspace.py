@@ -0,0 +1,82 @@
+import json
+import os
+
+import pytest
+
+from kamishirasawa import Voc, open_db
+from workspace import Workspace
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "nested" / "workspace.json")
+    workspace = Workspace(["/decks/a.kamidb"], ["1ST GRADE", "家族"], "1st grade & !numbers",
+                          {"passes": 2, "max_cards": 20, "game": "JaToEnGame", "choices": 4})
+    workspace.save(path)
+    assert Workspace.load(path) == workspace
+    assert not os.path.exists(path + ".tmp")
+
+    # Saving again replaces the file
+    workspace.touch("/decks/b.kamidb")
+    workspace.save(path)
+    assert Workspace.load(path).decks == [os.path.abspath("/decks/b.kamidb"), "/decks/a.kamidb"]
+
+
+def test_touch_moves_a_deck_first(tmp_path):
+    workspace = Workspace()
+    for deck in ("a.kamidb", "b.kamidb", "c.kamidb", "a.kamidb"):
+        workspace.touch(str(tmp_path / deck))
+    assert workspace.decks == [str(tmp_path / deck) for deck in ("a.kamidb", "c.kamidb", "b.kamidb")]
+
+    workspace.touch(os.path.relpath(tmp_path / "b.kamidb"))
+    assert workspace.decks[0] == str(tmp_path / "b.kamidb") and len(workspace.decks) == 3
+
+
+@pytest.mark.parametrize("content", [None, "", "{", "[]", '"decks"', '{"decks": 1}', '{"game_settings": [1]}'])
+def test_unreadable_workspace_is_empty(tmp_path, content):
+    path = tmp_path / "workspace.json"
+    if content is not None:
+        path.write_text(content, encoding="utf-8")
+    assert Workspace.load(str(path)) == Workspace()
+
+
+def test_missing_keys_have_defaults(tmp_path):
+    path = tmp_path / "workspace.json"
+    path.write_text(json.dumps({"decks": ["a.kamidb"], "unknown": True}), encoding="utf-8")
+    assert Workspace.load(str(path)) == Workspace(["a.kamidb"])
+
+
+def test_decks_are_restored_in_order(tmp_path):
+    pytest.importorskip("PyQt6")
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtCore import QCoreApplication, QEventLoop, QTimer
+    from gui import DeckLoader
+
+    paths = []
+    for name in ("recent", "broken", "old"):
+        path = str(tmp_path / f"{name}.kamidb")
+        if name != "broken":
+            db = open_db(path)
+            db.clear_and_write_data([Voc(f"{name}語", [name], ["CATEGORY"])])
+            db.close()
+        else:
+            with open(path, "w") as file:
+                file.write("not a DB")
+        paths.append(path)
+    workspace = Workspace(paths)
+    workspace.save(str(tmp_path / "workspace.json"))
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    loader = DeckLoader()
+    loop = QEventLoop()
+    loaded, failed = [], []
+    loader.deck_loaded.connect(lambda path, db, vocs, terms: (loaded.append((path, [voc.word for voc in vocs], terms)),
+                                                              db.close()))
+    loader.deck_failed.connect(lambda path, message: failed.append(path))
+    loader.finished.connect(loop.quit)
+    QTimer.singleShot(10_000, loop.quit)
+    loader.start(Workspace.load(str(tmp_path / "workspace.json")).decks)
+    loop.exec()
+
+    assert [(path, words) for path, words, _ in loaded] == [(paths[0], ["recent語"]), (paths[2], ["old語"])]
+    assert all(len(terms) == 1 and terms[0][0] == words[0] for _, words, terms in loaded)
+    assert failed == [paths[1]]